@@ -0,0 +1,269 @@
+# api/app/admission.py
+# Admission control in front of the check pipeline, in two layers:
+#   - token buckets per caller (user id, or client IP for anonymous callers),
+#     sized by plan: anonymous / free / paid (app/entitlements.py). Empty
+#     bucket -> 429 with Retry-After.
+#   - a global limit of ADMISSION_MAX_INFLIGHT pipelines per process, with
+#     waiters served by plan priority (paid first). A caller whose estimated
+#     queueing time is over its plan's budget is refused up front with a 503
+#     and Retry-After instead of queueing toward a timeout.
+# Only pipeline runs hold a slot; verdict cache hits and coalesced followers
+# don't. Buckets live in process memory by default; ADMISSION_BACKEND=postgres
+# shares them across workers and nodes through the rate_buckets table (one
+# upsert per request, falling back to the local bucket if Postgres errors).
+import asyncio, heapq, itertools, logging, math, time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Optional, Tuple
+from fastapi import Depends, HTTPException, Request
+from .auth import get_current_user
+from .config import settings
+from .db import connection, take_rate_tokens
+from . import entitlements, metrics
+
+log = logging.getLogger(__name__)
+
+PRIORITY = {"paid": 0, "free": 1, "anonymous": 2}
+
+# (priority, queueing budget) of the request being served; read when its pipeline queues
+_CLASS: ContextVar[Optional[Tuple[int, float]]] = ContextVar("admission_class", default=None)
+
+_STATS = {
+    "admitted": 0,
+    "rate_limited": 0,
+    "shed": 0,               # refused up front: estimated wait over budget, or queue full
+    "timed_out": 0,          # queued, but no slot within the budget
+    "queued": 0,
+    "wait_ms_total": 0.0,
+    "wait_ms_max": 0.0,
+    "shared_errors": 0,      # postgres bucket unavailable, local bucket used
+}
+
+
+class Overloaded(Exception):
+    """No pipeline slot within the caller's budget; served as 503 + Retry-After."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("overloaded")
+        self.retry_after = retry_after
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+def limits(plan: str) -> Tuple[float, float, float]:
+    """(tokens per second, burst, queueing budget in seconds) for a plan."""
+    if plan == "paid":
+        return settings.RATE_PAID_PER_MIN / 60, settings.RATE_PAID_BURST, settings.ADMISSION_BUDGET_PAID
+    if plan == "free":
+        return settings.RATE_FREE_PER_MIN / 60, settings.RATE_FREE_BURST, settings.ADMISSION_BUDGET_FREE
+    return settings.RATE_ANON_PER_MIN / 60, settings.RATE_ANON_BURST, settings.ADMISSION_BUDGET_ANON
+
+
+# --- token buckets ---
+
+class _Buckets:
+    """key -> (tokens, last refill); LRU-bounded. An evicted bucket comes back full,
+    which only matters for keys idle long enough to have refilled anyway."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        """0 when admitted, else seconds until `cost` tokens will be there."""
+        now = time.monotonic()
+        tokens, ts = self._data.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - ts) * rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate if rate > 0 else 60.0
+        self._data[key] = (tokens, now)
+        if len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._data)
+
+
+_BUCKETS = _Buckets(settings.ADMISSION_MAX_BUCKETS)
+
+
+async def _take(key: str, rate: float, burst: float, cost: float) -> float:
+    if settings.ADMISSION_BACKEND == "postgres" and settings.DATABASE_URL:
+        try:
+            async with connection() as conn:
+                left = await take_rate_tokens(conn, key, rate, burst, cost)
+            # denied: the row wasn't touched, so the exact deficit is unknown; cost / rate bounds it
+            return 0.0 if left is not None else (cost / rate if rate > 0 else 60.0)
+        except Exception as e:
+            _STATS["shared_errors"] += 1
+            log.debug("rate_buckets unavailable, using the local bucket: %s", e)
+    return _BUCKETS.take(key, rate, burst, cost)
+
+
+def client_key(request: Request, user: Optional[dict]) -> str:
+    if user and user.get("id"):
+        return "user:" + user["id"]
+    host = request.client.host if request.client else "unknown"
+    if settings.ADMISSION_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            host = forwarded.split(",")[0].strip()
+    return "ip:" + host
+
+
+# --- pipeline slots ---
+
+class _Gate:
+    def __init__(self):
+        self.inflight = 0
+        self._waiters = []   # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self.avg_s: Optional[float] = None   # EWMA of how long a pipeline holds its slot
+
+    def queued(self, priority: Optional[int] = None) -> int:
+        return sum(1 for p, _, f in self._waiters if not f.done() and (priority is None or p <= priority))
+
+    def estimate(self, priority: int) -> float:
+        """Seconds a new caller at this priority would wait for a slot."""
+        limit = settings.ADMISSION_MAX_INFLIGHT
+        if self.inflight < limit and not self.queued():
+            return 0.0
+        avg = self.avg_s if self.avg_s is not None else settings.ADMISSION_DEFAULT_PIPELINE_S
+        return (self.queued(priority) + 1) * avg / limit
+
+    def check(self, priority: int, budget: float):
+        if self.queued() >= settings.ADMISSION_MAX_QUEUE:
+            _STATS["shed"] += 1
+            raise Overloaded(budget)
+        est = self.estimate(priority)
+        if est > budget:
+            _STATS["shed"] += 1
+            raise Overloaded(est)
+
+    async def acquire(self, priority: int, budget: float):
+        if self.inflight < settings.ADMISSION_MAX_INFLIGHT and not self.queued():
+            self.inflight += 1
+            return
+        self.check(priority, budget)
+        _STATS["queued"] += 1
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, budget)
+        except asyncio.TimeoutError:
+            _STATS["timed_out"] += 1
+            raise Overloaded(self.estimate(priority))
+        except BaseException:
+            # cancelled after a slot was handed over: pass it on
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+        finally:
+            wait_ms = (time.monotonic() - t0) * 1000
+            _STATS["wait_ms_total"] += wait_ms
+            _STATS["wait_ms_max"] = max(_STATS["wait_ms_max"], wait_ms)
+
+    def release(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)   # the slot moves to the waiter; inflight unchanged
+                return
+        self.inflight -= 1
+
+    def held(self, seconds: float):
+        self.avg_s = seconds if self.avg_s is None else 0.9 * self.avg_s + 0.1 * seconds
+
+
+_GATE = _Gate()
+
+
+class pipeline_slot:
+    """`async with pipeline_slot():` around one pipeline run. Priority and budget come
+    from the request that started it (check()); background callers get the free plan's."""
+
+    async def __aenter__(self):
+        if not settings.ADMISSION_ENABLED:
+            return self
+        cls = _CLASS.get()
+        priority, budget = cls if cls is not None else (PRIORITY["free"], settings.ADMISSION_BUDGET_FREE)
+        with metrics.stage("admission"):
+            await _GATE.acquire(priority, budget)
+        self.t0 = time.monotonic()
+        return self
+
+    async def __aexit__(self, *exc):
+        if settings.ADMISSION_ENABLED:
+            _GATE.held(time.monotonic() - self.t0)
+            _GATE.release()
+        return False
+
+
+# --- request entry point ---
+
+async def check(request: Request, user: Optional[dict], cost: float = 1) -> str:
+    """Charges the caller's bucket `cost` tokens and sheds load; raises 429/503.
+    Returns the plan. cost=0 only sheds (batches charge per item, wait_tokens)."""
+    plan = entitlements.plan(user)
+    if not settings.ADMISSION_ENABLED:
+        return plan
+    rate, burst, budget = limits(plan)
+    priority = PRIORITY[plan]
+    if cost > 0:
+        wait = await _take(client_key(request, user), rate, burst, min(cost, burst))
+        if wait > 0:
+            _STATS["rate_limited"] += 1
+            raise HTTPException(status_code=429, detail="rate_limited", headers={"Retry-After": retry_after_header(wait)})
+    try:
+        _GATE.check(priority, budget)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail="overloaded", headers={"Retry-After": retry_after_header(e.retry_after)})
+    _CLASS.set((priority, budget))
+    _STATS["admitted"] += 1
+    return plan
+
+
+async def wait_tokens(request: Request, user: Optional[dict], max_wait: float, cost: float = 1) -> bool:
+    """Takes `cost` tokens from the caller's bucket, sleeping for the refill when it
+    is due within max_wait seconds; False (counted as rate_limited) otherwise.
+    Batch items are charged this way, one at a time as they're scheduled."""
+    if not settings.ADMISSION_ENABLED:
+        return True
+    rate, burst, _ = limits(entitlements.plan(user))
+    key = client_key(request, user)
+    deadline = time.monotonic() + max_wait
+    while True:
+        wait = await _take(key, rate, burst, min(cost, burst))
+        if wait <= 0:
+            return True
+        if time.monotonic() + wait > deadline:
+            _STATS["rate_limited"] += 1
+            return False
+        await asyncio.sleep(wait)
+
+
+async def admit(request: Request, user=Depends(get_current_user)) -> Optional[dict]:
+    """Drop-in for Depends(get_current_user) on endpoints that run checks."""
+    await check(request, user)
+    return user
+
+
+def stats() -> dict:
+    admitted = _STATS["admitted"]
+    return {
+        **_STATS,
+        "wait_ms_avg": round(_STATS["wait_ms_total"] / _STATS["queued"], 2) if _STATS["queued"] else 0.0,
+        "inflight": _GATE.inflight,
+        "queue_depth": _GATE.queued(),
+        "pipeline_s_avg": round(_GATE.avg_s, 3) if _GATE.avg_s is not None else None,
+        "buckets": len(_BUCKETS),
+        "reject_rate": round((_STATS["rate_limited"] + _STATS["shed"]) / (admitted + _STATS["rate_limited"] + _STATS["shed"]), 4)
+        if admitted + _STATS["rate_limited"] + _STATS["shed"] else 0.0,
+    }
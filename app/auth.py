@@ -1,11 +1,14 @@
 # api/app/auth.py
-import time, json
+import asyncio, hashlib, logging, time
 from typing import Optional, Dict, Any
-import httpx
 import jwt
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from .config import settings
+from .cache import TTLCache
+from . import http_client, metrics
+
+log = logging.getLogger(__name__)
 
 bearer = HTTPBearer(auto_error=False)
 
@@ -14,35 +17,79 @@ def _jwks_url():
     base = settings.SUPABASE_URL.rstrip("/")
     return f"{base}/auth/v1/.well-known/jwks.json"
 
-_JWKS_CACHE: Dict[str, Any] = {"keys": None, "ts": 0}
+_JWKS_CACHE: Dict[str, Any] = {"keys": None, "ts": 0, "task": None, "unknown_kid_ts": 0}
+# kid -> parsed public key, rebuilt on every JWKS fetch
+_KEYS: Dict[str, Any] = {}
+# sha256(token) -> user dict, expires with the token's exp
+_TOKENS = TTLCache(settings.AUTH_TOKEN_CACHE_SIZE)
+_STATS = {"requests": 0, "verified": 0, "jwks_refreshes": 0, "jwks_errors": 0, "unknown_kid": 0, "auth_ms_total": 0.0, "auth_ms_max": 0.0}
+
+async def _fetch_jwks():
+    r = await http_client.get_client().get(_jwks_url(), timeout=10)
+    r.raise_for_status()
+    data = r.json()
+    keys = {}
+    for k in data.get("keys", []):
+        try:
+            keys[k.get("kid")] = jwt.algorithms.RSAAlgorithm.from_jwk(k)
+        except (jwt.PyJWTError, ValueError, KeyError):
+            continue
+    _KEYS.clear()
+    _KEYS.update(keys)
+    _JWKS_CACHE["keys"] = data
+    _JWKS_CACHE["ts"] = time.time()
+    _STATS["jwks_refreshes"] += 1
+    return data
+
+def _refresh_done(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        _STATS["jwks_errors"] += 1
+        log.warning("JWKS refresh failed: %s", task.exception())
+
+def _refresh_jwks() -> asyncio.Task:
+    # single-flight: every caller shares the one refresh in progress
+    task = _JWKS_CACHE["task"]
+    if task is None or task.done():
+        task = _JWKS_CACHE["task"] = asyncio.ensure_future(_fetch_jwks())
+        task.add_done_callback(_refresh_done)
+    return task
 
 async def _get_jwks():
-    # cache for 10 minutes
-    if _JWKS_CACHE["keys"] and (time.time() - _JWKS_CACHE["ts"] < 600):
+    age = time.time() - _JWKS_CACHE["ts"]
+    if _JWKS_CACHE["keys"] and age < settings.AUTH_JWKS_TTL:
+        return _JWKS_CACHE["keys"]
+    if _JWKS_CACHE["keys"] and age < settings.AUTH_JWKS_TTL + settings.AUTH_JWKS_STALE_TTL:
+        # stale-while-revalidate: serve the old keys, refresh in the background
+        _refresh_jwks()
         return _JWKS_CACHE["keys"]
-    async with httpx.AsyncClient(timeout=10) as hc:
-        r = await hc.get(_jwks_url())
-        r.raise_for_status()
-        data = r.json()
-        _JWKS_CACHE["keys"] = data
-        _JWKS_CACHE["ts"] = time.time()
-        return data
+    try:
+        return await asyncio.shield(_refresh_jwks())
+    except Exception:
+        if _JWKS_CACHE["keys"]:
+            return _JWKS_CACHE["keys"]
+        raise HTTPException(status_code=503, detail="auth_unavailable")
 
-async def get_current_user(creds: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> Optional[dict]:
-    """Returns dict with user fields if Authorization header present and valid, else None."""
-    if not creds:
-        return None
-    token = creds.credentials
-    jwks = await _get_jwks()
+async def _get_key(kid):
+    await _get_jwks()
+    key = _KEYS.get(kid)
+    if key is None:
+        _STATS["unknown_kid"] += 1
+        # key rotation: refetch, but at most once per interval so junk kids can't hammer Supabase
+        now = time.time()
+        if now - _JWKS_CACHE["unknown_kid_ts"] >= settings.AUTH_UNKNOWN_KID_INTERVAL:
+            _JWKS_CACHE["unknown_kid_ts"] = now
+            try:
+                await asyncio.shield(_refresh_jwks())
+            except Exception:
+                pass
+            key = _KEYS.get(kid)
+    return key
+
+async def _verify(token: str) -> dict:
     try:
         # Use PyJWT with JWKS
         unverified = jwt.get_unverified_header(token)
-        kid = unverified.get("kid")
-        key = None
-        for k in jwks["keys"]:
-            if k.get("kid") == kid:
-                key = jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(k))
-                break
+        key = await _get_key(unverified.get("kid"))
         if key is None:
             raise HTTPException(status_code=401, detail="invalid_jwt_kid")
 
@@ -53,15 +100,54 @@ async def get_current_user(creds: Optional[HTTPAuthorizationCredentials] = Depen
             audience=settings.SUPABASE_JWT_AUD or "authenticated",
             options={"verify_exp": True},
         )
-        # Typical Supabase claims: sub (user id), email, role, etc.
-        return {
-            "id": payload.get("sub"),
-            "email": payload.get("email"),
-            "role": payload.get("role"),
-            "aud": payload.get("aud"),
-            "raw": payload,
-        }
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="token_expired")
     except jwt.PyJWTError as e:
         raise HTTPException(status_code=401, detail=f"invalid_token: {e}")
+    _STATS["verified"] += 1
+    # Typical Supabase claims: sub (user id), email, role, etc.
+    return {
+        "id": payload.get("sub"),
+        "email": payload.get("email"),
+        "role": payload.get("role"),
+        "aud": payload.get("aud"),
+        "raw": payload,
+    }
+
+async def get_current_user(creds: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> Optional[dict]:
+    """Returns dict with user fields if Authorization header present and valid, else None."""
+    if not creds:
+        return None
+    t0 = time.perf_counter()
+    _STATS["requests"] += 1
+    try:
+        token = creds.credentials
+        key = hashlib.sha256(token.encode()).hexdigest()
+        user = _TOKENS.get(key)
+        if user is None:
+            user = await _verify(token)
+            exp = user["raw"].get("exp")
+            ttl = min(exp - time.time(), settings.AUTH_TOKEN_CACHE_MAX_TTL) if exp else 0
+            _TOKENS.set(key, user, ttl)
+        return user
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        _STATS["auth_ms_total"] += ms
+        _STATS["auth_ms_max"] = max(_STATS["auth_ms_max"], ms)
+        if settings.METRICS_ENABLED:
+            metrics.observe("auth", ms / 1000)
+
+def prime() -> asyncio.Task:
+    """Start fetching the JWKS (warm-up) so the first signed-in request finds the
+    keys cached or already in flight. Not awaited on the startup path."""
+    return _refresh_jwks()
+
+def stats() -> dict:
+    n = _STATS["requests"]
+    return {
+        **_STATS,
+        "auth_ms_avg": round(_STATS["auth_ms_total"] / n, 3) if n else 0.0,
+        "keys": len(_KEYS),
+        "jwks_age_s": round(time.time() - _JWKS_CACHE["ts"], 1) if _JWKS_CACHE["ts"] else None,
+        "token_cache": _TOKENS.stats(),
+    }
@@ -1,11 +1,36 @@
-import stripe
+import asyncio, logging, operator, random
 from fastapi import APIRouter, HTTPException, Request
 from .config import settings
 from .schemas import CheckoutRequest, CheckoutResponse, PortalResponse
-from .db import get_conn
+from .db import (connection, get_stripe_customer_id, upsert_subscription, set_subscription_status,
+                 insert_stripe_event, claim_stripe_events, finish_stripe_event, retry_stripe_event)
+from . import entitlements, metrics
+
+log = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/billing", tags=["billing"])
-stripe.api_key = settings.STRIPE_SECRET_KEY
+
+_STRIPE = None
+_CONSUMER = {"task": None, "wake": None}
+_STATS = {"received": 0, "duplicates": 0, "processed": 0, "ignored": 0, "retried": 0, "failed": 0}
+
+def stripe_lib():
+    """The stripe package, imported and configured on first use (or at warm-up)."""
+    global _STRIPE
+    if _STRIPE is None:
+        import stripe
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+        if settings.STRIPE_API_BASE:
+            # local stand-in (scripts/loadtest_stubs.py serves one under /stripe)
+            stripe.api_base = settings.STRIPE_API_BASE.rstrip("/")
+        _STRIPE = stripe
+    return _STRIPE
+
+async def _stripe(method: str, **kwargs):
+    # the stripe client is synchronous; keep its network round trip off the event loop
+    fn = operator.attrgetter(method)(stripe_lib())
+    with metrics.stage("stripe"):
+        return await asyncio.to_thread(fn, **kwargs)
 
 # api/app/billing.py (patch)
 from fastapi import Depends
@@ -17,17 +42,16 @@ async def create_checkout(user=Depends(get_current_user)):
         raise HTTPException(status_code=401, detail="login_required")
     try:
         # (optional) look up existing stripe_customer_id
-        async with await get_conn() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("select stripe_customer_id from subscriptions where user_id = %s", (user["id"],))
-                row = await cur.fetchone()
-                customer_id = row[0] if row and row[0] else None
+        with metrics.stage("billing_db"):
+            async with connection() as conn:
+                customer_id = await get_stripe_customer_id(conn, user["id"])
 
         if not customer_id:
-            customer = stripe.Customer.create(email=user.get("email") or None)
+            customer = await _stripe("Customer.create", email=user.get("email") or None)
             customer_id = customer.id
 
-        session = stripe.checkout.Session.create(
+        session = await _stripe(
+            "checkout.Session.create",
             mode="subscription",
             line_items=[{"price": settings.STRIPE_PRICE_ID, "quantity": 1}],
             success_url="http://localhost:5173/thanks?session_id={CHECKOUT_SESSION_ID}",
@@ -42,58 +66,133 @@ async def create_checkout(user=Depends(get_current_user)):
 
 @router.post("/webhook")
 async def webhook(request: Request):
+    """Verifies and stores the event, then acks; the consumer task applies it.
+    Stripe redelivers until it gets a 2xx, so a stored duplicate is a no-op."""
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
     try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
-        )
+        with metrics.stage("stripe_verify"):
+            event = stripe_lib().Webhook.construct_event(
+                payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
+            )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    async with await get_conn() as conn:
-        if event["type"] == "checkout.session.completed":
-            sess = event["data"]["object"]
-            sub_id = sess.get("subscription")
-            cust_id = sess.get("customer")
-            user_id = sess["metadata"].get("user_id")
-            # upsert
-            await conn.execute(
-                """
-                insert into subscriptions(user_id, stripe_customer_id, stripe_sub_id, status)
-                values (%s, %s, %s, 'active')
-                on conflict (user_id)
-                do update set stripe_customer_id = excluded.stripe_customer_id,
-                              stripe_sub_id = excluded.stripe_sub_id,
-                              status = 'active'
-                """,
-                (user_id, cust_id, sub_id),
-            )
-        elif event["type"] == "customer.subscription.updated":
-            sub = event["data"]["object"]
-            status = sub["status"]  # active, past_due, canceled, trialing
-            # lookup user_id by sub_id
-            await conn.execute(
-                """
-                update subscriptions set status = %s where stripe_sub_id = %s
-                """,
-                (status, sub["id"]),
-            )
-        elif event["type"] == "customer.subscription.deleted":
-            sub = event["data"]["object"]
-            await conn.execute(
-                """update subscriptions set status = 'canceled' where stripe_sub_id = %s""",
-                (sub["id"],),
-            )
+    _STATS["received"] += 1
+    with metrics.stage("billing_db"):
+        async with connection() as conn:
+            stored = await insert_stripe_event(conn, event["id"], event["type"], event["created"], payload.decode())
+    if not stored:
+        _STATS["duplicates"] += 1
+    elif _CONSUMER["wake"] is not None:
+        _CONSUMER["wake"].set()
     return {"ok": True}
 
+@router.get("/entitlement")
+async def entitlement(user=Depends(get_current_user)):
+    if not user:
+        raise HTTPException(status_code=401, detail="login_required")
+    return entitlements.get(user["id"])
+
 @router.get("/portal", response_model=PortalResponse)
 async def portal(customer_id: str):
     try:
-        session = stripe.billing_portal.Session.create(
+        session = await _stripe(
+            "billing_portal.Session.create",
             customer=customer_id,
             return_url="http://localhost:5173/account",
         )
         return {"url": session.url}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+# --- webhook event consumer ---
+
+async def _process_event(conn, event_type: str, event: dict):
+    """Applies one event; returns (user_id, status) for the entitlement cache, or None.
+    Idempotent, and stale events (older than the last one applied) are skipped."""
+    obj = event["data"]["object"]
+    created = event.get("created")
+    if event_type == "checkout.session.completed":
+        user_id = (obj.get("metadata") or {}).get("user_id")
+        if user_id and await upsert_subscription(
+            conn,
+            user_id=user_id,
+            customer_id=obj.get("customer"),
+            sub_id=obj.get("subscription"),
+            event_at=created,
+        ):
+            return user_id, "active"
+    elif event_type == "customer.subscription.updated":
+        # active, past_due, canceled, trialing
+        user_id = await set_subscription_status(conn, obj["id"], obj["status"], event_at=created)
+        return user_id, obj["status"]
+    elif event_type == "customer.subscription.deleted":
+        user_id = await set_subscription_status(conn, obj["id"], "canceled", event_at=created)
+        return user_id, "canceled"
+    return None
+
+async def process_events() -> int:
+    """Claims a batch of stored events (SKIP LOCKED, so every node can run this)
+    and applies each in its own savepoint."""
+    changes = []
+    async with connection() as conn:
+        rows = await claim_stripe_events(conn, settings.STRIPE_EVENT_BATCH)
+        for event_id, event_type, payload, attempts in rows:
+            try:
+                async with conn.transaction():
+                    change = await _process_event(conn, event_type, payload)
+                    await finish_stripe_event(conn, event_id, change[0] if change else None)
+            except Exception as e:
+                # attempts was already bumped by the claim
+                final = attempts >= settings.STRIPE_EVENT_MAX_ATTEMPTS
+                delay = min(settings.STRIPE_EVENT_BACKOFF * 2 ** (attempts - 1), 3600.0) * random.uniform(0.5, 1.0)
+                await retry_stripe_event(conn, event_id, f"{type(e).__name__}: {e}"[:500], delay, final)
+                _STATS["failed" if final else "retried"] += 1
+                log.warning("stripe event %s (%s) failed, attempt %d: %s", event_id, event_type, attempts, e)
+                continue
+            _STATS["processed"] += 1
+            if change is None:
+                _STATS["ignored"] += 1
+            else:
+                changes.append(change)
+    # after commit, so a rolled-back batch never leaks into the cache
+    for user_id, status in changes:
+        if user_id:
+            entitlements.apply(user_id, status)
+    return len(rows)
+
+async def _consume():
+    while True:
+        try:
+            n = await process_events()
+        except Exception as e:
+            log.warning("stripe event consumer: %s", e)
+            n = 0
+        if n >= settings.STRIPE_EVENT_BATCH:
+            continue
+        try:
+            # woken by the webhook on this node; polls for events other nodes stored and for retries
+            await asyncio.wait_for(_CONSUMER["wake"].wait(), settings.STRIPE_EVENT_POLL)
+        except asyncio.TimeoutError:
+            pass
+        _CONSUMER["wake"].clear()
+
+def start():
+    if not settings.DATABASE_URL or _CONSUMER["task"] is not None:
+        return
+    _CONSUMER["wake"] = asyncio.Event()
+    _CONSUMER["task"] = asyncio.ensure_future(_consume())
+
+async def close():
+    task = _CONSUMER["task"]
+    _CONSUMER["task"] = None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+def stats() -> dict:
+    return {**_STATS, "entitlements": entitlements.stats()}
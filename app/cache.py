@@ -0,0 +1,174 @@
+# api/app/cache.py
+import asyncio, logging, time, hashlib
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from urllib.parse import urlparse, urlunparse
+from .config import settings
+from .db import connection, get_cached_check, invalidate_url, load_url_invalidations
+
+log = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """In-process LRU where every entry carries its own expiry."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires, value = item
+        if expires <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        if ttl <= 0:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str):
+        item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def url_hash(norm_url: str) -> str:
+    # scheme and host are case-insensitive; path and query are not
+    p = urlparse(norm_url)
+    key = urlunparse((p.scheme.lower(), p.netloc.lower(), p.path or "/", p.params, p.query, ""))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def verdict_ttl(verdict: str) -> int:
+    # danger verdicts expire fastest so takedowns/fixes are picked up quickly
+    return {
+        "ok": settings.CACHE_TTL_OK,
+        "warning": settings.CACHE_TTL_WARNING,
+        "danger": settings.CACHE_TTL_DANGER,
+    }.get(verdict, settings.CACHE_TTL_DANGER)
+
+
+# url_hash -> (stored_at, (verdict, reasons, summary, meta))
+_VERDICTS = TTLCache(settings.CACHE_MAX_ENTRIES)
+_DB_STATS = {"hits": 0, "misses": 0, "errors": 0}
+_INVALIDATIONS = {"watermark": None, "task": None, "invalidated": 0, "evicted": 0, "poll_errors": 0}
+
+
+async def get_verdict(key: str) -> Optional[Tuple[tuple, str, float]]:
+    """Returns (result, tier, age_seconds) or None. Memory first, then url_checks."""
+    hit = _VERDICTS.get(key)
+    if hit is not None:
+        stored_at, result = hit
+        return result, "memory", time.time() - stored_at
+    if not settings.DATABASE_URL:
+        return None
+    try:
+        async with connection() as conn:
+            row = await get_cached_check(conn, key)
+    except Exception:
+        _DB_STATS["errors"] += 1
+        return None
+    if row is None:
+        _DB_STATS["misses"] += 1
+        return None
+    verdict, reasons, summary, meta, age = row
+    ttl = verdict_ttl(verdict)
+    if age >= ttl:
+        _DB_STATS["misses"] += 1
+        return None
+    _DB_STATS["hits"] += 1
+    result = (verdict, reasons or [], summary or "", meta or {})
+    # promote to memory for the remainder of its lifetime
+    _VERDICTS.set(key, (time.time() - age, result), ttl - age)
+    return result, "db", age
+
+
+def put_verdict(key: str, result: tuple):
+    # the Postgres tier is the url_checks row written by the /api/check handler
+    _VERDICTS.set(key, (time.time(), result), verdict_ttl(result[0]))
+
+
+async def invalidate(key: str):
+    # this worker at once; the others on their next poll of url_invalidations
+    _VERDICTS.pop(key)
+    _INVALIDATIONS["invalidated"] += 1
+    if not settings.DATABASE_URL:
+        return
+    async with connection() as conn:
+        await invalidate_url(conn, key)
+
+
+async def poll_invalidations():
+    async with connection() as conn:
+        rows = await load_url_invalidations(conn, _INVALIDATIONS["watermark"], settings.CACHE_INVALIDATION_OVERLAP)
+    for key, invalidated_at in rows:
+        hit = _VERDICTS.pop(key)
+        # a verdict stored after the invalidation is a fresh check: keep it
+        if hit is not None and hit[0] >= invalidated_at.timestamp():
+            _VERDICTS.set(key, hit, verdict_ttl(hit[1][0]) - (time.time() - hit[0]))
+        elif hit is not None:
+            _INVALIDATIONS["evicted"] += 1
+        if _INVALIDATIONS["watermark"] is None or invalidated_at > _INVALIDATIONS["watermark"]:
+            _INVALIDATIONS["watermark"] = invalidated_at
+
+
+async def _loop():
+    while True:
+        await asyncio.sleep(settings.CACHE_INVALIDATION_POLL)
+        try:
+            await poll_invalidations()
+        except Exception as e:
+            _INVALIDATIONS["poll_errors"] += 1
+            log.warning("polling url_invalidations failed: %s", e)
+
+
+def start():
+    if settings.DATABASE_URL and _INVALIDATIONS["task"] is None:
+        _INVALIDATIONS["task"] = asyncio.ensure_future(_loop())
+
+
+async def close():
+    task = _INVALIDATIONS["task"]
+    _INVALIDATIONS["task"] = None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+def stats() -> dict:
+    inv = {k: v for k, v in _INVALIDATIONS.items() if k != "task"}
+    inv["watermark"] = inv["watermark"].isoformat() if inv["watermark"] else None
+    return {"memory": _VERDICTS.stats(), "db": dict(_DB_STATS), "invalidations": inv}
@@ -1,11 +1,10 @@
-import httpx, tldextract, re, json, asyncio
-from bs4 import BeautifulSoup
-from readability import Document
+import re, asyncio, codecs
 from urllib.parse import urlparse, urlunparse
-from openai import OpenAI
+from typing import Callable, Dict, List, Optional
 from .config import settings
-
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+from . import admission, cache as verdict_cache, fastpath, http_client, label_cache, llm, metrics, microbatch, neardup, preflight, psl, reputation, validators
+from .extract import ArticleSniffer, extract_page_async, sniff_encoding
+from .cache import url_hash
 
 def normalize_url(u: str) -> str:
     p = urlparse(u)
@@ -13,80 +12,189 @@ def normalize_url(u: str) -> str:
     clean_qs = "&".join([kv for kv in p.query.split("&") if kv and not kv.lower().startswith(("utm_", "fbclid="))])
     return urlunparse((p.scheme or "https", p.netloc, p.path, p.params, clean_qs, ""))
 
-async def fetch_html(url: str, timeout=10):
-    headers = {"User-Agent": "GentleReader/1.0 (+https://example.com)"}
-    async with httpx.AsyncClient(follow_redirects=True, timeout=timeout, headers=headers) as hc:
-        r = await hc.get(url)
+def _history(r):
+    return [str(h.url) for h in r.history]
+
+def _not_modified(r):
+    # conditional request answered 304: nothing to read
+    return None, str(r.url), dict(r.headers), {"bytes": 0, "stopped": "not_modified", "encoding": None, "redirects": _history(r)}
+
+def _not_html(r, kind: str):
+    # the headers are the content-type probe: a PDF/image/video body is never read here
+    preflight.record_not_html()
+    info = {"bytes": 0, "stopped": "not_html", "encoding": None, "content_kind": kind, "redirects": _history(r)}
+    return None, str(r.url), dict(r.headers), info
+
+async def _fetch_full(hc, url: str, headers=None):
+    async with hc.stream("GET", url, headers=headers) as r:
+        if r.status_code == 304:
+            return _not_modified(r)
         r.raise_for_status()
-        return r.text, str(r.url), dict(r.headers)
+        kind = preflight.content_kind(r.headers.get("content-type"))
+        if kind != "html":
+            return _not_html(r, kind)
+        await r.aread()
+        info = {"bytes": r.num_bytes_downloaded, "stopped": None, "encoding": r.encoding, "redirects": _history(r)}
+        return r.text, str(r.url), dict(r.headers), info
 
-def extract_text(html: str):
-    # Try readability
-    try:
-        doc = Document(html)
-        title = (doc.short_title() or "").strip()
-        content_html = doc.summary(html_partial=True)
-        soup = BeautifulSoup(content_html, "html.parser")
-        paras = [p.get_text(" ", strip=True) for p in soup.find_all("p")]
-        body = "\n\n".join(paras[:6])  # keep it short for inference
-        if body.strip():
-            return title, body
-    except Exception:
-        pass
-    # Fallback: basic parse
-    soup = BeautifulSoup(html, "html.parser")
-    title = (soup.title.get_text(strip=True) if soup.title else "")[:140]
-    paras = [p.get_text(" ", strip=True) for p in soup.find_all("p")]
-    body = "\n\n".join(paras[:6])
-    return title, body
-
-LOW_REP_DOMAINS = {
-    # seed a few; expand from CSV later
-    "clickbait.example": "low_domain_rep",
-    "giveaway.example": "low_domain_rep",
-}
-
-def ux_noise_score(html: str) -> int:
-    # crude signals; higher => noisier
-    score = 0
-    score += html.count("<iframe")
-    score += html.count("subscribe") > 5
-    score += html.count("popup") > 2
-    return int(score)
+async def _fetch_streaming(hc, url: str, headers=None):
+    # read only until the title + paragraphs extract_page uses have arrived
+    async with hc.stream("GET", url, headers=headers) as r:
+        if r.status_code == 304:
+            return _not_modified(r)
+        r.raise_for_status()
+        kind = preflight.content_kind(r.headers.get("content-type"))
+        if kind != "html":
+            return _not_html(r, kind)
+        headers = dict(r.headers)
+        sniffer = ArticleSniffer(settings.FETCH_STOP_PARAS, settings.FETCH_STOP_CHARS, settings.FETCH_MIN_PARA_CHARS)
+        decoder, enc, pending, parts, seen, stopped = None, None, b"", [], 0, None
+        async for chunk in r.aiter_bytes():
+            seen += len(chunk)
+            if decoder is None:
+                # hold the first few KB so <meta charset> can be sniffed
+                pending += chunk
+                if len(pending) < 4096:
+                    continue
+                enc = sniff_encoding(pending, headers.get("content-type"))
+                decoder = codecs.getincrementaldecoder(enc)("replace")
+                chunk, pending = pending, b""
+            text = decoder.decode(chunk)
+            parts.append(text)
+            if sniffer.feed(text):
+                stopped = "enough_text"
+                break
+            if seen >= settings.FETCH_MAX_BYTES:
+                stopped = "max_bytes"
+                break
+        if decoder is None:
+            enc = sniff_encoding(pending, headers.get("content-type"))
+            decoder = codecs.getincrementaldecoder(enc)("replace")
+        parts.append(decoder.decode(pending, final=True))
+        info = {"bytes": r.num_bytes_downloaded, "stopped": stopped, "encoding": enc, "redirects": _history(r)}
+        return "".join(parts), str(r.url), headers, info
 
-async def classify_and_summarize(domain: str, title: str, body: str):
+async def fetch_html(url: str, timeout=None, headers=None):
+    """Returns (html, final_url, headers, info); info has bytes read, why reading stopped
+    and the redirects followed. html is None when a conditional request (headers) got
+    a 304 (stopped "not_modified") or the response isn't HTML (stopped "not_html",
+    info["content_kind"] says what it is)."""
+    hc = http_client.get_client()
+    fetch = _fetch_streaming if settings.FETCH_STREAMING else _fetch_full
+    async with http_client.host_slot(urlparse(url).hostname or ""):
+        # connect/read timeouts live on the client; this caps the whole exchange
+        return await asyncio.wait_for(fetch(hc, url, headers), timeout or settings.HTTP_TOTAL_TIMEOUT)
+
+# bump whenever the classify prompt changes; cached labels are keyed on it
+PROMPT_VERSION = "classify-v1"
+
+_LABEL_FIELDS = """- headline_style: "clickbait" | "neutral"
+- tone: "sensational" | "neutral"
+- scam_signal: "strong" | "weak" | "none"
+- health_claim: "present" | "not_present"
+- summary_bullets: array of 3-5 short bullets (<=20 words each), plain text"""
+_CLASSIFY_SYSTEM = "Return only valid JSON. Be conservative about scams and sensational claims."
+
+async def _classify_one(page):
     # Single call that returns JSON for labels + short bullets
+    domain, title, body = page
     prompt = f"""
 You are a safety and misinformation assistant. Read the page metadata below and return strict JSON.
 
 Return fields:
-- headline_style: "clickbait" | "neutral"
-- tone: "sensational" | "neutral"
-- scam_signal: "strong" | "weak" | "none"
-- health_claim: "present" | "not_present"
-- summary_bullets: array of 3-5 short bullets (<=20 words each), plain text
+{_LABEL_FIELDS}
 
 CONTENT:
 DOMAIN: {domain}
 TITLE: {title}
 BODY (truncated): {body[:4000]}
 """
-    resp = client.chat.completions.create(
-        model=settings.OPENAI_MODEL,
-        temperature=0,
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": "Return only valid JSON. Be conservative about scams and sensational claims."},
-            {"role": "user", "content": prompt},
-        ],
-    )
-    data = json.loads(resp.choices[0].message.content)
+    return await llm.complete_json([
+        {"role": "system", "content": _CLASSIFY_SYSTEM},
+        {"role": "user", "content": prompt},
+    ])
+
+async def _classify_many(items):
+    # several pages, one request: instructions once, answers keyed by item id
+    pages = "\n".join(
+        f"""
+PAGE id={item_id}
+DOMAIN: {domain}
+TITLE: {title}
+BODY (truncated): {body[:4000]}
+""" for item_id, (domain, title, body) in items)
+    prompt = f"""
+You are a safety and misinformation assistant. Read each page below and label it independently.
+
+Return strict JSON: {{"results": [{{"id": "<page id>", ...fields}}, ...]}} with exactly one entry per page.
+Fields for each page:
+{_LABEL_FIELDS}
+{pages}"""
+    data, usage = await llm.complete_json([
+        {"role": "system", "content": _CLASSIFY_SYSTEM},
+        {"role": "user", "content": prompt},
+    ])
+    wanted = {item_id for item_id, _ in items}
+    results = {}
+    for entry in data.get("results") or []:
+        # anything malformed is left out and goes back through _classify_one
+        if isinstance(entry, dict) and str(entry.get("id")) in wanted and all(k in entry for k in fastpath.HEADS):
+            results[str(entry.pop("id"))] = entry
+    return results, usage
+
+_CLASSIFIER = microbatch.MicroBatcher("classify", _classify_many, _classify_one)
+
+async def _classify(domain: str, title: str, body: str):
+    return await _CLASSIFIER.submit((domain, title, body))
+
+async def classify_and_summarize(domain: str, title: str, body: str):
+    data, _usage = await _classify(domain, title, body)
     return data
 
-def combine_verdict(domain: str, labels: dict, noise: int):
+async def summarize(domain: str, title: str, body: str):
+    # bullets only, for pages the fast path already labelled
+    prompt = f"""
+Summarize the page below for an older reader. Return strict JSON with one field:
+- summary_bullets: array of 3-5 short bullets (<=20 words each), plain text
+
+DOMAIN: {domain}
+TITLE: {title}
+BODY (truncated): {body[:4000]}
+"""
+    data, _usage = await llm.complete_json([
+        {"role": "system", "content": "Return only valid JSON."},
+        {"role": "user", "content": prompt},
+    ])
+    return data.get("summary_bullets", [])
+
+async def _local_summary(domain: str, title: str, body: str):
+    if settings.FASTPATH_SUMMARY == "llm":
+        return await summarize(domain, title, body)
+    return fastpath.extractive_bullets(body)
+
+async def label_page(domain: str, title: str, body: str, noise: int, rep_score: Optional[float]):
+    """Returns (labels, source). Cheap local tiers first, the LLM only when they can't decide."""
+    labels = fastpath.predict(domain, title, body, noise, rep_score)
+    if labels is not None:
+        labels["summary_bullets"] = await _local_summary(domain, title, body)
+        return labels, "fastpath"
+    key = label_cache.content_key(title, body, PROMPT_VERSION)
+    labels = await label_cache.get(key)
+    if labels is not None:
+        return labels, "content_cache"
+    labels = neardup.query(title, body)
+    if labels is not None:
+        labels["summary_bullets"] = await _local_summary(domain, title, body)
+        return labels, "near_duplicate"
+    labels, usage = await _classify(domain, title, body)
+    label_cache.put(key, labels, usage, PROMPT_VERSION)
+    neardup.add(title, body, labels)
+    return labels, "llm"
+
+def combine_verdict(domain: str, labels: dict, noise: int, rep_score: Optional[float] = None):
     reasons = []
-    # domain reputation
-    if domain in LOW_REP_DOMAINS:
+    # domain reputation (score: 0 junk .. 1 reputable; None when unknown)
+    if rep_score is not None and rep_score < settings.REPUTATION_LOW_SCORE:
         reasons.append("low_domain_rep")
     # label-based
     if labels.get("headline_style") == "clickbait":
@@ -111,6 +219,9 @@ def combine_verdict(domain: str, labels: dict, noise: int):
             "sensational_tone": 1,
             "intrusive_ui": 1,
         }.get(r, 0)
+    # a well-established outlet gets the benefit of the doubt on style-only signals
+    if rep_score is not None and rep_score >= settings.REPUTATION_HIGH_SCORE:
+        weight = max(weight - 1, 0)
 
     if "scam_signals" in reasons or weight >= 4:
         verdict = "danger"
@@ -120,15 +231,111 @@ def combine_verdict(domain: str, labels: dict, noise: int):
         verdict = "ok"
     return verdict, reasons
 
-async def run_check(url: str):
-    norm = normalize_url(url)
-    html, final_url, headers = await fetch_html(norm)
-    title, body = extract_text(html)
-    ext = tldextract.extract(final_url)
-    domain = ".".join(part for part in [ext.domain, ext.suffix] if part)
-    labels = await classify_and_summarize(domain, title, body)
-    noise = ux_noise_score(html)
-    verdict, reasons = combine_verdict(domain, labels, noise)
+def _no_progress(kind: str, data: dict):
+    pass
+
+def _labels_version() -> str:
+    return f"{settings.OPENAI_MODEL}|{PROMPT_VERSION}"
+
+def _domain_of(final_url: str) -> str:
+    with metrics.stage("tldextract"):
+        return psl.registered_domain(final_url)
+
+def _lookup_reputation(final_url: str, domain: str):
+    with metrics.stage("reputation"):
+        return reputation.lookup(urlparse(final_url).hostname or domain)
+
+def _reuse_not_modified(prior: dict, fetch_info: dict, chain: List[str], emit):
+    # 304: the page is what we labelled last time; only reputation may have moved
+    meta = dict(prior["meta"])
+    domain, labels, noise = meta["domain"], meta["labels"], meta["noise"]
+    rep = _lookup_reputation(meta["final_url"], domain)
+    rep_score = rep["score"] if rep else None
+    emit("resolved", {"final_url": meta["final_url"], "domain": domain, "reputation": rep, "redirect_chain": chain})
+    with metrics.stage("verdict"):
+        verdict, reasons = combine_verdict(domain, labels, noise, rep_score)
+    summary = "• " + "\n• ".join(labels.get("summary_bullets", [])[:5])
+    meta.update(reputation=rep, fetch=fetch_info, labels_source="revalidated", revalidation="not_modified",
+                redirect_chain=chain)
+    return verdict, reasons, summary, meta
+
+async def _non_html(final_url: str, headers: dict, fetch_info: dict, chain: List[str], emit):
+    # PDFs: text of the first pages goes through the usual labelling tiers.
+    # Anything else (or an unreadable PDF): domain signals only, no LLM call.
+    kind = fetch_info["content_kind"]
+    domain = _domain_of(final_url)
+    rep = _lookup_reputation(final_url, domain)
+    rep_score = rep["score"] if rep else None
+    emit("resolved", {"final_url": final_url, "domain": domain, "reputation": rep, "redirect_chain": chain})
+    page = None
+    if kind == "pdf":
+        with metrics.stage("pdf"):
+            page = await preflight.pdf_text(final_url, headers)
+    if page is not None:
+        title, body = page
+        with metrics.stage("label"):
+            labels, labels_source = await label_page(domain, title, body, 0, rep_score)
+    else:
+        title, body = preflight.file_name(final_url), ""
+        labels = {"summary_bullets": [preflight.describe(kind, final_url, headers, domain)]}
+        labels_source = "metadata"
+    with metrics.stage("verdict"):
+        verdict, reasons = combine_verdict(domain, labels, 0, rep_score)
+    summary = "• " + "\n• ".join(labels.get("summary_bullets", [])[:5])
+    meta = {
+        "domain": domain,
+        "final_url": final_url,
+        "title": title,
+        "headers_subset": {k: headers.get(k) for k in ["content-type", "content-length", "server"]},
+        "labels": labels,
+        "labels_source": labels_source,
+        "excerpt": fastpath.excerpt(body),
+        "noise": 0,
+        "reputation": rep,
+        "fetch": fetch_info,
+        "content_kind": kind,
+        "redirect_chain": chain,
+    }
+    return verdict, reasons, summary, meta
+
+async def _run_pipeline(norm: str, emit: Callable[[str, dict], None] = _no_progress, chain: Optional[List[str]] = None):
+    # emit() reports early results to streaming clients; the return value is unchanged.
+    # chain: redirects pre-flight already followed to get to norm
+    key, version = url_hash(norm), _labels_version()
+    prior = await validators.get(key, version)
+    with metrics.stage("fetch"):
+        html, final_url, headers, fetch_info = await fetch_html(norm, headers=validators.conditional_headers(prior))
+    metrics.count("fetches")
+    metrics.count("fetch_bytes", fetch_info.get("bytes") or 0)
+    chain = preflight.full_chain(chain or [norm], fetch_info.get("redirects") or [], final_url)
+    if fetch_info["stopped"] == "not_modified" and prior is not None:
+        validators.record_outcome("not_modified")
+        return _reuse_not_modified(prior, fetch_info, chain, emit)
+    if fetch_info["stopped"] == "not_html":
+        return await _non_html(final_url, headers, fetch_info, chain, emit)
+    with metrics.stage("extract"):
+        title, body, noise = await extract_page_async(html or "")
+    domain = _domain_of(final_url)
+    rep = _lookup_reputation(final_url, domain)
+    rep_score = rep["score"] if rep else None
+    emit("resolved", {"final_url": final_url, "domain": domain, "reputation": rep, "redirect_chain": chain})
+    # provisional: page noise and domain signals only, before any labelling
+    verdict, reasons = combine_verdict(domain, {}, noise, rep_score)
+    emit("provisional", {"title": title, "noise": noise, "verdict": verdict, "reasons": reasons})
+    chash = validators.content_hash(title, body)
+    revalidation = None
+    if prior is not None and prior["content_hash"] == chash:
+        # same text under a new ETag/date (ads, timestamps): keep the labels
+        labels, labels_source, revalidation = prior["meta"]["labels"], "revalidated", "unchanged"
+        validators.record_outcome("unchanged")
+    else:
+        if prior is not None:
+            revalidation = "changed"
+            validators.record_outcome("changed")
+        with metrics.stage("label"):
+            labels, labels_source = await label_page(domain, title, body, noise, rep_score)
+    with metrics.stage("verdict"):
+        verdict, reasons = combine_verdict(domain, labels, noise, rep_score)
     summary = "• " + "\n• ".join(labels.get("summary_bullets", [])[:5])
 
     meta = {
@@ -137,6 +344,133 @@ async def run_check(url: str):
         "title": title,
         "headers_subset": {k: headers.get(k) for k in ["content-type", "server"]},
         "labels": labels,
+        "labels_source": labels_source,
+        "excerpt": fastpath.excerpt(body),  # training input for the fast-path model
         "noise": noise,
+        "reputation": rep,
+        "fetch": fetch_info,
+        "redirect_chain": chain,
     }
+    if revalidation is not None:
+        meta["revalidation"] = revalidation
+    validators.put(key, etag=headers.get("etag"), last_modified=headers.get("last-modified"),
+                   chash=chash, meta=meta, version=version)
+    return verdict, reasons, summary, meta
+
+# url_hash -> task running the pipeline; concurrent checks of one url share it
+_INFLIGHT: Dict[str, asyncio.Task] = {}
+_INFLIGHT_STATS = {"leaders": 0, "followers": 0}
+
+class _Progress:
+    """Stage events of one in-flight run; late subscribers get a replay."""
+    __slots__ = ("events", "listeners")
+
+    def __init__(self):
+        self.events: List[tuple] = []
+        self.listeners: List[Callable[[str, dict], None]] = []
+
+    def emit(self, kind: str, data: dict):
+        self.events.append((kind, data))
+        for fn in list(self.listeners):
+            fn(kind, data)
+
+# url_hash -> progress of the task in _INFLIGHT
+_PROGRESS: Dict[str, _Progress] = {}
+
+async def _target_cached(target: str, chain: List[str]):
+    # several short links, one article: the target may already have a verdict
+    with metrics.stage("verdict_cache"):
+        hit = await verdict_cache.get_verdict(url_hash(target))
+    if hit is None:
+        return None
+    (verdict, reasons, summary, meta), tier, age = hit
+    chain = preflight.full_chain(chain, [], meta.get("final_url") or chain[-1])
+    meta = {**meta, "cached": True, "cache_tier": tier, "cache_age_s": round(age, 1), "redirect_chain": chain}
+    return verdict, list(reasons), summary, meta
+
+async def _run_and_cache(key: str, norm: str, emit: Callable[[str, dict], None] = _no_progress):
+    with metrics.stage("preflight"):
+        target, chain = await preflight.resolve(norm)
+    target = normalize_url(target)
+    result = await _target_cached(target, chain) if target != norm else None
+    if result is None:
+        # only a real fetch + label run holds a pipeline slot
+        async with admission.pipeline_slot():
+            result = await _run_pipeline(target, emit, chain)
+        if target != norm:
+            verdict, reasons, summary, meta = result
+            verdict_cache.put_verdict(url_hash(target), (verdict, reasons, summary, {**meta, "url_hash": url_hash(target), "cached": False}))
+    verdict, reasons, summary, meta = result
+    meta["url_hash"] = key
+    meta.setdefault("cached", False)
+    verdict_cache.put_verdict(key, (verdict, reasons, summary, dict(meta)))
     return verdict, reasons, summary, meta
+
+def _inflight_done(key: str, task: asyncio.Task):
+    if _INFLIGHT.get(key) is task:
+        del _INFLIGHT[key]
+        _PROGRESS.pop(key, None)
+    # mark the exception retrieved even if every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
+
+def _with_timings(meta: dict) -> dict:
+    if settings.METRICS_IN_META:
+        timings = metrics.current()
+        if timings is not None:
+            meta["timings_ms"] = timings
+    return meta
+
+async def run_check(url: str, progress: Optional[Callable[[str, dict], None]] = None, refresh: bool = False):
+    """progress(kind, data), if given, gets the "resolved" and "provisional" events of
+    the run (replayed if it had already started); cache hits go straight to the result.
+    refresh skips the verdict cache; the page is still revalidated rather than relabelled
+    when it hasn't changed."""
+    with metrics.stage("normalize"):
+        norm = normalize_url(url)
+        key = url_hash(norm)
+    hit = None
+    if not refresh:
+        with metrics.stage("verdict_cache"):
+            hit = await verdict_cache.get_verdict(key)
+    if hit is not None:
+        (verdict, reasons, summary, meta), tier, age = hit
+        meta = {**meta, "url_hash": key, "cached": True, "cache_tier": tier, "cache_age_s": round(age, 1)}
+        return verdict, reasons, summary, _with_timings(meta)
+
+    task = _INFLIGHT.get(key)
+    coalesced = task is not None
+    if task is None:
+        _INFLIGHT_STATS["leaders"] += 1
+        hub = _PROGRESS[key] = _Progress()
+        task = asyncio.ensure_future(_run_and_cache(key, norm, hub.emit))
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda t: _inflight_done(key, t))
+    else:
+        _INFLIGHT_STATS["followers"] += 1
+        hub = _PROGRESS.get(key)
+    if progress is not None and hub is not None:
+        for kind, data in hub.events:
+            progress(kind, data)
+        hub.listeners.append(progress)
+    # shield: a caller going away must not cancel the run other callers are awaiting
+    try:
+        with metrics.stage("pipeline"):
+            verdict, reasons, summary, meta = await asyncio.shield(task)
+    finally:
+        if progress is not None and hub is not None:
+            hub.listeners.remove(progress)
+    return verdict, list(reasons), summary, _with_timings({**meta, "coalesced": coalesced})
+
+def inflight_stats() -> dict:
+    return {"inflight": len(_INFLIGHT), **_INFLIGHT_STATS}
+
+def classify_batch_stats() -> dict:
+    return _CLASSIFIER.stats()
+
+async def invalidate_check(url: str) -> str:
+    # drop the cached verdict and validators for a url so the next check fully re-runs
+    key = url_hash(normalize_url(url))
+    await verdict_cache.invalidate(key)
+    await validators.invalidate(key)
+    return key
@@ -5,19 +5,190 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     ALLOW_ORIGINS: str = "http://localhost:5173"
     DATABASE_URL: Optional[str] = None
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_TIMEOUT: float = 5.0        # max wait for a free connection
+    DB_POOL_MAX_IDLE: float = 300.0
+    DB_POOL_MAX_LIFETIME: float = 3600.0
+    DB_PREPARE: bool = True             # set False behind pgbouncer in transaction mode
 
     # Supabase
     SUPABASE_URL: str
     SUPABASE_JWT_AUD: str = "authenticated"  # default Supabase audience
+    AUTH_JWKS_TTL: float = 600.0             # serve cached JWKS without refreshing
+    AUTH_JWKS_STALE_TTL: float = 3600.0      # then serve stale while refreshing in background
+    AUTH_UNKNOWN_KID_INTERVAL: float = 30.0  # min seconds between refreshes for unknown kids
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_MAX_TTL: float = 600.0  # verified tokens are also evicted at exp
 
     # OpenAI
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL: str = "gpt-4o-mini"
+    OPENAI_BASE_URL: Optional[str] = None  # e.g. a local stand-in for load tests
+    LLM_MAX_CONCURRENCY: int = 8     # in-flight completions per worker
+    LLM_MAX_RETRIES: int = 3         # on 429 / 5xx / connection errors
+    LLM_BACKOFF_BASE: float = 0.5
+    LLM_BACKOFF_MAX: float = 8.0
+    LLM_DEADLINE: float = 20.0       # per call, queueing and retries included
+    LLM_BATCH_MAX_ITEMS: int = 6     # pages per classify request; 1 disables batching
+    LLM_BATCH_WINDOW_MS: float = 25  # how long the first page waits for company
+
+    # Instrumentation
+    METRICS_ENABLED: bool = True         # stage histograms on /metrics
+    METRICS_SERVER_TIMING: bool = True   # per-request stage timings as a Server-Timing header
+    METRICS_IN_META: bool = False        # also copy them into meta["timings_ms"]
+
+    # Content-keyed LLM label cache
+    LABEL_CACHE_MAX_ENTRIES: int = 20000
+    LABEL_CACHE_TTL: int = 7 * 24 * 3600
+
+    # Near-duplicate index (MinHash + LSH over extracted text)
+    NEARDUP_ENABLED: bool = True
+    NEARDUP_PATH: Optional[str] = None       # defaults to models/neardup.npz
+    NEARDUP_MAX_ENTRIES: int = 50000
+    NEARDUP_MAX_AGE: int = 30 * 24 * 3600
+    NEARDUP_THRESHOLD: float = 0.8           # estimated Jaccard similarity of 5-word shingles
+    NEARDUP_PERMUTATIONS: int = 128
+    NEARDUP_BANDS: int = 32                  # 4 rows per band
+    NEARDUP_MIN_SHINGLES: int = 40
+    NEARDUP_SAVE_INTERVAL: int = 300
+
+    # Local fast-path classifier (skips the LLM for confident pages)
+    FASTPATH_ENABLED: bool = True
+    FASTPATH_MODEL: Optional[str] = None     # defaults to models/fastpath.npz
+    FASTPATH_THRESHOLD: float = 0.9          # every label head must be at least this sure
+    FASTPATH_SUMMARY: str = "extractive"     # "extractive" | "llm" (bullets-only call)
 
     # Stripe
     STRIPE_SECRET_KEY: Optional[str] = None
     STRIPE_PRICE_ID: Optional[str] = None
     STRIPE_WEBHOOK_SECRET: Optional[str] = None
+    STRIPE_API_BASE: Optional[str] = None        # e.g. a local stand-in; defaults to api.stripe.com
+    STRIPE_EVENT_BATCH: int = 50                 # webhook events applied per transaction
+    STRIPE_EVENT_POLL: float = 5.0               # seconds; events stored by other nodes, retries
+    STRIPE_EVENT_MAX_ATTEMPTS: int = 8
+    STRIPE_EVENT_BACKOFF: float = 10.0           # retry delay doubles per attempt, jittered
+
+    # Subscription entitlements (in memory, see app/entitlements.py)
+    ENTITLEMENT_REFRESH_INTERVAL: float = 30.0   # delta reload of changed subscriptions
+    ENTITLEMENT_REFRESH_OVERLAP: float = 60.0    # seconds re-read behind the watermark
+
+    # Write-behind url_checks persistence
+    WRITER_QUEUE_SIZE: int = 10000
+    WRITER_BATCH_SIZE: int = 500
+    WRITER_FLUSH_INTERVAL: float = 1.0   # seconds; also the retry backoff base
+    WRITER_MAX_RETRIES: int = 5
+    WRITER_DRAIN_TIMEOUT: float = 10.0   # max time spent flushing on shutdown
+
+    # Verdict cache (seconds per verdict band)
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_TTL_OK: int = 24 * 3600
+    CACHE_TTL_WARNING: int = 6 * 3600
+    CACHE_TTL_DANGER: int = 3600
+    CACHE_INVALIDATION_POLL: float = 5.0      # other workers' invalidations reach this one's memory tier
+    CACHE_INVALIDATION_OVERLAP: float = 60.0  # seconds re-read behind the watermark
+
+    # Conditional revalidation (ETag / Last-Modified / text hash)
+    VALIDATOR_MAX_ENTRIES: int = 50000
+    VALIDATOR_TTL: int = 14 * 24 * 3600  # how long stored labels may be reused for an unchanged page
+
+    # Background worker (python -m app.worker)
+    WORKER_CONCURRENCY: int = 8
+    WORKER_POLL_INTERVAL: float = 2.0        # seconds between claims when the queue is empty
+    WORKER_JOB_TIMEOUT: float = 60.0
+    WORKER_LEASE: float = 300.0              # running jobs older than this are requeued
+    WORKER_MAX_ATTEMPTS: int = 4
+    WORKER_BACKOFF_BASE: float = 30.0        # retry delay doubles per attempt, jittered
+    WORKER_BACKOFF_MAX: float = 3600.0
+    WORKER_RESULT_BATCH: int = 100           # job status updates written back per statement
+    WORKER_RESULT_FLUSH: float = 1.0
+    WORKER_HOUSEKEEPING_INTERVAL: float = 300.0  # requeue stale jobs + seed popular urls
+    WORKER_SEED_WINDOW: int = 7 * 24 * 3600  # popularity = checks in this window
+    WORKER_SEED_LIMIT: int = 500
+    WORKER_REFRESH_AT: float = 0.8           # refresh once this share of the verdict TTL has passed
+    WORKER_OPERATOR_PRIORITY: int = 100      # popular urls get min(check count, 1000)
+    WORKER_LOG_INTERVAL: float = 60.0
+
+    # Check history / caregiver dashboard
+    HISTORY_PAGE_SIZE: int = 25
+    HISTORY_MAX_PAGE_SIZE: int = 100
+    SUMMARY_DEFAULT_DAYS: int = 30
+    SUMMARY_MAX_DAYS: int = 365
+    SUMMARY_TOP_REASONS: int = 5
+    CAREGIVER_LINK_TTL: float = 60.0     # seconds a caregiver's elder list is cached
+
+    # Admission control (app/admission.py)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_BACKEND: str = "memory"        # "postgres" shares token buckets across workers/nodes
+    RATE_ANON_PER_MIN: float = 10.0          # per client IP
+    RATE_ANON_BURST: float = 5.0
+    RATE_FREE_PER_MIN: float = 30.0          # per user
+    RATE_FREE_BURST: float = 10.0
+    RATE_PAID_PER_MIN: float = 120.0
+    RATE_PAID_BURST: float = 30.0
+    ADMISSION_MAX_INFLIGHT: int = 64         # concurrent pipeline runs per process
+    ADMISSION_MAX_QUEUE: int = 500
+    ADMISSION_BUDGET_ANON: float = 2.0       # seconds a caller may queue for a slot before 503
+    ADMISSION_BUDGET_FREE: float = 4.0
+    ADMISSION_BUDGET_PAID: float = 10.0
+    ADMISSION_DEFAULT_PIPELINE_S: float = 2.0    # slot hold time assumed until measured
+    ADMISSION_MAX_BUCKETS: int = 100000
+    ADMISSION_TRUST_PROXY: bool = False      # key anonymous callers on X-Forwarded-For
+
+    # Batch checks
+    BATCH_MAX_URLS: int = 1000
+    BATCH_CONCURRENCY: int = 16
+    BATCH_RATE_MAX_WAIT: float = 10.0   # an item waits this long for a rate token, then errors "rate_limited"
+
+    # Streaming check (/api/check/stream)
+    SSE_KEEPALIVE: float = 15.0          # seconds between keepalive comment lines
+
+    # Outbound HTTP client (page fetching)
+    HTTP_HTTP2: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_MAX_PER_HOST: int = 6
+    HTTP_CONNECT_TIMEOUT: float = 3.0
+    HTTP_READ_TIMEOUT: float = 8.0
+    HTTP_TOTAL_TIMEOUT: float = 10.0
+    HTTP_DNS_TTL: float = 300.0  # 0 disables the DNS cache
+
+    # Streaming fetch: stop reading once the article text we use has arrived
+    FETCH_STREAMING: bool = True
+    FETCH_MAX_BYTES: int = 1_500_000
+    FETCH_STOP_PARAS: int = 8            # margin over the 6 paragraphs we keep
+    FETCH_STOP_CHARS: int = 4000
+    FETCH_MIN_PARA_CHARS: int = 60       # shorter <p>s (bylines, captions) don't count
+
+    # Domain reputation
+    REPUTATION_CSV: Optional[str] = None         # defaults to seeds/domain_reputation.csv
+    REPUTATION_RELOAD_INTERVAL: float = 60.0     # seconds between change checks; 0 = never
+    REPUTATION_BLOOM_FP_RATE: float = 0.01
+    REPUTATION_LOW_SCORE: float = 0.4            # below => low_domain_rep
+    REPUTATION_HIGH_SCORE: float = 0.8           # at/above => softens style-only signals
+
+    # Pre-flight (app/preflight.py): shortener resolution, non-HTML fast paths
+    PREFLIGHT_ENABLED: bool = True
+    PREFLIGHT_SHORTENERS: str = ""               # extra shortener hosts, comma separated
+    PREFLIGHT_MAX_REDIRECTS: int = 5
+    PREFLIGHT_TIMEOUT: float = 4.0               # whole shortener walk; unresolved links are fetched as-is
+    PREFLIGHT_CACHE_MAX_ENTRIES: int = 50000
+    PREFLIGHT_CACHE_TTL: int = 7 * 24 * 3600     # shortener -> target
+    PDF_MAX_BYTES: int = 8_000_000               # bigger PDFs get a metadata-only verdict
+    PDF_MAX_PAGES: int = 5
+
+    # Public suffix list (app/psl.py); defaults to seeds/public_suffix_list.dat
+    PSL_PATH: Optional[str] = None
+
+    # Startup warm-up (app/warmup.py), before the app starts serving
+    WARMUP_ENABLED: bool = True
+    WARMUP_TIMEOUT: float = 20.0
+    WARMUP_JWKS: bool = True   # start the JWKS fetch during warm-up, in the background
+
+    # Content extraction
+    EXTRACT_WORKERS: int = 2             # process pool size; 0 runs inline
+    EXTRACT_MAX_CHARS: int = 2_000_000   # hard cap on html fed to the parser
 
     class Config:
         env_file = "api/.env"
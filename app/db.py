@@ -1,20 +1,546 @@
 import psycopg
 from contextlib import asynccontextmanager
+from typing import Optional
+from psycopg_pool import AsyncConnectionPool
 from .config import settings
 
-async def get_conn():
-    # psycopg3 async connection
-    return await psycopg.AsyncConnection.connect(settings.DATABASE_URL)
+_POOL: Optional[AsyncConnectionPool] = None
 
-async def insert_url_check(conn, *, user_id, url, verdict, reasons, summary, raw_meta):
+async def open_pool():
+    # owned by the app lifespan (main.py); no-op when DATABASE_URL is unset
+    global _POOL
+    if _POOL is not None or not settings.DATABASE_URL:
+        return
+    pool = AsyncConnectionPool(
+        settings.DATABASE_URL,
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        timeout=settings.DB_POOL_TIMEOUT,
+        max_idle=settings.DB_POOL_MAX_IDLE,
+        max_lifetime=settings.DB_POOL_MAX_LIFETIME,
+        # health check on checkout so a dropped server connection is replaced, not handed out
+        check=AsyncConnectionPool.check_connection,
+        kwargs={"prepare_threshold": 5 if settings.DB_PREPARE else None},
+        name="gentle",
+        open=False,
+    )
+    await pool.open(wait=False)
+    _POOL = pool
+
+async def wait_pool(timeout: float):
+    # warm-up: block until the pool holds min_size connections
+    if _POOL is not None:
+        await _POOL.wait(timeout)
+
+async def close_pool():
+    global _POOL
+    if _POOL is not None:
+        await _POOL.close()
+    _POOL = None
+
+@asynccontextmanager
+async def connection():
+    """Borrow a connection; commits on clean exit, rolls back on error.
+
+    Uses the pool when the lifespan opened one, else a one-off connection
+    (scripts, workers started without the app)."""
+    if _POOL is not None:
+        async with _POOL.connection() as conn:
+            yield conn
+    else:
+        async with await psycopg.AsyncConnection.connect(settings.DATABASE_URL) as conn:
+            yield conn
+
+def pool_stats() -> dict:
+    return _POOL.get_stats() if _POOL is not None else {}
+
+def _prepare():
+    # hot queries are prepared server-side up front; off for pgbouncer transaction mode
+    return bool(settings.DB_PREPARE)
+
+async def insert_url_check(conn, *, user_id, url, verdict, reasons, summary, raw_meta, url_hash=None, cached=False):
     async with conn.cursor() as cur:
         await cur.execute(
             """
-            insert into url_checks (user_id, url, verdict, reasons, summary, raw_meta)
-            values (%s, %s, %s, %s::jsonb, %s, %s::jsonb)
+            insert into url_checks (user_id, url, url_hash, verdict, reasons, summary, raw_meta, cached)
+            values (%s, %s, %s, %s, %s::jsonb, %s, %s::jsonb, %s)
             returning id
             """,
-            (user_id, url, verdict, reasons, summary, raw_meta),
+            (user_id, url, url_hash, verdict, reasons, summary, raw_meta, cached),
+            prepare=_prepare(),
         )
         row = await cur.fetchone()
         return row[0]
+
+async def copy_url_checks(conn, rows):
+    # bulk path used by the write-behind writer; row layout from writer.check_row
+    async with conn.cursor() as cur:
+        async with cur.copy(
+            """
+            copy url_checks (user_id, url, url_hash, verdict, reasons, summary, raw_meta, cached, created_at)
+            from stdin
+            """
+        ) as copy:
+            for row in rows:
+                await copy.write_row(row)
+
+async def get_cached_check(conn, url_hash):
+    # newest origin (non-cached) verdict for this url and its age in seconds,
+    # unless the url was invalidated after it was written
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            select c.verdict, c.reasons, c.summary, c.raw_meta,
+                   extract(epoch from now() - c.created_at)::float8
+            from url_checks c
+            where c.url_hash = %s and not c.cached
+              and not exists (select 1 from url_invalidations i
+                              where i.url_hash = c.url_hash and i.invalidated_at >= c.created_at)
+            order by c.created_at desc
+            limit 1
+            """,
+            (url_hash,),
+            prepare=_prepare(),
+        )
+        return await cur.fetchone()
+
+async def invalidate_url(conn, url_hash):
+    # history rows stay as they are; checks written before invalidated_at stop being cache entries
+    await conn.execute(
+        """
+        insert into url_invalidations (url_hash, invalidated_at) values (%s, now())
+        on conflict (url_hash) do update set invalidated_at = excluded.invalidated_at
+        """,
+        (url_hash,),
+        prepare=_prepare(),
+    )
+
+async def load_url_invalidations(conn, since, overlap):
+    # invalidations since the watermark (or now, before the first one) minus overlap seconds
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            select url_hash, invalidated_at from url_invalidations
+            where invalidated_at > coalesce(%s::timestamptz, now()) - make_interval(secs => %s)
+            """,
+            (since, overlap),
+            prepare=_prepare(),
+        )
+        return await cur.fetchall()
+
+async def get_profile_role(conn, user_id):
+    cur = await conn.execute("select role from profiles where user_id = %s", (user_id,), prepare=_prepare())
+    row = await cur.fetchone()
+    return row[0] if row else None
+
+async def get_url_validator(conn, url_hash, max_age):
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            select etag, last_modified, content_hash, meta, version,
+                   extract(epoch from now() - updated_at)::float8
+            from url_validators
+            where url_hash = %s and updated_at > now() - make_interval(secs => %s)
+            """,
+            (url_hash, max_age),
+            prepare=_prepare(),
+        )
+        return await cur.fetchone()
+
+async def upsert_url_validator(conn, url_hash, etag, last_modified, content_hash, meta_json, version):
+    await conn.execute(
+        """
+        insert into url_validators (url_hash, etag, last_modified, content_hash, meta, version, updated_at)
+        values (%s, %s, %s, %s, %s::jsonb, %s, now())
+        on conflict (url_hash) do update set
+          etag = excluded.etag, last_modified = excluded.last_modified,
+          content_hash = excluded.content_hash, meta = excluded.meta,
+          version = excluded.version, updated_at = now()
+        """,
+        (url_hash, etag, last_modified, content_hash, meta_json, version),
+        prepare=_prepare(),
+    )
+
+async def delete_url_validator(conn, url_hash):
+    await conn.execute("delete from url_validators where url_hash = %s", (url_hash,))
+
+# --- llm_label_cache (app/label_cache.py) ---
+
+async def get_label_cache_entry(conn, key, ttl):
+    # (labels, prompt_tokens, completion_tokens) written within ttl seconds
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            select labels, prompt_tokens, completion_tokens from llm_label_cache
+            where key = %s and created_at > now() - make_interval(secs => %s)
+            """,
+            (key, ttl),
+            prepare=_prepare(),
+        )
+        return await cur.fetchone()
+
+async def upsert_label_cache_entry(conn, key, model, prompt_version, labels_json, prompt_tokens, completion_tokens):
+    await conn.execute(
+        """
+        insert into llm_label_cache (key, model, prompt_version, labels, prompt_tokens, completion_tokens)
+        values (%s, %s, %s, %s::jsonb, %s, %s)
+        on conflict (key) do update set labels = excluded.labels, created_at = now()
+        """,
+        (key, model, prompt_version, labels_json, prompt_tokens, completion_tokens),
+        prepare=_prepare(),
+    )
+
+async def purge_label_cache(conn, model, prompt_version):
+    # rows from any other model/prompt version; returns how many went
+    cur = await conn.execute(
+        "delete from llm_label_cache where model <> %s or prompt_version <> %s",
+        (model, prompt_version),
+    )
+    return cur.rowcount
+
+# --- domain_reputation (app/reputation.py) ---
+
+async def get_reputation_version(conn):
+    # (row count, newest updated_at): cheap change detection for the reload watcher
+    cur = await conn.execute("select count(*), max(updated_at) from domain_reputation", prepare=_prepare())
+    return tuple(await cur.fetchone())
+
+async def copy_domain_reputation(conn):
+    rows = []
+    async with conn.cursor() as cur:
+        async with cur.copy("copy (select domain, score, label from domain_reputation) to stdout") as copy:
+            copy.set_types(["text", "float4", "text"])
+            async for row in copy.rows():
+                rows.append(row)
+    return rows
+
+async def get_stripe_customer_id(conn, user_id):
+    async with conn.cursor() as cur:
+        await cur.execute(
+            "select stripe_customer_id from subscriptions where user_id = %s",
+            (user_id,),
+            prepare=_prepare(),
+        )
+        row = await cur.fetchone()
+        return row[0] if row and row[0] else None
+
+async def upsert_subscription(conn, *, user_id, customer_id, sub_id, status="active", event_at=None):
+    # event_at (Stripe's event.created): an older, late-delivered event doesn't overwrite a newer one.
+    # False when that happened
+    cur = await conn.execute(
+        """
+        insert into subscriptions(user_id, stripe_customer_id, stripe_sub_id, status, stripe_event_at, updated_at)
+        values (%s, %s, %s, %s, to_timestamp(%s), now())
+        on conflict (user_id)
+        do update set stripe_customer_id = excluded.stripe_customer_id,
+                      stripe_sub_id = excluded.stripe_sub_id,
+                      status = excluded.status,
+                      stripe_event_at = excluded.stripe_event_at,
+                      updated_at = now()
+        where subscriptions.stripe_event_at is null or excluded.stripe_event_at is null
+           or subscriptions.stripe_event_at <= excluded.stripe_event_at
+        """,
+        (user_id, customer_id, sub_id, status, event_at),
+        prepare=_prepare(),
+    )
+    return cur.rowcount == 1
+
+async def set_subscription_status(conn, sub_id, status, event_at=None):
+    # returns the subscriber's user_id (None for an unknown or already-newer subscription)
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            update subscriptions set status = %s, stripe_event_at = coalesce(to_timestamp(%s), stripe_event_at),
+                                     updated_at = now()
+            where stripe_sub_id = %s
+              and (stripe_event_at is null or %s::float8 is null or stripe_event_at <= to_timestamp(%s))
+            returning user_id::text
+            """,
+            (status, event_at, sub_id, event_at, event_at),
+            prepare=_prepare(),
+        )
+        row = await cur.fetchone()
+        return row[0] if row else None
+
+async def load_entitlements(conn, since, overlap):
+    # all subscriptions, or those changed since the watermark (minus overlap seconds)
+    async with conn.cursor() as cur:
+        if since is None:
+            await cur.execute("select user_id::text, status, updated_at from subscriptions")
+        else:
+            await cur.execute(
+                """
+                select user_id::text, status, updated_at from subscriptions
+                where updated_at > %s - make_interval(secs => %s)
+                """,
+                (since, overlap),
+                prepare=_prepare(),
+            )
+        return await cur.fetchall()
+
+# --- stripe_events (webhook inbox, app/billing.py) ---
+
+async def insert_stripe_event(conn, event_id, event_type, created, payload_json):
+    # False when Stripe redelivered an event we already have
+    cur = await conn.execute(
+        """
+        insert into stripe_events (id, type, created, payload)
+        values (%s, %s, to_timestamp(%s), %s::jsonb)
+        on conflict (id) do nothing
+        """,
+        (event_id, event_type, created, payload_json),
+        prepare=_prepare(),
+    )
+    return cur.rowcount == 1
+
+async def claim_stripe_events(conn, n):
+    # rows stay locked until the caller's transaction ends; oldest Stripe event first
+    cur = await conn.execute(
+        """
+        with next as (
+          select id from stripe_events
+          where status = 'pending' and run_after <= now()
+          order by created, received_at
+          limit %s
+          for update skip locked
+        )
+        update stripe_events e set attempts = e.attempts + 1
+        from next where e.id = next.id
+        returning e.id, e.type, e.payload, e.attempts
+        """,
+        (n,),
+        prepare=_prepare(),
+    )
+    rows = await cur.fetchall()
+    # update ... returning doesn't keep the CTE's order
+    return sorted(rows, key=lambda r: (r[2].get("created") or 0))
+
+async def finish_stripe_event(conn, event_id, user_id):
+    await conn.execute(
+        """
+        update stripe_events set status = 'processed', processed_at = now(), user_id = %s, last_error = null
+        where id = %s
+        """,
+        (user_id, event_id),
+        prepare=_prepare(),
+    )
+
+async def retry_stripe_event(conn, event_id, error, delay, final):
+    await conn.execute(
+        """
+        update stripe_events
+        set status = case when %s then 'failed' else 'pending' end,
+            run_after = now() + make_interval(secs => %s), last_error = %s
+        where id = %s
+        """,
+        (final, delay, error, event_id),
+    )
+
+# --- check history / caregiver rollups (app/history.py) ---
+
+async def list_user_checks(conn, user_id, limit, before=None):
+    # keyset page on url_checks_user_history: (created_at, id) strictly older than the cursor
+    if before is None:
+        sql, params = "", (user_id, limit)
+    else:
+        sql, params = "and (created_at, id) < (%s::timestamptz, %s)", (user_id, before[0], before[1], limit)
+    async with conn.cursor() as cur:
+        await cur.execute(
+            f"""
+            select id::text, url, verdict, reasons, summary, created_at
+            from url_checks
+            where user_id = %s {sql}
+            order by created_at desc, id desc
+            limit %s
+            """,
+            params,
+            prepare=_prepare(),
+        )
+        return await cur.fetchall()
+
+async def get_caregiver_elders(conn, caregiver_id):
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            select elder_user_id::text, elder_email from caregivers_elders
+            where caregiver_id = %s order by created_at
+            """,
+            (caregiver_id,),
+            prepare=_prepare(),
+        )
+        return await cur.fetchall()
+
+async def get_verdict_rollups(conn, user_ids, days):
+    # [(user_id, day, verdict, checks)] for the last `days` days (UTC), from check_rollups_daily
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            select user_id::text, day, verdict, checks from check_rollups_daily
+            where user_id = any(%s::uuid[]) and day > (now() at time zone 'utc')::date - %s
+            order by day
+            """,
+            (user_ids, days),
+            prepare=_prepare(),
+        )
+        return await cur.fetchall()
+
+async def get_reason_rollups(conn, user_ids, days):
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            select user_id::text, day, reason, checks from check_reason_rollups_daily
+            where user_id = any(%s::uuid[]) and day > (now() at time zone 'utc')::date - %s
+            order by day
+            """,
+            (user_ids, days),
+            prepare=_prepare(),
+        )
+        return await cur.fetchall()
+
+async def get_last_check_times(conn, user_ids):
+    # one index probe per user on url_checks_user_history
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            select u.id::text, c.created_at
+            from unnest(%s::uuid[]) as u(id)
+            cross join lateral (
+              select created_at from url_checks
+              where user_id = u.id order by created_at desc limit 1
+            ) c
+            """,
+            (user_ids,),
+            prepare=_prepare(),
+        )
+        return await cur.fetchall()
+
+# --- shared token buckets (app/admission.py, ADMISSION_BACKEND=postgres) ---
+
+async def take_rate_tokens(conn, key, rate, burst, cost):
+    # refill and take in one statement; tokens left, or None when the bucket is short
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            insert into rate_buckets as b (key, tokens, updated_at)
+            values (%(key)s, %(burst)s - %(cost)s, clock_timestamp())
+            on conflict (key) do update set
+              tokens = least(%(burst)s, b.tokens + extract(epoch from clock_timestamp() - b.updated_at) * %(rate)s) - %(cost)s,
+              updated_at = clock_timestamp()
+            where least(%(burst)s, b.tokens + extract(epoch from clock_timestamp() - b.updated_at) * %(rate)s) >= %(cost)s
+            returning tokens
+            """,
+            {"key": key, "rate": rate, "burst": burst, "cost": cost},
+            prepare=_prepare(),
+        )
+        row = await cur.fetchone()
+        return row[0] if row else None
+
+# --- check_jobs queue (app/worker.py) ---
+
+async def enqueue_jobs(conn, jobs, *, source, priority, max_attempts):
+    # jobs: [(url, url_hash)]; urls already queued or running are skipped
+    async with conn.cursor() as cur:
+        await cur.executemany(
+            """
+            insert into check_jobs (url, url_hash, priority, source, max_attempts)
+            values (%s, %s, %s, %s, %s)
+            on conflict do nothing
+            """,
+            [(url, h, priority, source, max_attempts) for url, h in jobs],
+        )
+
+async def seed_popular_jobs(conn, *, window, limit, refresh_at, max_attempts):
+    # most-checked urls (by users; worker refreshes don't count) whose newest real
+    # verdict is past refresh_at of its TTL
+    cur = await conn.execute(
+        """
+        with popular as (
+          select url_hash, count(*) as n from url_checks
+          where created_at > now() - make_interval(secs => %(window)s) and url_hash is not null
+            and raw_meta->>'source' is distinct from 'refresh'
+          group by url_hash order by n desc limit %(limit)s
+        ), latest as (
+          select distinct on (c.url_hash) c.url_hash, c.url, c.verdict, c.created_at, p.n
+          from url_checks c join popular p using (url_hash)
+          where not c.cached
+          order by c.url_hash, c.created_at desc
+        )
+        insert into check_jobs (url, url_hash, priority, source, max_attempts)
+        select url, url_hash, least(n, 1000)::int, 'popular', %(max_attempts)s from latest
+        where created_at < now() - make_interval(secs => %(refresh_at)s * case verdict
+                when 'ok' then %(ttl_ok)s when 'warning' then %(ttl_warning)s else %(ttl_danger)s end)
+        on conflict do nothing
+        """,
+        {"window": window, "limit": limit, "refresh_at": refresh_at, "max_attempts": max_attempts,
+         "ttl_ok": settings.CACHE_TTL_OK, "ttl_warning": settings.CACHE_TTL_WARNING, "ttl_danger": settings.CACHE_TTL_DANGER},
+    )
+    return cur.rowcount
+
+async def claim_jobs(conn, worker_id, n):
+    # SKIP LOCKED: concurrent workers each get disjoint rows without waiting on each other
+    cur = await conn.execute(
+        """
+        with next as (
+          select id from check_jobs
+          where status = 'queued' and run_after <= now()
+          order by priority desc, run_after
+          limit %s
+          for update skip locked
+        )
+        update check_jobs j
+        set status = 'running', locked_by = %s, locked_at = now(), attempts = j.attempts + 1
+        from next where j.id = next.id
+        returning j.id, j.url, j.attempts, j.max_attempts,
+                  extract(epoch from now() - j.run_after)::float8
+        """,
+        (n, worker_id),
+        prepare=_prepare(),
+    )
+    return await cur.fetchall()
+
+async def complete_jobs(conn, ids, verdicts):
+    await conn.execute(
+        """
+        update check_jobs j
+        set status = 'done', verdict = v.verdict, finished_at = now(), locked_by = null, last_error = null
+        from unnest(%s::bigint[], %s::text[]) as v(id, verdict)
+        where j.id = v.id
+        """,
+        (ids, verdicts),
+    )
+
+async def fail_jobs(conn, ids, errors, delays):
+    # out of attempts -> failed, else back in the queue after its backoff
+    await conn.execute(
+        """
+        update check_jobs j
+        set status = case when j.attempts >= j.max_attempts then 'failed' else 'queued' end,
+            run_after = now() + make_interval(secs => v.delay),
+            finished_at = case when j.attempts >= j.max_attempts then now() end,
+            last_error = v.error, locked_by = null
+        from unnest(%s::bigint[], %s::text[], %s::float8[]) as v(id, error, delay)
+        where j.id = v.id
+        """,
+        (ids, errors, delays),
+    )
+
+async def requeue_stale_jobs(conn, lease):
+    # jobs whose worker died mid-run
+    cur = await conn.execute(
+        """
+        update check_jobs set status = 'queued', locked_by = null
+        where status = 'running' and locked_at < now() - make_interval(secs => %s)
+        """,
+        (lease,),
+    )
+    return cur.rowcount
+
+async def job_queue_stats(conn):
+    cur = await conn.execute(
+        """
+        select status, count(*),
+               extract(epoch from now() - min(run_after) filter (where run_after <= now()))::float8
+        from check_jobs group by status
+        """
+    )
+    return await cur.fetchall()
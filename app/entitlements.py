@@ -0,0 +1,103 @@
+# api/app/entitlements.py
+# Subscription entitlements in memory so paid-tier checks never query
+# `subscriptions` on the request path. The full table is loaded at startup;
+# after that only rows whose updated_at moved are re-read every
+# ENTITLEMENT_REFRESH_INTERVAL. The node that processes a Stripe event applies
+# it at once (billing._process_event), and other nodes pick it up on their next
+# delta. Users with no row are on the free plan.
+import asyncio, logging, time
+from typing import Dict, Optional
+from .config import settings
+from .db import connection, load_entitlements
+
+log = logging.getLogger(__name__)
+
+# past_due keeps access through Stripe's retry window
+PAID_STATUSES = frozenset({"active", "trialing", "past_due"})
+
+_STATUS: Dict[str, str] = {}   # user_id -> subscription status
+_STATE = {"watermark": None, "task": None, "loaded": False}
+_STATS = {"lookups": 0, "paid": 0, "refreshes": 0, "refresh_errors": 0, "applied": 0, "last_refresh_ms": 0.0}
+
+
+def get(user_id: Optional[str]) -> dict:
+    _STATS["lookups"] += 1
+    status = _STATUS.get(user_id) if user_id else None
+    paid = status in PAID_STATUSES
+    if paid:
+        _STATS["paid"] += 1
+    return {"plan": "paid" if paid else "free", "status": status}
+
+
+def plan(user: Optional[dict]) -> str:
+    """'anonymous', 'free' or 'paid'."""
+    if not user:
+        return "anonymous"
+    return get(user.get("id"))["plan"]
+
+
+def apply(user_id: Optional[str], status: Optional[str]):
+    if not user_id:
+        return
+    _STATS["applied"] += 1
+    if status is None:
+        _STATUS.pop(user_id, None)
+    else:
+        _STATUS[user_id] = status
+
+
+async def refresh():
+    t0 = time.monotonic()
+    # overlap the watermark: a transaction that started earlier may commit after our last read
+    since = _STATE["watermark"]
+    async with connection() as conn:
+        rows = await load_entitlements(conn, since, settings.ENTITLEMENT_REFRESH_OVERLAP)
+    for user_id, status, updated_at in rows:
+        _STATUS[user_id] = status
+        if _STATE["watermark"] is None or updated_at > _STATE["watermark"]:
+            _STATE["watermark"] = updated_at
+    _STATE["loaded"] = True
+    _STATS["refreshes"] += 1
+    _STATS["last_refresh_ms"] = round((time.monotonic() - t0) * 1000, 2)
+
+
+async def _loop():
+    while True:
+        try:
+            await refresh()
+        except Exception as e:
+            _STATS["refresh_errors"] += 1
+            log.warning("entitlement refresh failed: %s", e)
+        await asyncio.sleep(settings.ENTITLEMENT_REFRESH_INTERVAL)
+
+
+async def start():
+    if not settings.DATABASE_URL or _STATE["task"] is not None:
+        return
+    try:
+        await refresh()
+    except Exception as e:
+        # serve (everyone as free) rather than fail startup; the loop keeps trying
+        _STATS["refresh_errors"] += 1
+        log.warning("initial entitlement load failed: %s", e)
+    _STATE["task"] = asyncio.ensure_future(_loop())
+
+
+async def close():
+    task = _STATE["task"]
+    _STATE["task"] = None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+def stats() -> dict:
+    return {
+        **_STATS,
+        "users": len(_STATUS),
+        "loaded": _STATE["loaded"],
+        "watermark": _STATE["watermark"].isoformat() if _STATE["watermark"] else None,
+    }
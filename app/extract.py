@@ -0,0 +1,182 @@
+# api/app/extract.py
+# Page text extraction. One lxml parse per page is shared by the noise score,
+# readability and the plain <p> fallback; the work runs in a process pool so
+# big pages never block the event loop.
+import asyncio, codecs, itertools, multiprocessing, re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+import lxml.html
+from lxml import etree
+from .config import settings
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_PARSER = lxml.html.HTMLParser(encoding="utf-8", remove_comments=True)
+
+
+def _text(el) -> str:
+    return " ".join(s.strip() for s in el.itertext() if s.strip())
+
+
+def parse(html: str):
+    # capped input; bytes + explicit encoding so <?xml encoding=...?> prologs don't trip lxml
+    data = html[: settings.EXTRACT_MAX_CHARS].encode("utf-8", "replace")
+    return lxml.html.document_fromstring(data, parser=_PARSER)
+
+
+def ux_noise_score(tree, html: str) -> int:
+    # crude signals; higher => noisier. iframes come from the tree (so ones
+    # quoted inside scripts don't count); keyword scans stay on the raw string,
+    # which is ~20x cheaper than walking every text node and attribute
+    score = sum(1 for _ in tree.iter("iframe"))
+    score += html.count("subscribe") > 5
+    score += html.count("popup") > 2
+    return int(score)
+
+
+def extract_page(html: str) -> Tuple[str, str, int]:
+    """Returns (title, body, noise) for a page. Pure CPU; safe to run in a worker process."""
+    html = html[: settings.EXTRACT_MAX_CHARS]
+    try:
+        tree = parse(html)
+    except Exception:
+        return "", "", 0
+    # before readability: it drops hidden nodes from the tree it is given, and
+    # the noise score and the <p> fallback must see the page as served
+    noise = ux_noise_score(tree, html)
+    title_el = tree.find(".//title")
+    fallback_title = (_text(title_el) if title_el is not None else "")[:140]
+    fallback_paras = [_text(p) for p in itertools.islice(tree.iter("p"), 6)]
+
+    # Try readability. Title straight off our tree: Document.short_title()
+    # would deep-copy and re-clean the whole document just to read <title>
+    try:
+        # imported here: the API process itself only parses when EXTRACT_WORKERS=0
+        from readability import Document
+        from readability.htmls import shorten_title
+        title = (shorten_title(tree) or "").strip()
+        doc = Document(tree)
+        content = lxml.html.fragment_fromstring(doc.summary(html_partial=True), create_parent="div")
+        paras = [_text(p) for p in content.iter("p")]
+        body = "\n\n".join(paras[:6])  # keep it short for inference
+        if body.strip():
+            return title, body, noise
+    except Exception:
+        pass
+    # Fallback: plain paragraphs, read before readability touched the tree
+    return fallback_title, "\n\n".join(fallback_paras), noise
+
+
+def start():
+    global _POOL
+    if _POOL is None and settings.EXTRACT_WORKERS > 0:
+        # spawn, not fork: the parent has a running event loop and open sockets
+        _POOL = ProcessPoolExecutor(
+            max_workers=settings.EXTRACT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+
+_WARM_PAGE = "<html><head><title>warm-up</title></head><body>" + "<p>" + "warm-up text " * 20 + "</p>" * 3 + "</body></html>"
+
+
+async def warm():
+    """Starts every pool worker (spawn: a fresh interpreter importing lxml and
+    readability each) and runs one parse, so the first real pages don't pay for it."""
+    loop = asyncio.get_running_loop()
+    if _POOL is None:
+        extract_page(_WARM_PAGE)
+        return
+    await asyncio.gather(*(loop.run_in_executor(_POOL, extract_page, _WARM_PAGE) for _ in range(settings.EXTRACT_WORKERS)))
+
+
+def close():
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+    _POOL = None
+
+
+_HEADER_CHARSET = re.compile(r"charset=[\"']?([\w\-:.]+)", re.I)
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w\-:.]+)""", re.I)
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+
+
+def _codec(name) -> Optional[str]:
+    try:
+        enc = codecs.lookup(name.decode("ascii", "ignore") if isinstance(name, bytes) else name).name
+    except LookupError:
+        return None
+    # browsers treat latin-1 labels as windows-1252
+    return "cp1252" if enc == "iso8859-1" else enc
+
+
+def sniff_encoding(prefix: bytes, content_type: Optional[str] = None) -> str:
+    """Content-Type charset, then BOM, then <meta charset>, then utf-8 if it decodes, else cp1252."""
+    m = _HEADER_CHARSET.search(content_type or "")
+    if m and _codec(m.group(1)):
+        return _codec(m.group(1))
+    for bom, enc in _BOMS:
+        if prefix.startswith(bom):
+            return enc
+    m = _META_CHARSET.search(prefix[:4096])
+    if m and _codec(m.group(1)):
+        return _codec(m.group(1))
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(prefix, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+class ArticleSniffer:
+    """Incremental parse of a streamed page that reports when the text we
+    actually use (title + first paragraphs) has arrived."""
+
+    def __init__(self, want_paras: int, want_chars: int, min_para_chars: int):
+        self._parser = etree.HTMLPullParser(events=("end",), tag=("title", "p"))
+        self.want_paras = want_paras
+        self.want_chars = want_chars
+        self.min_para_chars = min_para_chars
+        self.title = ""
+        self.paras = 0
+        self.chars = 0
+        self.broken = False
+
+    def feed(self, text: str) -> bool:
+        if self.broken:
+            return False
+        try:
+            self._parser.feed(text)
+            for _, el in self._parser.read_events():
+                n = "".join(el.itertext()).strip()
+                if el.tag == "title":
+                    self.title = self.title or n
+                elif len(n) >= self.min_para_chars:
+                    self.paras += 1
+                    self.chars += len(n)
+                el.clear()  # only counts are kept; let the partial tree stay small
+        except Exception:
+            self.broken = True
+            return False
+        return self.enough
+
+    @property
+    def enough(self) -> bool:
+        if self.paras < self.want_paras or self.chars < self.want_chars:
+            return False
+        # a page with no <title> still stops, just later
+        return bool(self.title) or self.paras >= 2 * self.want_paras
+
+
+async def extract_page_async(html: str) -> Tuple[str, str, int]:
+    if _POOL is None:
+        # EXTRACT_WORKERS=0 or no lifespan (scripts): run inline
+        return extract_page(html)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_POOL, extract_page, html)
+    except BrokenProcessPool:
+        # a worker died (OOM on a pathological page?); rebuild and do this one inline
+        close()
+        start()
+        return extract_page(html)
@@ -0,0 +1,201 @@
+# api/app/fastpath.py
+# Local first-tier classifier. Hashed lexical features from title/body plus
+# domain, noise and reputation buckets feed one softmax head per label; when
+# every head is confident the LLM is skipped. Trained offline from url_checks
+# (scripts/train_fastpath.py). Needs numpy; without it, or without a model
+# file, predict() always returns None and every page goes to the LLM.
+import logging, math, re, time, zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .config import settings
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+log = logging.getLogger(__name__)
+
+# label -> classes, in the order the model's output columns use
+HEADS: Dict[str, Tuple[str, ...]] = {
+    "headline_style": ("neutral", "clickbait"),
+    "tone": ("neutral", "sensational"),
+    "scam_signal": ("none", "weak", "strong"),
+    "health_claim": ("not_present", "present"),
+}
+DEFAULT_MODEL = Path(__file__).resolve().parent.parent / "models" / "fastpath.npz"
+_TOKEN = re.compile(r"[a-z0-9']+")
+EXCERPT_CHARS = 600
+
+_MODEL = None
+_STATS = {"decisions": 0, "fast": 0, "uncertain": 0, "us_total": 0.0}
+
+
+def _h(feature: str, dim: int) -> int:
+    # crc32, not hash(): must match across processes and between training and serving
+    return zlib.crc32(feature.encode()) & (dim - 1)
+
+
+def excerpt(body: str) -> str:
+    # the body text the model sees: stored as meta["excerpt"] (training input) and
+    # applied again at serve time, so both featurize exactly the same text
+    return body[:EXCERPT_CHARS]
+
+
+def has_labels(sample: dict) -> bool:
+    labels = sample.get("labels") or {}
+    return all(labels.get(name) in classes for name, classes in HEADS.items())
+
+
+def features(domain: str, title: str, body: str, noise: int, rep_score: Optional[float], dim: int) -> "np.ndarray":
+    title_toks = _TOKEN.findall(title.lower())
+    body_toks = _TOKEN.findall(excerpt(body).lower())
+    feats = ["bias"]
+    feats += ["t:" + t for t in title_toks]
+    feats += ["tt:" + a + "_" + b for a, b in zip(title_toks, title_toks[1:])]
+    feats += ["b:" + t for t in body_toks]
+    feats.append("dom:" + domain)
+    feats.append("tld:" + domain.rsplit(".", 1)[-1])
+    feats.append("noise:%d" % min(noise, 5))
+    feats.append("rep:" + ("none" if rep_score is None else "%d" % min(int(rep_score * 5), 4)))
+    feats.append("t_excl:%d" % min(title.count("!"), 3))
+    feats.append("t_caps:%d" % min(sum(1 for w in title.split() if len(w) > 2 and w.isupper()), 3))
+    feats.append("t_digit:%d" % any(c.isdigit() for c in title))
+    return np.unique(np.fromiter((_h(f, dim) for f in feats), dtype=np.int64, count=len(feats)))
+
+
+class Model:
+    def __init__(self, W: "np.ndarray", b: "np.ndarray"):
+        self.W = W.astype(np.float32)
+        self.b = b.astype(np.float32)
+        self.dim = W.shape[0]
+        offsets, start = [], 0
+        for classes in HEADS.values():
+            offsets.append((start, start + len(classes)))
+            start += len(classes)
+        self.offsets = offsets
+
+    def probs(self, idx: "np.ndarray") -> List["np.ndarray"]:
+        z = self.W[idx].sum(axis=0) / math.sqrt(len(idx)) + self.b
+        out = []
+        for lo, hi in self.offsets:
+            e = np.exp(z[lo:hi] - z[lo:hi].max())
+            out.append(e / e.sum())
+        return out
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, W=self.W, b=self.b)
+
+    @classmethod
+    def load(cls, path: Path) -> "Model":
+        data = np.load(path)
+        return cls(data["W"], data["b"])
+
+
+def train(samples: List[dict], *, dim: int = 1 << 18, epochs: int = 8, lr: float = 0.5, l2: float = 1e-6,
+          batch_size: int = 256, seed: int = 0) -> Model:
+    """samples: dicts with domain, title, body, noise, rep_score and labels (LLM output).
+    Samples missing a label, or with a value outside HEADS, are skipped."""
+    samples = [s for s in samples if has_labels(s)]
+    if not samples:
+        raise ValueError("no samples with a complete set of labels to train on")
+    rng = np.random.default_rng(seed)
+    rows = [features(s["domain"], s["title"], s["body"], s["noise"], s.get("rep_score"), dim) for s in samples]
+    # CSR layout: one flat index array, rows delimited by indptr, values are 1/sqrt(nnz)
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(r) for r in rows], out=indptr[1:])
+    indices = np.concatenate(rows)
+    vals = np.repeat(1.0 / np.sqrt(np.diff(indptr)), np.diff(indptr)).astype(np.float32)
+
+    n_out = sum(len(c) for c in HEADS.values())
+    Y = np.zeros((len(samples), n_out), dtype=np.float32)
+    col = 0
+    for name, classes in HEADS.items():
+        for i, s in enumerate(samples):
+            Y[i, col + classes.index(s["labels"][name])] = 1.0
+        col += len(classes)
+
+    model = Model(np.zeros((dim, n_out), dtype=np.float32), np.zeros(n_out, dtype=np.float32))
+    for _ in range(epochs):
+        order = rng.permutation(len(samples))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            lens = indptr[batch + 1] - indptr[batch]
+            # gather the batch's CSR slices without a python loop
+            pos = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens) + np.repeat(indptr[batch], lens)
+            idx, v = indices[pos], vals[pos]
+            row_of = np.repeat(np.arange(len(batch)), lens)
+            # forward: Z = X @ W + b
+            Z = np.zeros((len(batch), n_out), dtype=np.float32)
+            np.add.at(Z, row_of, model.W[idx] * v[:, None])
+            Z += model.b
+            # per-head softmax; cross-entropy gradient is (P - Y)
+            G = np.empty_like(Z)
+            for lo, hi in model.offsets:
+                E = np.exp(Z[:, lo:hi] - Z[:, lo:hi].max(axis=1, keepdims=True))
+                G[:, lo:hi] = E / E.sum(axis=1, keepdims=True)
+            G = (G - Y[batch]) / len(batch)
+            # backward: dW = X^T G, applied sparsely to touched rows only
+            dW = G[row_of] * v[:, None]
+            model.W *= 1 - lr * l2
+            np.add.at(model.W, idx, -lr * dW)
+            model.b -= lr * G.sum(axis=0)
+    return model
+
+
+def predict(domain: str, title: str, body: str, noise: int, rep_score: Optional[float]) -> Optional[dict]:
+    """Labels in the LLM's format when every head clears FASTPATH_THRESHOLD, else None."""
+    if _MODEL is None:
+        return None
+    t0 = time.perf_counter()
+    probs = _MODEL.probs(features(domain, title, body, noise, rep_score, _MODEL.dim))
+    labels, confident = {}, True
+    for (name, classes), p in zip(HEADS.items(), probs):
+        k = int(p.argmax())
+        labels[name] = classes[k]
+        confident = confident and p[k] >= settings.FASTPATH_THRESHOLD
+    _STATS["decisions"] += 1
+    _STATS["us_total"] += (time.perf_counter() - t0) * 1e6
+    if not confident:
+        _STATS["uncertain"] += 1
+        return None
+    _STATS["fast"] += 1
+    return labels
+
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+def extractive_bullets(body: str, n: int = 3) -> List[str]:
+    # first sentences of the article, trimmed to the LLM bullets' ~20 words
+    bullets = []
+    for para in body.split("\n\n"):
+        for sent in _SENTENCE.split(para.strip()):
+            words = sent.split()
+            if len(words) >= 5:
+                bullets.append(" ".join(words[:20]) + ("…" if len(words) > 20 else ""))
+            if len(bullets) >= n:
+                return bullets
+    return bullets
+
+
+def load():
+    global _MODEL
+    if np is None or not settings.FASTPATH_ENABLED:
+        return
+    path = Path(settings.FASTPATH_MODEL) if settings.FASTPATH_MODEL else DEFAULT_MODEL
+    if not path.exists():
+        log.info("fast-path model not found at %s; all pages go to the LLM", path)
+        return
+    _MODEL = Model.load(path)
+
+
+def stats() -> dict:
+    n = _STATS["decisions"]
+    return {
+        "enabled": _MODEL is not None,
+        **{k: v for k, v in _STATS.items() if k != "us_total"},
+        "llm_avoided_share": round(_STATS["fast"] / n, 4) if n else 0.0,
+        "us_avg": round(_STATS["us_total"] / n, 1) if n else 0.0,
+    }
@@ -0,0 +1,161 @@
+# api/app/history.py
+# Check history and the caregiver dashboard. History pages use keyset (cursor)
+# pagination on url_checks (user_id, created_at desc, id desc): each page is
+# one index range scan however deep the user has scrolled. Summaries are read
+# from the per-user, per-day rollup tables that a trigger on url_checks keeps
+# current (sql/schema.sql). A dashboard load reads elders × days rows, however
+# long the history is.
+import base64, binascii, uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query
+from .auth import get_current_user
+from .cache import TTLCache
+from .config import settings
+from .db import (connection, get_caregiver_elders, get_last_check_times, get_reason_rollups,
+                 get_verdict_rollups, list_user_checks)
+from .schemas import (CaregiverSummary, DailyRollup, ElderDetailSummary, ElderSummary, HistoryItem,
+                      HistoryPage)
+from . import metrics
+
+router = APIRouter(prefix="/api", tags=["history"])
+
+# caregiver id -> [(elder_user_id, elder_email)]
+_ELDERS = TTLCache(10000)
+
+
+def _require_user(user: Optional[dict]) -> dict:
+    if not user:
+        raise HTTPException(status_code=401, detail="login_required")
+    if not settings.DATABASE_URL:
+        raise HTTPException(status_code=503, detail="history_unavailable")
+    return user
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|", 1)
+        ts = datetime.fromisoformat(created_at)
+        # only what encode_cursor writes: an aware timestamp and a uuid or bigserial id
+        if ts.tzinfo is None:
+            raise ValueError("naive timestamp")
+        if not row_id.isdigit():
+            uuid.UUID(row_id)
+        return ts, row_id
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="invalid_cursor")
+
+
+async def _history(user_id: str, limit: Optional[int], cursor: Optional[str]) -> HistoryPage:
+    limit = min(limit or settings.HISTORY_PAGE_SIZE, settings.HISTORY_MAX_PAGE_SIZE)
+    before = decode_cursor(cursor) if cursor else None
+    with metrics.stage("history_db"):
+        async with connection() as conn:
+            # one extra row tells us whether there is a next page
+            rows = await list_user_checks(conn, user_id, limit + 1, before)
+    items = [
+        HistoryItem(id=row_id, url=url, verdict=verdict, reasons=reasons or [], summary=summary, created_at=created_at)
+        for row_id, url, verdict, reasons, summary, created_at in rows[:limit]
+    ]
+    next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > limit else None
+    return HistoryPage(items=items, next_cursor=next_cursor)
+
+
+async def _elders(caregiver_id: str) -> List[Tuple[Optional[str], Optional[str]]]:
+    elders = _ELDERS.get(caregiver_id)
+    if elders is None:
+        async with connection() as conn:
+            elders = await get_caregiver_elders(conn, caregiver_id)
+        _ELDERS.set(caregiver_id, elders, settings.CAREGIVER_LINK_TTL)
+    return elders
+
+
+async def _require_elder(caregiver_id: str, elder_id: str) -> Tuple[Optional[str], Optional[str]]:
+    for elder in await _elders(caregiver_id):
+        if elder[0] == elder_id:
+            return elder
+    raise HTTPException(status_code=404, detail="elder_not_found")
+
+
+def _days(days: Optional[int]) -> int:
+    return min(days or settings.SUMMARY_DEFAULT_DAYS, settings.SUMMARY_MAX_DAYS)
+
+
+def _top(counts: Dict[str, int]) -> Dict[str, int]:
+    return dict(sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:settings.SUMMARY_TOP_REASONS])
+
+
+async def _rollups(user_ids: List[str], days: int):
+    async with connection() as conn:
+        verdicts = await get_verdict_rollups(conn, user_ids, days)
+        reasons = await get_reason_rollups(conn, user_ids, days)
+        last = await get_last_check_times(conn, user_ids)
+    return verdicts, reasons, dict(last)
+
+
+def _summaries(elders, verdicts, reasons, last) -> Dict[str, ElderSummary]:
+    out = {uid: ElderSummary(elder_user_id=uid, elder_email=email, last_check_at=last.get(uid)) for uid, email in elders if uid}
+    for uid, _day, verdict, n in verdicts:
+        s = out[uid]
+        s.checks += n
+        s.verdicts[verdict] = s.verdicts.get(verdict, 0) + n
+    totals: Dict[str, Dict[str, int]] = {}
+    for uid, _day, reason, n in reasons:
+        counts = totals.setdefault(uid, {})
+        counts[reason] = counts.get(reason, 0) + n
+    for uid, counts in totals.items():
+        out[uid].top_reasons = _top(counts)
+    return out
+
+
+@router.get("/history", response_model=HistoryPage)
+async def my_history(limit: Optional[int] = Query(None, ge=1), cursor: Optional[str] = None,
+                     user=Depends(get_current_user)):
+    """The signed-in user's checks, newest first."""
+    user = _require_user(user)
+    return await _history(user["id"], limit, cursor)
+
+
+@router.get("/caregiver/elders/{elder_id}/history", response_model=HistoryPage)
+async def elder_history(elder_id: str, limit: Optional[int] = Query(None, ge=1), cursor: Optional[str] = None,
+                        user=Depends(get_current_user)):
+    user = _require_user(user)
+    with metrics.stage("history_db"):
+        await _require_elder(user["id"], elder_id)
+    return await _history(elder_id, limit, cursor)
+
+
+@router.get("/caregiver/summary", response_model=CaregiverSummary)
+async def caregiver_summary(days: Optional[int] = Query(None, ge=1), user=Depends(get_current_user)):
+    """Per-elder verdict counts and top reasons over the last `days` days (UTC)."""
+    user = _require_user(user)
+    days = _days(days)
+    with metrics.stage("history_db"):
+        elders = await _elders(user["id"])
+        # elders linked by email only haven't signed up yet: listed, nothing to count
+        ids = [uid for uid, _ in elders if uid]
+        verdicts, reasons, last = await _rollups(ids, days) if ids else ([], [], {})
+    summaries = _summaries(elders, verdicts, reasons, last)
+    return CaregiverSummary(days=days, elders=[summaries[uid] if uid else ElderSummary(elder_email=email) for uid, email in elders])
+
+
+@router.get("/caregiver/elders/{elder_id}/summary", response_model=ElderDetailSummary)
+async def elder_summary(elder_id: str, days: Optional[int] = Query(None, ge=1), user=Depends(get_current_user)):
+    """One elder's totals plus the per-day series behind them."""
+    user = _require_user(user)
+    days = _days(days)
+    with metrics.stage("history_db"):
+        elder = await _require_elder(user["id"], elder_id)
+        verdicts, reasons, last = await _rollups([elder_id], days)
+    summary = _summaries([elder], verdicts, reasons, last)[elder_id]
+    daily: Dict[object, DailyRollup] = {}
+    for _uid, day, verdict, n in verdicts:
+        daily.setdefault(day, DailyRollup(day=day)).verdicts[verdict] = n
+    for _uid, day, reason, n in reasons:
+        daily.setdefault(day, DailyRollup(day=day)).reasons[reason] = n
+    return ElderDetailSummary(**summary.model_dump(), days=days, daily=[daily[d] for d in sorted(daily)])
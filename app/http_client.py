@@ -0,0 +1,171 @@
+# api/app/http_client.py
+# One app-lifetime httpx client for outbound page fetches (created in the
+# FastAPI lifespan, see main.py) so connections, TLS sessions and DNS answers
+# are reused across checks.
+import asyncio, ipaddress, socket, time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+import httpx, httpcore
+from .config import settings
+
+USER_AGENT = "GentleReader/1.0 (+https://example.com)"
+
+_CLIENT: Optional[httpx.AsyncClient] = None
+_TRANSPORT: Optional[httpx.AsyncHTTPTransport] = None
+_STATS = {"requests": 0, "errors": 0, "dns_hits": 0, "dns_misses": 0}
+
+# host -> [semaphore, users]; entries are dropped once nobody holds or waits on them
+_HOST_SLOTS: Dict[str, list] = {}
+
+
+class _CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """Wraps httpcore's network backend and caches getaddrinfo answers.
+
+    TLS still uses the original hostname for SNI/cert checks; only the TCP
+    connect goes to the cached address.
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, ttl: float):
+        self._backend = backend
+        self._ttl = ttl
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+
+    async def _resolve(self, host: str, port: int, timeout: Optional[float]) -> List[str]:
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+        hit = self._cache.get((host, port))
+        if hit and hit[0] > time.monotonic():
+            _STATS["dns_hits"] += 1
+            return hit[1]
+        _STATS["dns_misses"] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await asyncio.wait_for(loop.getaddrinfo(host, port, type=socket.SOCK_STREAM), timeout)
+        except asyncio.TimeoutError:
+            raise httpcore.ConnectTimeout(f"dns timeout for {host}")
+        except socket.gaierror as e:
+            raise httpcore.ConnectError(str(e))
+        addrs = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[(host, port)] = (time.monotonic() + self._ttl, addrs)
+        return addrs
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        last_exc: Exception = httpcore.ConnectError(f"no addresses for {host}")
+        for addr in await self._resolve(host, port, timeout):
+            try:
+                return await self._backend.connect_tcp(
+                    addr, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_exc = e
+        # every cached address failed; resolve again next time
+        self._cache.pop((host, port), None)
+        raise last_exc
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build() -> Tuple[httpx.AsyncClient, httpx.AsyncHTTPTransport]:
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    transport = httpx.AsyncHTTPTransport(http2=settings.HTTP_HTTP2 and _http2_available(), limits=limits)
+    # httpx has no public hook for the network backend, so swap it on the pool
+    pool = getattr(transport, "_pool", None)
+    if settings.HTTP_DNS_TTL > 0 and isinstance(pool, httpcore.AsyncConnectionPool):
+        pool._network_backend = _CachingDNSBackend(pool._network_backend, settings.HTTP_DNS_TTL)
+    timeout = httpx.Timeout(
+        connect=settings.HTTP_CONNECT_TIMEOUT,
+        read=settings.HTTP_READ_TIMEOUT,
+        write=settings.HTTP_READ_TIMEOUT,
+        pool=settings.HTTP_CONNECT_TIMEOUT,
+    )
+    client = httpx.AsyncClient(
+        transport=transport,
+        follow_redirects=True,
+        timeout=timeout,
+        headers={"User-Agent": USER_AGENT},
+    )
+    return client, transport
+
+
+async def start():
+    global _CLIENT, _TRANSPORT
+    if _CLIENT is None:
+        _CLIENT, _TRANSPORT = _build()
+
+
+async def close():
+    global _CLIENT, _TRANSPORT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+    _CLIENT, _TRANSPORT = None, None
+    _HOST_SLOTS.clear()
+
+
+def get_client() -> httpx.AsyncClient:
+    # scripts and tests that skip the lifespan still get a (lazily built) shared client
+    global _CLIENT, _TRANSPORT
+    if _CLIENT is None:
+        _CLIENT, _TRANSPORT = _build()
+    return _CLIENT
+
+
+@asynccontextmanager
+async def host_slot(host: str):
+    """Caps concurrent requests to one host at HTTP_MAX_PER_HOST."""
+    slot = _HOST_SLOTS.get(host)
+    if slot is None:
+        slot = _HOST_SLOTS[host] = [asyncio.Semaphore(settings.HTTP_MAX_PER_HOST), 0]
+    slot[1] += 1
+    _STATS["requests"] += 1
+    try:
+        async with slot[0]:
+            yield
+    except Exception:
+        _STATS["errors"] += 1
+        raise
+    finally:
+        slot[1] -= 1
+        if slot[1] == 0 and _HOST_SLOTS.get(host) is slot:
+            del _HOST_SLOTS[host]
+
+
+def stats() -> dict:
+    out = {**_STATS, "hosts_active": len(_HOST_SLOTS)}
+    pool = getattr(_TRANSPORT, "_pool", None)
+    if isinstance(pool, httpcore.AsyncConnectionPool):
+        conns = pool.connections
+        out.update(
+            connections=len(conns),
+            idle=sum(1 for c in conns if c.is_idle()),
+            available=sum(1 for c in conns if c.is_available()),
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+        )
+        backend = pool._network_backend
+        if isinstance(backend, _CachingDNSBackend):
+            out["dns_cached_hosts"] = len(backend)
+    return out
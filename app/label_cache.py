@@ -0,0 +1,104 @@
+# api/app/label_cache.py
+# LLM label cache keyed on the page content rather than the URL, so the same
+# wire story or scam template under a new URL/domain skips the LLM. Memory LRU
+# in front of the llm_label_cache table. The key includes OPENAI_MODEL and the
+# prompt version, so changing either never serves old answers; start() also
+# purges rows written under a previous model/prompt.
+import asyncio, hashlib, logging, re
+from typing import Optional
+import orjson
+from .config import settings
+from .cache import TTLCache
+from .db import connection, get_label_cache_entry, purge_label_cache, upsert_label_cache_entry
+
+log = logging.getLogger(__name__)
+
+_WS = re.compile(r"\s+")
+_MEMORY = TTLCache(settings.LABEL_CACHE_MAX_ENTRIES)
+_STATS = {"hits_memory": 0, "hits_db": 0, "misses": 0, "stores": 0, "errors": 0, "saved_prompt_tokens": 0, "saved_completion_tokens": 0}
+_PENDING = set()  # store tasks, kept referenced until done
+
+
+def _norm(text: str) -> str:
+    return _WS.sub(" ", text).strip().lower()
+
+
+def content_key(title: str, body: str, prompt_version: str) -> str:
+    # domain deliberately left out: syndicated copies should share an entry, and
+    # domain reputation is applied separately in combine_verdict
+    material = orjson.dumps([prompt_version, settings.OPENAI_MODEL, _norm(title), _norm(body[:4000])])
+    return hashlib.sha256(material).hexdigest()
+
+
+def _count_saved(usage: dict):
+    _STATS["saved_prompt_tokens"] += usage.get("prompt_tokens") or 0
+    _STATS["saved_completion_tokens"] += usage.get("completion_tokens") or 0
+
+
+async def get(key: str) -> Optional[dict]:
+    hit = _MEMORY.get(key)
+    if hit is not None:
+        labels, usage = hit
+        _STATS["hits_memory"] += 1
+        _count_saved(usage)
+        return dict(labels)
+    if settings.DATABASE_URL:
+        try:
+            async with connection() as conn:
+                row = await get_label_cache_entry(conn, key, settings.LABEL_CACHE_TTL)
+        except Exception:
+            _STATS["errors"] += 1
+            row = None
+        if row is not None:
+            labels, usage = row[0], {"prompt_tokens": row[1], "completion_tokens": row[2]}
+            _MEMORY.set(key, (labels, usage), settings.LABEL_CACHE_TTL)
+            _STATS["hits_db"] += 1
+            _count_saved(usage)
+            return dict(labels)
+    _STATS["misses"] += 1
+    return None
+
+
+async def _store(key: str, labels: dict, usage: dict, prompt_version: str):
+    try:
+        async with connection() as conn:
+            await upsert_label_cache_entry(conn, key, settings.OPENAI_MODEL, prompt_version, orjson.dumps(labels).decode(),
+                                           usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        _STATS["stores"] += 1
+    except Exception as e:
+        _STATS["errors"] += 1
+        log.debug("llm_label_cache store failed: %s", e)
+
+
+def put(key: str, labels: dict, usage: dict, prompt_version: str):
+    _MEMORY.set(key, (dict(labels), usage), settings.LABEL_CACHE_TTL)
+    if settings.DATABASE_URL:
+        # off the response path
+        task = asyncio.ensure_future(_store(key, labels, usage, prompt_version))
+        _PENDING.add(task)
+        task.add_done_callback(_PENDING.discard)
+
+
+async def purge_stale(prompt_version: str):
+    """Drops rows from other models/prompt versions; they can never be hit again."""
+    if not settings.DATABASE_URL:
+        return
+    try:
+        async with connection() as conn:
+            purged = await purge_label_cache(conn, settings.OPENAI_MODEL, prompt_version)
+        if purged:
+            log.info("purged %d llm_label_cache rows from an old model/prompt", purged)
+    except Exception as e:
+        log.warning("llm_label_cache purge failed: %s", e)
+
+
+def start(prompt_version: str):
+    task = asyncio.ensure_future(purge_stale(prompt_version))
+    _PENDING.add(task)
+    task.add_done_callback(_PENDING.discard)
+
+
+def stats() -> dict:
+    hits = _STATS["hits_memory"] + _STATS["hits_db"]
+    total = hits + _STATS["misses"]
+    return {**_STATS, "memory_entries": len(_MEMORY), "hit_rate": round(hits / total, 4) if total else 0.0}
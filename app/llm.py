@@ -0,0 +1,139 @@
+# api/app/llm.py
+# Async OpenAI access for the checker: a global semaphore caps in-flight
+# completions, 429/5xx/connection errors are retried with jittered backoff,
+# and every call has a hard deadline (queueing included). The openai package
+# (~200ms to import) is loaded with the client: at warm-up, or on the first call.
+import asyncio, json, random, time
+from typing import TYPE_CHECKING, Optional, Tuple
+from .config import settings
+from . import metrics
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+_CLIENT: Optional["AsyncOpenAI"] = None
+_SEM: Optional[asyncio.Semaphore] = None
+_STATS = {
+    "calls": 0,
+    "retries": 0,
+    "errors": 0,
+    "deadline_exceeded": 0,
+    "queue_depth": 0,
+    "in_flight": 0,
+    "wait_ms_total": 0.0,
+    "wait_ms_max": 0.0,
+    "prompt_tokens": 0,
+    "completion_tokens": 0,
+}
+
+
+def get_client() -> "AsyncOpenAI":
+    global _CLIENT
+    if _CLIENT is None:
+        from openai import AsyncOpenAI
+        # retries are ours (below) so they count against the deadline
+        _CLIENT = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0)
+    return _CLIENT
+
+
+def _semaphore() -> asyncio.Semaphore:
+    global _SEM
+    if _SEM is None:
+        _SEM = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+    return _SEM
+
+
+def _retryable(e: Exception) -> bool:
+    from openai import APIConnectionError, APIStatusError, RateLimitError  # loaded by get_client already
+    if isinstance(e, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(e, APIStatusError) and e.status_code >= 500
+
+
+def _retry_after(e: Exception) -> float:
+    resp = getattr(e, "response", None)
+    try:
+        return float(resp.headers.get("retry-after", 0)) if resp is not None else 0.0
+    except ValueError:
+        return 0.0
+
+
+async def complete_json(messages: list, *, model: Optional[str] = None, deadline: Optional[float] = None) -> Tuple[dict, dict]:
+    """Runs one JSON-mode chat completion. Returns (parsed_content, usage)."""
+    deadline_at = time.monotonic() + (deadline or settings.LLM_DEADLINE)
+    sem = _semaphore()
+
+    _STATS["queue_depth"] += 1
+    t0 = time.monotonic()
+    try:
+        await asyncio.wait_for(sem.acquire(), deadline_at - t0)
+    except asyncio.TimeoutError:
+        _STATS["deadline_exceeded"] += 1
+        raise
+    finally:
+        _STATS["queue_depth"] -= 1
+    wait_ms = (time.monotonic() - t0) * 1000
+    _STATS["wait_ms_total"] += wait_ms
+    _STATS["wait_ms_max"] = max(_STATS["wait_ms_max"], wait_ms)
+
+    _STATS["calls"] += 1
+    _STATS["in_flight"] += 1
+    t_call = time.monotonic()
+    try:
+        attempt = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                resp = await asyncio.wait_for(
+                    get_client().chat.completions.create(
+                        model=model or settings.OPENAI_MODEL,
+                        temperature=0,
+                        response_format={"type": "json_object"},
+                        messages=messages,
+                        timeout=remaining,
+                    ),
+                    remaining,
+                )
+                break
+            except asyncio.TimeoutError:
+                _STATS["deadline_exceeded"] += 1
+                raise
+            except Exception as e:
+                if not _retryable(e) or attempt >= settings.LLM_MAX_RETRIES:
+                    _STATS["errors"] += 1
+                    raise
+                attempt += 1
+                # full jitter, but never sooner than the server asked for
+                delay = random.uniform(0, min(settings.LLM_BACKOFF_MAX, settings.LLM_BACKOFF_BASE * 2 ** attempt))
+                delay = max(delay, _retry_after(e))
+                if time.monotonic() + delay >= deadline_at:
+                    _STATS["errors"] += 1
+                    raise
+                _STATS["retries"] += 1
+                await asyncio.sleep(delay)
+    finally:
+        _STATS["in_flight"] -= 1
+        sem.release()
+        if settings.METRICS_ENABLED:
+            metrics.observe("llm_queue", wait_ms / 1000)
+            metrics.observe("llm", time.monotonic() - t_call)
+
+    usage = {}
+    if resp.usage is not None:
+        usage = {"prompt_tokens": resp.usage.prompt_tokens, "completion_tokens": resp.usage.completion_tokens}
+        _STATS["prompt_tokens"] += resp.usage.prompt_tokens or 0
+        _STATS["completion_tokens"] += resp.usage.completion_tokens or 0
+        metrics.count("llm_prompt_tokens", resp.usage.prompt_tokens or 0)
+        metrics.count("llm_completion_tokens", resp.usage.completion_tokens or 0)
+    return json.loads(resp.choices[0].message.content), usage
+
+
+def stats() -> dict:
+    calls = _STATS["calls"]
+    return {
+        **_STATS,
+        "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+        "wait_ms_avg": round(_STATS["wait_ms_total"] / calls, 2) if calls else 0.0,
+    }
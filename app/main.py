@@ -1,13 +1,44 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from .config import settings
-from .schemas import CheckRequest, CheckResponse
-from .checker import run_check
-from .db import get_conn, insert_url_check
-from . import billing
-import orjson
+from .schemas import CheckRequest, CheckResponse, BatchCheckRequest, BatchCheckItem
+from .checker import run_check, invalidate_check, inflight_stats, classify_batch_stats, normalize_url, PROMPT_VERSION
+from .db import open_pool, close_pool, pool_stats, connection, get_profile_role
+from . import admission, auth, billing, cache, entitlements, history, extract, fastpath, http_client, label_cache, llm, metrics, neardup, preflight, psl, reputation, validators, warmup, writer
+import httpx, orjson
 
-app = FastAPI(title="GentleReader API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_client.start()
+    await open_pool()
+    cache.start()
+    extract.start()
+    fastpath.load()
+    label_cache.start(PROMPT_VERSION)
+    await neardup.start(PROMPT_VERSION)
+    await reputation.start()
+    writer.start()
+    await entitlements.start()
+    billing.start()
+    if settings.WARMUP_ENABLED:
+        await warmup.run()
+    try:
+        yield
+    finally:
+        await billing.close()
+        await entitlements.close()
+        await writer.close()
+        await reputation.close()
+        await neardup.close()
+        extract.close()
+        await cache.close()
+        await close_pool()
+        await http_client.close()
+
+app = FastAPI(title="GentleReader API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,35 +48,182 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 app.include_router(billing.router)
 
+@app.exception_handler(admission.Overloaded)
+async def overloaded(request: Request, exc: admission.Overloaded):
+    # queued for a pipeline slot past the caller's budget
+    return JSONResponse({"detail": "overloaded"}, status_code=503,
+                        headers={"Retry-After": admission.retry_after_header(exc.retry_after)})
+app.include_router(history.router)
+
 @app.get("/health")
 async def health():
     return {"ok": True}
 
+@app.get("/stats")
+async def stats():
+    return {
+        "admission": admission.stats(),
+        "auth": auth.stats(),
+        "billing": billing.stats(),
+        "http": http_client.stats(),
+        "db": pool_stats(),
+        "verdict_cache": cache.stats(),
+        "inflight": inflight_stats(),
+        "llm": llm.stats(),
+        "llm_batch": classify_batch_stats(),
+        "fastpath": fastpath.stats(),
+        "label_cache": label_cache.stats(),
+        "neardup": neardup.stats(),
+        "preflight": preflight.stats(),
+        "psl": psl.stats(),
+        "reputation": reputation.stats(),
+        "validators": validators.stats(),
+        "writer": writer.stats(),
+        "warmup": warmup.stats(),
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # api/app/main.py (modify /api/check to use auth)
 from fastapi import Depends
 from .auth import get_current_user
 
+def _persist(user, url, verdict, reasons, summary, meta):
+    # queued for the background writer; never on the response path
+    with metrics.stage("persist"):
+        writer.submit(writer.check_row(
+            user_id=user["id"] if user else None,
+            url=url,
+            verdict=verdict,
+            reasons=reasons,
+            summary=summary,
+            meta=meta,
+        ))
+
 @app.post("/api/check", response_model=CheckResponse)
-async def check(payload: CheckRequest, user=Depends(get_current_user)):
-    verdict, reasons, summary, meta = await run_check(str(payload.url))
-    # Try to persist with user id (if logged in)
-    try:
-        async with await get_conn() as conn:
-            await insert_url_check(
-                conn,
-                user_id=user["id"] if user else None,
-                url=str(payload.url),
-                verdict=verdict,
-                reasons=orjson.dumps(reasons).decode(),
-                summary=summary,
-                raw_meta=orjson.dumps(meta).decode(),
-            )
-    except Exception:
-        pass
+async def check(payload: CheckRequest, user=Depends(admission.admit)):
+    verdict, reasons, summary, meta = await run_check(str(payload.url), refresh=payload.refresh)
+    _persist(user, str(payload.url), verdict, reasons, summary, meta)
     return CheckResponse(verdict=verdict, reasons=reasons, summary=summary, meta=meta)
 
+def _sse(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n".encode()
+
+@app.post("/api/check/stream")
+async def check_stream(payload: CheckRequest, user=Depends(admission.admit)):
+    """Same check as /api/check, as Server-Sent Events: "resolved" (final url, domain,
+    reputation), "provisional" (title, verdict from page noise and domain signals),
+    then "final" (a CheckResponse) or "error". Cache hits send only "final"."""
+    url = str(payload.url)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def progress(kind, data):
+        queue.put_nowait((kind, data))
+
+    task = asyncio.ensure_future(run_check(url, progress, refresh=payload.refresh))
+    task.add_done_callback(lambda t: queue.put_nowait(("done", None)))
+
+    async def stream():
+        try:
+            while True:
+                try:
+                    kind, data = await asyncio.wait_for(queue.get(), settings.SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if kind != "done":
+                    yield _sse(kind, data)
+                    continue
+                if task.exception() is not None:
+                    yield _sse("error", {"detail": _check_error(task.exception())})
+                    return
+                verdict, reasons, summary, meta = task.result()
+                _persist(user, url, verdict, reasons, summary, meta)
+                result = CheckResponse(verdict=verdict, reasons=reasons, summary=summary, meta=meta)
+                yield _sse("final", result.model_dump())
+                return
+        finally:
+            # client went away: stop waiting (the shared pipeline run itself is shielded)
+            task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _check_error(e: Exception) -> str:
+    if isinstance(e, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(e, admission.Overloaded):
+        return "overloaded"
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"fetch_failed: http {e.response.status_code}"
+    if isinstance(e, httpx.HTTPError):
+        return f"fetch_failed: {type(e).__name__}"
+    return f"check_failed: {type(e).__name__}"
+
+@app.post("/api/check/batch")
+async def check_batch(payload: BatchCheckRequest, request: Request, user=Depends(get_current_user)):
+    """Streams one NDJSON BatchCheckItem per submitted url, in completion order."""
+    if len(payload.urls) > settings.BATCH_MAX_URLS:
+        raise HTTPException(status_code=413, detail="too_many_urls")
+    # duplicates (after normalization) are checked once and fanned out
+    groups = {}
+    for i, u in enumerate(payload.urls):
+        groups.setdefault(normalize_url(str(u)), []).append((i, str(u)))
+    # shed up front; rate tokens are charged per distinct url as it's scheduled
+    await admission.check(request, user, cost=0)
+    sem = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+    async def one(items):
+        url = items[0][1]
+        async with sem:
+            if not await admission.wait_tokens(request, user, settings.BATCH_RATE_MAX_WAIT):
+                return items, None, "rate_limited"
+            try:
+                verdict, reasons, summary, meta = await run_check(url)
+            except Exception as e:
+                return items, None, _check_error(e)
+        _persist(user, url, verdict, reasons, summary, meta)
+        return items, CheckResponse(verdict=verdict, reasons=reasons, summary=summary, meta=meta), None
+
+    async def stream():
+        tasks = [asyncio.ensure_future(one(items)) for items in groups.values()]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                items, result, error = await fut
+                for i, u in items:
+                    yield BatchCheckItem(index=i, url=u, result=result, error=error).model_dump_json() + "\n"
+        finally:
+            # client went away: stop the checks nobody will read
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(payload: CheckRequest, user=Depends(get_current_user)):
+    """Admins (profiles.role): the next check of this url re-runs the whole pipeline,
+    on every worker within CACHE_INVALIDATION_POLL seconds."""
+    if not user:
+        raise HTTPException(status_code=401, detail="login_required")
+    role = None
+    if settings.DATABASE_URL:
+        async with connection() as conn:
+            role = await get_profile_role(conn, user["id"])
+    if role != "admin":
+        raise HTTPException(status_code=403, detail="admin_only")
+    key = await invalidate_check(str(payload.url))
+    return {"url_hash": key, "invalidated": True}
+
 # api/app/main.py (add these small routes at bottom if you want)
 from fastapi.responses import RedirectResponse, Response
 
@@ -0,0 +1,152 @@
+# api/app/metrics.py
+# Per-stage latency instrumentation. Code wraps a stage in `with stage("fetch"):`;
+# each observation feeds a process-wide histogram exposed in Prometheus text
+# format on /metrics and, while a request is being served, that request's
+# Server-Timing header. Counters cover token usage and
+# bytes fetched. With METRICS_ENABLED off, stage() hands back a shared no-op
+# and the middleware isn't installed, so the cost is one attribute check.
+# Histograms are per process: scrape each worker, or run one per container.
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from .config import settings
+
+# seconds; covers sub-ms cache hits up to LLM deadlines
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# stage -> ms spent in it during the current request; None outside a request
+_TIMINGS: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+_HIST: Dict[str, list] = {}        # stage -> [bucket counts..., +Inf count, sum]
+_COUNTERS: Dict[str, float] = {}
+_REQUESTS: Dict[tuple, int] = {}   # (method, route, status) -> count
+
+COUNTER_HELP = {
+    "llm_prompt_tokens": "OpenAI prompt tokens used",
+    "llm_completion_tokens": "OpenAI completion tokens used",
+    "fetch_bytes": "Article bytes downloaded",
+    "fetches": "Article fetches",
+}
+
+
+def observe(name: str, seconds: float):
+    h = _HIST.get(name)
+    if h is None:
+        h = _HIST[name] = [0] * (len(BUCKETS) + 1) + [0.0]
+    h[bisect_left(BUCKETS, seconds)] += 1
+    h[-1] += seconds
+    timings = _TIMINGS.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds * 1000
+
+
+def count(name: str, n: float = 1):
+    if settings.METRICS_ENABLED:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+
+
+class _Stage:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopStage()
+
+
+def stage(name: str):
+    return _Stage(name) if settings.METRICS_ENABLED else _NOOP
+
+
+def current() -> Optional[Dict[str, float]]:
+    """This request's stage timings so far (ms), or None outside a request."""
+    timings = _TIMINGS.get()
+    return {k: round(v, 2) for k, v in timings.items()} if timings is not None else None
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings.items())
+
+
+class MetricsMiddleware:
+    """Pure ASGI so streaming responses pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings: Dict[str, float] = {}
+        token = _TIMINGS.set(timings)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if settings.METRICS_SERVER_TIMING and timings:
+                    timings["app"] = (time.perf_counter() - t0) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(timings).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _TIMINGS.reset(token)
+            route = scope.get("route")
+            # templated path only; raw paths would make label cardinality unbounded
+            key = (scope["method"], getattr(route, "path", "unmatched"), status[0])
+            _REQUESTS[key] = _REQUESTS.get(key, 0) + 1
+            observe("request", time.perf_counter() - t0)
+
+
+def _fmt(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+def render(prefix: str = "gentlereader") -> str:
+    """Prometheus text exposition format 0.0.4."""
+    lines: List[str] = [
+        f"# HELP {prefix}_stage_duration_seconds Time spent per pipeline stage.",
+        f"# TYPE {prefix}_stage_duration_seconds histogram",
+    ]
+    for name, h in sorted(_HIST.items()):
+        cumulative = 0
+        for le, n in zip(BUCKETS, h):
+            cumulative += n
+            lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+        cumulative += h[len(BUCKETS)]
+        lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {cumulative}')
+        lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{name}"}} {_fmt(h[-1])}')
+        lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{name}"}} {cumulative}')
+    for name in sorted(set(COUNTER_HELP) | set(_COUNTERS)):
+        lines.append(f"# HELP {prefix}_{name}_total {COUNTER_HELP.get(name, name)}.")
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.append(f"{prefix}_{name}_total {_fmt(_COUNTERS.get(name, 0))}")
+    lines.append(f"# HELP {prefix}_http_requests_total HTTP requests by route and status.")
+    lines.append(f"# TYPE {prefix}_http_requests_total counter")
+    for (method, route, status), n in sorted(_REQUESTS.items()):
+        lines.append(f'{prefix}_http_requests_total{{method="{method}",route="{route}",status="{status}"}} {n}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,138 @@
+# api/app/microbatch.py
+# Micro-batcher for LLM jobs. Callers submit one item and await its result;
+# items arriving within LLM_BATCH_WINDOW_MS of the first (or until
+# LLM_BATCH_MAX_ITEMS are pending) go out together through run_many, which
+# returns {item_id: result}. Items run_many doesn't answer, and whole batches
+# that fail to parse, are retried one by one through run_one. A lone item
+# goes straight to run_one. Saves request rate (and the repeated
+# instructions) at the cost of at most one window of queueing.
+import asyncio, itertools, logging, time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from .config import settings
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+# (id, payload) -> ({id: result}, usage) ; payload -> (result, usage)
+RunMany = Callable[[List[Tuple[str, Any]]], Awaitable[Tuple[Dict[str, Any], dict]]]
+RunOne = Callable[[Any], Awaitable[Tuple[Any, dict]]]
+
+
+class MicroBatcher:
+    def __init__(self, name: str, run_many: RunMany, run_one: RunOne):
+        self.name = name
+        self.run_many, self.run_one = run_many, run_one
+        self._ids = itertools.count()
+        self._pending: List[tuple] = []   # (id, payload, future, enqueued_at)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self._stats = {
+            "items": 0,
+            "requests": 0,          # upstream calls made, batched or single
+            "batches": 0,           # multi-item calls
+            "batched_items": 0,
+            "fallback_items": 0,    # retried one by one after a bad/partial batch
+            "batch_errors": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+
+    async def submit(self, payload: Any) -> Tuple[Any, dict]:
+        """Returns (result, usage); usage of a batched call is split evenly across its items."""
+        self._stats["items"] += 1
+        if settings.LLM_BATCH_MAX_ITEMS <= 1:
+            return await self._one(payload)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((str(next(self._ids)), payload, fut, time.monotonic()))
+        if len(self._pending) >= settings.LLM_BATCH_MAX_ITEMS:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(settings.LLM_BATCH_WINDOW_MS / 1000, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        now = time.monotonic()
+        for *_, enqueued in batch:
+            wait = now - enqueued
+            self._stats["wait_ms_total"] += wait * 1000
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait * 1000)
+            if settings.METRICS_ENABLED:
+                metrics.observe(self.name + "_batch_wait", wait)
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _count(self, usage: dict):
+        self._stats["requests"] += 1
+        self._stats["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        self._stats["completion_tokens"] += usage.get("completion_tokens") or 0
+
+    async def _one(self, payload: Any) -> Tuple[Any, dict]:
+        result, usage = await self.run_one(payload)
+        self._count(usage)
+        return result, usage
+
+    async def _resolve_one(self, payload: Any, fut: asyncio.Future):
+        try:
+            result = await self._one(payload)
+        except Exception as e:
+            if not fut.done():
+                fut.set_exception(e)
+            return
+        if not fut.done():
+            fut.set_result(result)
+
+    async def _run(self, batch: List[tuple]):
+        batch = [item for item in batch if not item[2].done()]  # callers already gone
+        if len(batch) == 1:
+            await self._resolve_one(batch[0][1], batch[0][2])
+            return
+        if not batch:
+            return
+        results: Dict[str, Any] = {}
+        try:
+            results, usage = await self.run_many([(item_id, payload) for item_id, payload, _, _ in batch])
+            self._count(usage)
+            self._stats["batches"] += 1
+            self._stats["batched_items"] += len(batch)
+            share = {k: (v or 0) / len(batch) for k, v in usage.items()}
+        except asyncio.TimeoutError as e:
+            # out of deadline: single retries would only add to the wait
+            self._stats["batch_errors"] += 1
+            for _, _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        except Exception as e:
+            self._stats["batch_errors"] += 1
+            log.info("%s batch of %d failed, falling back to single calls: %s", self.name, len(batch), e)
+        retry = []
+        for item_id, payload, fut, _ in batch:
+            if item_id in results:
+                if not fut.done():
+                    fut.set_result((results[item_id], share))
+            else:
+                retry.append((payload, fut))
+        if retry:
+            self._stats["fallback_items"] += len(retry)
+            await asyncio.gather(*(self._resolve_one(payload, fut) for payload, fut in retry))
+
+    def stats(self) -> dict:
+        s = self._stats
+        pages = s["items"]
+        return {
+            **s,
+            "pending": len(self._pending),
+            "avg_batch_size": round(s["batched_items"] / s["batches"], 2) if s["batches"] else 0.0,
+            "requests_per_item": round(s["requests"] / pages, 3) if pages else 0.0,
+            "tokens_per_item": round((s["prompt_tokens"] + s["completion_tokens"]) / pages, 1) if pages else 0.0,
+            "wait_ms_avg": round(s["wait_ms_total"] / pages, 2) if pages else 0.0,
+        }
@@ -0,0 +1,342 @@
+# api/app/neardup.py
+# Near-duplicate index over extracted article text. Scam landing pages are
+# mostly one template with a name or phone number swapped, which the exact
+# content hash in label_cache misses. Pages get a MinHash signature over
+# 5-word shingles; LSH banding turns lookups into a few dict probes, and the
+# best candidate is accepted when its estimated Jaccard similarity clears
+# NEARDUP_THRESHOLD. Signatures live in one uint32 matrix with parallel
+# last-used/created arrays, grown by doubling up to NEARDUP_MAX_ENTRIES; when
+# full, the least recently used slots are evicted in a batch. Each worker
+# saves its index to its own .npz file (neardup.<pid>.npz) periodically and
+# on shutdown; at boot every saved file is merged, and once this worker has
+# saved the merged index the files it read are deleted. Needs numpy; without
+# it query() always misses.
+import asyncio, logging, os, re, tempfile, time, zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import orjson
+from .config import settings
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / "models" / "neardup.npz"
+SHINGLE = 5
+_TOKEN = re.compile(r"[a-z0-9']+")
+_MAX_TOKENS = 2000
+_EVICT_FRACTION = 1 / 16  # evict in batches so a full index isn't scanned on every insert
+_INITIAL_SLOTS = 1024      # arrays start this big and double on demand
+
+_INDEX = None
+_TASK: Optional[asyncio.Task] = None
+_MERGED: List[Path] = []   # files read at boot, deleted after this worker's first save
+_STATS = {"queries": 0, "hits": 0, "misses": 0, "too_short": 0, "added": 0, "evicted": 0, "saves": 0, "us_total": 0.0}
+
+
+def _token_hashes(title: str, body: str) -> "np.ndarray":
+    toks = _TOKEN.findall((title + " " + body).lower())[:_MAX_TOKENS]
+    return np.fromiter((zlib.crc32(t.encode()) for t in toks), dtype=np.uint64, count=len(toks))
+
+
+def shingles(title: str, body: str) -> "np.ndarray":
+    """Distinct 64-bit hashes of consecutive 5-token windows."""
+    t = _token_hashes(title, body)
+    n = len(t) - SHINGLE + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint64)
+    h = np.zeros(n, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for i in range(SHINGLE):
+            h = h * np.uint64(0x100000001B3) + t[i:i + n]
+    return np.unique(h)
+
+
+class NearDupIndex:
+    def __init__(self, capacity: int, num_perm: int, bands: int, seed: int = 1, fingerprint: str = ""):
+        if num_perm % bands:
+            raise ValueError("NEARDUP_PERMUTATIONS must be a multiple of NEARDUP_BANDS")
+        rng = np.random.default_rng(seed)
+        # multiply-shift hashing: ((a*x + b) mod 2^64) >> 32, a odd
+        self.a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+        self.band_mix = rng.integers(1, 2 ** 63, num_perm // bands, dtype=np.uint64) | np.uint64(1)
+        self.capacity, self.num_perm, self.bands = capacity, num_perm, bands
+        self.fingerprint = fingerprint   # model/prompt/scheme the saved labels belong to
+        size = min(capacity, _INITIAL_SLOTS)
+        self.sigs = np.zeros((size, num_perm), dtype=np.uint32)
+        self.used = np.zeros(size, dtype=np.float64)     # last hit/insert, 0 = free slot
+        self.created = np.zeros(size, dtype=np.float64)
+        self.labels: List[Optional[dict]] = [None] * size
+        self.keys = np.zeros((size, bands), dtype=np.uint64)
+        self.buckets: Dict[Tuple[int, int], List[int]] = {}
+        self.free = list(range(size - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.used) - len(self.free)
+
+    def _grow(self):
+        old = len(self.used)
+        new = min(self.capacity, old * 2)
+        self.sigs = np.concatenate([self.sigs, np.zeros((new - old, self.num_perm), dtype=np.uint32)])
+        self.used = np.concatenate([self.used, np.zeros(new - old)])
+        self.created = np.concatenate([self.created, np.zeros(new - old)])
+        self.keys = np.concatenate([self.keys, np.zeros((new - old, self.bands), dtype=np.uint64)])
+        self.labels.extend([None] * (new - old))
+        self.free.extend(range(new - 1, old - 1, -1))
+
+    def signature(self, sh: "np.ndarray") -> "np.ndarray":
+        with np.errstate(over="ignore"):
+            return ((self.a[:, None] * sh[None, :] + self.b[:, None]) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+    def band_keys(self, sig: "np.ndarray") -> "np.ndarray":
+        with np.errstate(over="ignore"):
+            return (sig.reshape(self.bands, -1).astype(np.uint64) * self.band_mix).sum(axis=1)
+
+    def query(self, sig: "np.ndarray", threshold: float) -> Tuple[int, float]:
+        cands = set()
+        for band, key in enumerate(self.band_keys(sig).tolist()):
+            cands.update(self.buckets.get((band, key), ()))
+        if not cands:
+            return -1, 0.0
+        idx = np.fromiter(cands, dtype=np.int64, count=len(cands))
+        sim = (self.sigs[idx] == sig).mean(axis=1)
+        best = int(sim.argmax())
+        if sim[best] < threshold:
+            return -1, float(sim[best])
+        return int(idx[best]), float(sim[best])
+
+    def add(self, sig: "np.ndarray", labels: dict, now: float, created: Optional[float] = None) -> int:
+        evicted = 0
+        if not self.free:
+            if len(self.used) < self.capacity:
+                self._grow()
+            else:
+                evicted = self.evict(max(1, int(self.capacity * _EVICT_FRACTION)))
+        slot = self.free.pop()
+        self.sigs[slot] = sig
+        self.used[slot] = now
+        self.created[slot] = created or now
+        self.labels[slot] = labels
+        self.keys[slot] = self.band_keys(sig)
+        for band, key in enumerate(self.keys[slot].tolist()):
+            self.buckets.setdefault((band, key), []).append(slot)
+        return evicted
+
+    def remove(self, slot: int):
+        for band, key in enumerate(self.keys[slot].tolist()):
+            bucket = self.buckets.get((band, key))
+            if bucket is not None:
+                bucket.remove(slot)
+                if not bucket:
+                    del self.buckets[(band, key)]
+        self.used[slot] = self.created[slot] = 0.0
+        self.labels[slot] = None
+        self.free.append(slot)
+
+    def evict(self, n: int) -> int:
+        live = np.flatnonzero(self.used)
+        n = min(n, len(live))
+        if n <= 0:
+            return 0
+        oldest = live[np.argpartition(self.used[live], n - 1)[:n]]
+        for slot in oldest.tolist():
+            self.remove(slot)
+        return n
+
+    def expire(self, max_age: float, now: float) -> int:
+        stale = np.flatnonzero((self.created > 0) & (self.created < now - max_age))
+        for slot in stale.tolist():
+            self.remove(slot)
+        return len(stale)
+
+    def snapshot(self) -> dict:
+        live = np.flatnonzero(self.used)
+        return {
+            "sigs": self.sigs[live].copy(),
+            "used": self.used[live].copy(),
+            "created": self.created[live].copy(),
+            "labels": np.frombuffer(orjson.dumps([self.labels[i] for i in live.tolist()]), dtype=np.uint8),
+        }
+
+    def nbytes(self) -> int:
+        return self.sigs.nbytes + self.used.nbytes + self.created.nbytes + self.keys.nbytes
+
+
+def _path() -> Path:
+    return Path(settings.NEARDUP_PATH) if settings.NEARDUP_PATH else DEFAULT_PATH
+
+
+def _worker_path() -> Path:
+    base = _path()
+    return base.with_name("%s.%d%s" % (base.stem, os.getpid(), base.suffix))
+
+
+def _saved_paths() -> List[Path]:
+    # every worker's file, plus a single-file index from before per-worker saves
+    base = _path()
+    if not base.parent.is_dir():
+        return []
+    paths = sorted(base.parent.glob("%s.*%s" % (base.stem, base.suffix)))
+    return ([base] if base.exists() else []) + paths
+
+
+def _fingerprint(prompt_version: str) -> str:
+    # saved labels are only valid for the model/prompt/signature scheme that produced them
+    return "%s|%s|%d|%d" % (settings.OPENAI_MODEL, prompt_version, settings.NEARDUP_PERMUTATIONS, settings.NEARDUP_BANDS)
+
+
+def _save(path: Path, snap: dict, fingerprint: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # unique tmp name: a reader never sees a half-written file
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False) as f:
+        try:
+            np.savez(f, fingerprint=np.array(fingerprint), **snap)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+
+def _merge(saved: list):
+    """One (sigs, used, created, labels) from several workers' files; a page more
+    than one worker indexed is kept once, with its latest use."""
+    sigs = np.concatenate([s[0] for s in saved])
+    used = np.concatenate([s[1] for s in saved])
+    created = np.concatenate([s[2] for s in saved])
+    labels = [label for s in saved for label in s[3]]
+    # newest use first, then first occurrence of each signature
+    order = np.argsort(-used, kind="stable")
+    _, first = np.unique(sigs[order], axis=0, return_index=True)
+    keep = order[np.sort(first)]
+    return sigs[keep], used[keep], created[keep], [labels[i] for i in keep.tolist()]
+
+
+def _load(path: Path, fingerprint: str):
+    data = np.load(path)
+    if str(data["fingerprint"]) != fingerprint:
+        log.info("near-duplicate index at %s was built for another model/prompt; starting empty", path)
+        return None
+    return data["sigs"], data["used"], data["created"], orjson.loads(data["labels"].tobytes())
+
+
+def _signature(title: str, body: str) -> Optional["np.ndarray"]:
+    sh = shingles(title, body)
+    if len(sh) < settings.NEARDUP_MIN_SHINGLES:
+        # short pages share too much boilerplate for similarity to mean anything
+        _STATS["too_short"] += 1
+        return None
+    return _INDEX.signature(sh)
+
+
+def query(title: str, body: str) -> Optional[dict]:
+    """Labels of the most similar indexed page above NEARDUP_THRESHOLD, else None."""
+    if _INDEX is None:
+        return None
+    t0 = time.perf_counter()
+    _STATS["queries"] += 1
+    sig = _signature(title, body)
+    slot = -1
+    if sig is not None:
+        slot, _sim = _INDEX.query(sig, settings.NEARDUP_THRESHOLD)
+    _STATS["us_total"] += (time.perf_counter() - t0) * 1e6
+    if slot < 0:
+        _STATS["misses"] += 1
+        return None
+    _STATS["hits"] += 1
+    _INDEX.used[slot] = time.time()
+    return dict(_INDEX.labels[slot])
+
+
+def add(title: str, body: str, labels: dict):
+    if _INDEX is None:
+        return
+    sig = _signature(title, body)
+    if sig is None:
+        return
+    # the summary belongs to the exact page; near duplicates get their own
+    labels = {k: v for k, v in labels.items() if k != "summary_bullets"}
+    _STATS["evicted"] += _INDEX.add(sig, labels, time.time())
+    _STATS["added"] += 1
+
+
+async def save():
+    if _INDEX is None or not len(_INDEX):
+        return
+    path = _worker_path()
+    await asyncio.to_thread(_save, path, _INDEX.snapshot(), _INDEX.fingerprint)
+    _STATS["saves"] += 1
+    # their entries are in ours now; a sibling still running rewrites its file on its next save
+    for p in _MERGED:
+        if p != path:
+            p.unlink(missing_ok=True)
+    _MERGED.clear()
+
+
+async def _maintain():
+    while True:
+        await asyncio.sleep(settings.NEARDUP_SAVE_INTERVAL)
+        try:
+            _STATS["evicted"] += _INDEX.expire(settings.NEARDUP_MAX_AGE, time.time())
+            await save()
+        except Exception as e:
+            log.warning("near-duplicate index save failed: %s", e)
+
+
+async def start(prompt_version: str):
+    global _INDEX, _TASK
+    if np is None or not settings.NEARDUP_ENABLED or _INDEX is not None:
+        return
+    index = NearDupIndex(settings.NEARDUP_MAX_ENTRIES, settings.NEARDUP_PERMUTATIONS, settings.NEARDUP_BANDS,
+                         fingerprint=_fingerprint(prompt_version))
+    saved = []
+    _MERGED.clear()
+    for path in _saved_paths():
+        try:
+            data = await asyncio.to_thread(_load, path, index.fingerprint)
+        except Exception as e:
+            data = None
+            log.warning("near-duplicate index at %s not loaded: %s", path, e)
+        if data is not None and len(data[0]):
+            saved.append(data)
+        _MERGED.append(path)   # unreadable or another model's: nothing to keep either
+    if saved:
+        sigs, used, created, labels = await asyncio.to_thread(_merge, saved)
+        # most recently used last, so a smaller capacity keeps the hottest entries
+        for i in np.argsort(used)[-index.capacity:].tolist():
+            index.add(sigs[i], labels[i], float(used[i]), float(created[i]))
+        index.expire(settings.NEARDUP_MAX_AGE, time.time())
+        log.info("near-duplicate index loaded from %d file(s): %d pages", len(saved), len(index))
+    _INDEX = index
+    if settings.NEARDUP_SAVE_INTERVAL > 0:
+        _TASK = asyncio.create_task(_maintain())
+
+
+async def close():
+    global _INDEX, _TASK
+    if _TASK is not None:
+        _TASK.cancel()
+        _TASK = None
+    if _INDEX is not None:
+        try:
+            await save()
+        except Exception as e:
+            log.warning("near-duplicate index save failed: %s", e)
+    _INDEX = None
+
+
+def stats() -> dict:
+    q = _STATS["queries"]
+    return {
+        "enabled": _INDEX is not None,
+        **{k: v for k, v in _STATS.items() if k != "us_total"},
+        "entries": len(_INDEX) if _INDEX is not None else 0,
+        "capacity": settings.NEARDUP_MAX_ENTRIES,
+        "bytes": _INDEX.nbytes() if _INDEX is not None else 0,
+        "hit_rate": round(_STATS["hits"] / q, 4) if q else 0.0,
+        "us_avg": round(_STATS["us_total"] / q, 1) if q else 0.0,
+    }
@@ -0,0 +1,216 @@
+# api/app/preflight.py
+# Pre-flight for a check, before any page body is downloaded:
+#   - links on known shorteners (bit.ly, t.co, ...) are resolved hop by hop
+#     with HEAD, and shortener -> target is cached, so a popular short link
+#     costs no network after its first check. The pipeline then looks the
+#     target up in the verdict cache: one article shared through several
+#     short links is fetched and labelled once.
+#   - the page GET doubles as the content-type probe: fetch_html stops at the
+#     response headers when they say the body isn't HTML (no second request),
+#     and the pipeline takes a cheap path for it: text of the first pages of
+#     a PDF (needs pypdf), or a verdict from metadata alone for images,
+#     video, audio and other files.
+import asyncio, io, logging, time
+from typing import List, Optional, Tuple
+from urllib.parse import unquote, urljoin, urlparse
+from .config import settings
+from .cache import TTLCache
+from . import http_client
+
+try:
+    import pypdf
+except ImportError:  # optional dependency; PDFs get a metadata-only verdict without it
+    pypdf = None
+
+log = logging.getLogger(__name__)
+
+SHORTENERS = frozenset("""
+bit.ly bitly.com t.co tinyurl.com goo.gl ow.ly buff.ly is.gd v.gd rebrand.ly lnkd.in fb.me
+dlvr.it tiny.cc cutt.ly shorturl.at rb.gy t.ly s.id bl.ink trib.al amzn.to a.co
+""".split())
+
+_HTML_TYPES = ("text/html", "application/xhtml+xml", "text/plain", "application/xml", "text/xml")
+
+# shortener url -> (target, chain)
+_TARGETS = TTLCache(settings.PREFLIGHT_CACHE_MAX_ENTRIES)
+_STATS = {"shortener_links": 0, "shortener_cache_hits": 0, "resolved": 0, "hops": 0, "resolve_errors": 0,
+          "not_html": 0, "pdf_extracted": 0, "pdf_skipped": 0, "resolve_ms_total": 0.0}
+
+
+def _shorteners() -> frozenset:
+    extra = {h.strip().lower() for h in (settings.PREFLIGHT_SHORTENERS or "").split(",") if h.strip()}
+    return SHORTENERS | extra if extra else SHORTENERS
+
+
+def is_shortener(url: str) -> bool:
+    host = (urlparse(url).hostname or "").lower()
+    return host.removeprefix("www.") in _shorteners()
+
+
+def content_kind(content_type: Optional[str]) -> str:
+    """'html' (anything the html extractor can read, or no type at all), 'pdf',
+    'image', 'video', 'audio' or 'other'."""
+    ct = (content_type or "").split(";")[0].strip().lower()
+    if not ct or ct in _HTML_TYPES:
+        return "html"
+    if ct == "application/pdf":
+        return "pdf"
+    major = ct.split("/")[0]
+    return major if major in ("image", "video", "audio") else "other"
+
+
+async def _hop(hc, url: str) -> Optional[str]:
+    """Location of a redirect at url, else None. HEAD first; some shorteners
+    refuse it, and then a GET is sent whose body is never read."""
+    async with http_client.host_slot(urlparse(url).hostname or ""):
+        r = await hc.head(url, follow_redirects=False)
+        if r.status_code in (400, 403, 405, 501):
+            async with hc.stream("GET", url, follow_redirects=False) as r:
+                pass
+    if r.is_redirect and r.headers.get("location"):
+        return urljoin(url, r.headers["location"])
+    return None
+
+
+async def _walk(url: str) -> List[str]:
+    hc = http_client.get_client()
+    chain = [url]
+    for _ in range(settings.PREFLIGHT_MAX_REDIRECTS):
+        nxt = await _hop(hc, chain[-1])
+        if nxt is None or nxt in chain:
+            break
+        chain.append(nxt)
+        _STATS["hops"] += 1
+        # off the shortener: the page fetch follows whatever redirects are left
+        if not is_shortener(nxt):
+            break
+    return chain
+
+
+async def resolve(url: str) -> Tuple[str, List[str]]:
+    """(target, chain). Urls not on a shortener come back as they are; so does a
+    shortener url that can't be resolved (the page fetch still follows it)."""
+    if not settings.PREFLIGHT_ENABLED or not is_shortener(url):
+        return url, [url]
+    _STATS["shortener_links"] += 1
+    hit = _TARGETS.get(url)
+    if hit is not None:
+        _STATS["shortener_cache_hits"] += 1
+        return hit[0], list(hit[1])
+    t0 = time.monotonic()
+    try:
+        chain = await asyncio.wait_for(_walk(url), settings.PREFLIGHT_TIMEOUT)
+    except Exception as e:
+        _STATS["resolve_errors"] += 1
+        log.debug("resolving %s failed: %s", url, e)
+        return url, [url]
+    finally:
+        _STATS["resolve_ms_total"] += (time.monotonic() - t0) * 1000
+    if len(chain) > 1:
+        _STATS["resolved"] += 1
+        _TARGETS.set(url, (chain[-1], chain), settings.PREFLIGHT_CACHE_TTL)
+    return chain[-1], chain
+
+
+def full_chain(chain: List[str], fetch_history: List[str], final_url: str) -> List[str]:
+    """Pre-flight hops followed by the redirects the page fetch itself followed."""
+    out = list(chain)
+    for u in list(fetch_history) + [final_url]:
+        if u != out[-1]:
+            out.append(u)
+    return out
+
+
+def record_not_html():
+    _STATS["not_html"] += 1
+
+
+def file_name(url: str) -> str:
+    path = urlparse(url).path.rstrip("/")
+    return unquote(path.rsplit("/", 1)[-1]) if path else ""
+
+
+def _size(content_length: Optional[str]) -> str:
+    if not content_length or not content_length.isdigit():
+        return ""
+    n = int(content_length)
+    return f"{n / 1_000_000:.1f} MB" if n >= 1_000_000 else f"{max(1, n // 1000)} KB"
+
+
+def describe(kind: str, url: str, headers: dict, domain: str) -> str:
+    """One summary bullet for a file we didn't read."""
+    noun = {"pdf": "a PDF document", "image": "a picture", "video": "a video", "audio": "an audio recording"}.get(kind, "a file")
+    details = [d for d in (file_name(url), _size(headers.get("content-length"))) if d]
+    return f"This link opens {noun}{' (' + ', '.join(details) + ')' if details else ''} from {domain}, not an article."
+
+
+def _pdf_extract(data: bytes, max_pages: int, max_chars: int) -> Optional[Tuple[str, str]]:
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    title = ""
+    try:
+        title = ((reader.metadata or {}).get("/Title") or "").strip()
+    except Exception:
+        pass
+    parts, n = [], 0
+    for page in reader.pages[:max_pages]:
+        text = (page.extract_text() or "").strip()
+        if text:
+            parts.append(text)
+            n += len(text)
+        if n >= max_chars:
+            break
+    body = "\n\n".join(parts)
+    if not body:
+        return None  # scanned images only
+    return title or body.split("\n", 1)[0][:200], body
+
+
+async def _pdf_download(url: str) -> Optional[bytes]:
+    buf = bytearray()
+    async with http_client.host_slot(urlparse(url).hostname or ""):
+        async with http_client.get_client().stream("GET", url) as r:
+            r.raise_for_status()
+            async for chunk in r.aiter_bytes():
+                buf += chunk
+                if len(buf) > settings.PDF_MAX_BYTES:
+                    # the page index is at the end of the file: a truncated PDF is unreadable
+                    return None
+    return bytes(buf)
+
+
+async def pdf_text(url: str, headers: dict) -> Optional[Tuple[str, str]]:
+    """(title, body) from the first PDF_MAX_PAGES pages, or None (no pypdf, too big,
+    too slow, unreadable) for a metadata-only verdict."""
+    size = headers.get("content-length")
+    if pypdf is None or (size and size.isdigit() and int(size) > settings.PDF_MAX_BYTES):
+        _STATS["pdf_skipped"] += 1
+        return None
+    try:
+        # one deadline for the whole body, like the page fetch: a trickling server
+        # would otherwise hold the host slot and the pipeline slot indefinitely
+        data = await asyncio.wait_for(_pdf_download(url), settings.HTTP_TOTAL_TIMEOUT)
+        if data is None:
+            _STATS["pdf_skipped"] += 1
+            return None
+        # parsing is CPU-bound; keep it off the event loop
+        page = await asyncio.to_thread(_pdf_extract, data, settings.PDF_MAX_PAGES, settings.FETCH_STOP_CHARS * 2)
+    except Exception as e:
+        _STATS["pdf_skipped"] += 1
+        log.debug("pdf extraction for %s failed: %s", url, e)
+        return None
+    if page is None:
+        _STATS["pdf_skipped"] += 1
+        return None
+    _STATS["pdf_extracted"] += 1
+    return page
+
+
+def stats() -> dict:
+    links = _STATS["shortener_links"]
+    misses = links - _STATS["shortener_cache_hits"]
+    return {
+        **_STATS,
+        "resolve_ms_avg": round(_STATS["resolve_ms_total"] / misses, 2) if misses else 0.0,
+        "cache_entries": len(_TARGETS),
+        "pdf_support": pypdf is not None,
+    }
@@ -0,0 +1,60 @@
+# api/app/psl.py
+# Registered domain ("bbc.co.uk" for news.bbc.co.uk) from a vendored, versioned
+# Public Suffix List (seeds/public_suffix_list.dat; scripts/update_psl.py
+# refreshes it). tldextract's default extractor downloads the list on first use,
+# which stalls the first check after every deploy and fails with no network;
+# this one only ever reads the file. Built once, by warm-up or the first lookup.
+import logging, re, threading, time
+from pathlib import Path
+from typing import Optional
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PSL = Path(__file__).resolve().parent.parent / "seeds" / "public_suffix_list.dat"
+_VERSION = re.compile(r"^// VERSION: (\S+)", re.M)
+
+_EXTRACTOR = None
+_LOCK = threading.Lock()   # warm-up builds it in a thread
+_INFO = {"path": None, "version": None, "load_ms": None, "lookups": 0}
+
+
+def path() -> Path:
+    return Path(settings.PSL_PATH) if settings.PSL_PATH else DEFAULT_PSL
+
+
+def version(p: Path) -> Optional[str]:
+    with open(p, encoding="utf-8") as f:
+        m = _VERSION.search(f.read(2048))
+    return m.group(1) if m else None
+
+
+def load():
+    """The extractor; parses the list on first call (~100ms), then free."""
+    global _EXTRACTOR
+    if _EXTRACTOR is not None:
+        return _EXTRACTOR
+    with _LOCK:
+        if _EXTRACTOR is None:
+            t0 = time.perf_counter()
+            import tldextract  # pulls in requests/idna/filelock: keep it off the import path
+            p = path()
+            # file:// only, no disk cache; tldextract's bundled snapshot if our file is missing
+            ext = tldextract.TLDExtract(suffix_list_urls=(p.as_uri(),), cache_dir=None, fallback_to_snapshot=True)
+            ext("example.com")  # parse now, not inside the first request
+            _INFO.update(path=str(p), version=version(p) if p.exists() else "tldextract-snapshot",
+                         load_ms=round((time.perf_counter() - t0) * 1000, 1))
+            if not p.exists():
+                log.warning("public suffix list %s missing, using tldextract's bundled snapshot", p)
+            _EXTRACTOR = ext
+    return _EXTRACTOR
+
+
+def registered_domain(url: str) -> str:
+    _INFO["lookups"] += 1
+    ext = load()(url)
+    return ".".join(part for part in [ext.domain, ext.suffix] if part)
+
+
+def stats() -> dict:
+    return {**_INFO, "loaded": _EXTRACTOR is not None}
@@ -0,0 +1,201 @@
+# api/app/reputation.py
+# Domain reputation index, bulk-loaded from seeds/domain_reputation.csv and
+# the domain_reputation table (COPY). Domains are kept sorted in one bytes blob
+# with parallel offset/score/label arrays, fronted by a bloom filter so the
+# common case (unknown domain) never touches the binary search.
+import asyncio, csv, hashlib, logging, math, os, time
+from array import array
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+from .config import settings
+from .db import connection, copy_domain_reputation, get_reputation_version
+
+log = logging.getLogger(__name__)
+
+LABELS = ("reputable", "mixed", "junk", "unknown")
+_LABEL_CODES = {name: i for i, name in enumerate(LABELS)}
+DEFAULT_CSV = Path(__file__).resolve().parent.parent / "seeds" / "domain_reputation.csv"
+
+
+def normalize_domain(d: str) -> str:
+    d = (d or "").strip().lower().rstrip(".")
+    return d[4:] if d.startswith("www.") else d
+
+
+class _Bloom:
+    def __init__(self, n: int, fp_rate: float):
+        n = max(n, 1)
+        self.m = max(64, int(-n * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m / n * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _positions(self, key: bytes):
+        h = hashlib.blake2b(key, digest_size=16).digest()
+        h1, h2 = int.from_bytes(h[:8], "little"), int.from_bytes(h[8:], "little") | 1
+        return ((h1 + i * h2) % self.m for i in range(self.k))
+
+    def add(self, key: bytes):
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+
+class ReputationIndex:
+    """Immutable; reloads build a new index and swap it in."""
+
+    def __init__(self, rows: Iterable[Tuple[str, float, str]]):
+        merged = {}
+        for domain, score, label in rows:
+            d = normalize_domain(domain)
+            if d:
+                merged[d.encode()] = (float(score), _LABEL_CODES.get((label or "").strip().lower(), 3))
+        keys = sorted(merged)
+        self._blob = b"".join(keys)
+        self._offsets = array("I", [0])
+        for k in keys:
+            self._offsets.append(self._offsets[-1] + len(k))
+        self._scores = array("f", (merged[k][0] for k in keys))
+        self._labels = bytes(merged[k][1] for k in keys)
+        self._bloom = _Bloom(len(keys), settings.REPUTATION_BLOOM_FP_RATE)
+        for k in keys:
+            self._bloom.add(k)
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def _key(self, i: int) -> bytes:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]]
+
+    def _find(self, key: bytes) -> int:
+        lo, hi = 0, len(self._scores)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self._scores) and self._key(lo) == key else -1
+
+    def lookup(self, host: str) -> Optional[dict]:
+        """Most specific match for host or any parent domain (news.example.com -> example.com)."""
+        parts = normalize_domain(host).split(".")
+        for i in range(len(parts) - 1):
+            key = ".".join(parts[i:]).encode()
+            if key not in self._bloom:
+                continue
+            idx = self._find(key)
+            if idx >= 0:
+                return {"domain": key.decode(), "score": round(self._scores[idx], 3), "label": LABELS[self._labels[idx]]}
+        return None
+
+    def nbytes(self) -> int:
+        return (
+            len(self._blob)
+            + self._offsets.itemsize * len(self._offsets)
+            + self._scores.itemsize * len(self._scores)
+            + len(self._labels)
+            + len(self._bloom.bits)
+        )
+
+
+_INDEX = ReputationIndex([])
+_STATE = {"csv_mtime": None, "db_version": None, "reloads": 0, "last_error": None}
+_TASK: Optional[asyncio.Task] = None
+
+
+def lookup(host: str) -> Optional[dict]:
+    return _INDEX.lookup(host)
+
+
+def _csv_path() -> Path:
+    return Path(settings.REPUTATION_CSV) if settings.REPUTATION_CSV else DEFAULT_CSV
+
+
+def _read_csv(path: Path):
+    if not path.exists():
+        return []
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(r["domain"], r["score"], r.get("label")) for r in csv.DictReader(f) if r.get("domain")]
+
+
+async def _read_db():
+    if not settings.DATABASE_URL:
+        return []
+    async with connection() as conn:
+        return await copy_domain_reputation(conn)
+
+
+async def _db_version():
+    if not settings.DATABASE_URL:
+        return None
+    async with connection() as conn:
+        return await get_reputation_version(conn)
+
+
+async def reload():
+    global _INDEX
+    path = _csv_path()
+    csv_mtime = os.path.getmtime(path) if path.exists() else None
+    csv_rows = await asyncio.to_thread(_read_csv, path)
+    error = None
+    try:
+        db_version = await _db_version()
+        db_rows = await _read_db()
+    except Exception as e:
+        # seed file alone is still useful; the watcher retries the table
+        db_version, db_rows, error = None, [], str(e)
+        log.warning("domain_reputation table not loaded: %s", e)
+    # table rows override the seed file for the same domain
+    _INDEX = await asyncio.to_thread(ReputationIndex, [*csv_rows, *db_rows])
+    _STATE.update(csv_mtime=csv_mtime, db_version=db_version, last_error=error)
+    _STATE["reloads"] += 1
+    log.info("domain reputation loaded: %d domains, %d bytes", len(_INDEX), _INDEX.nbytes())
+
+
+async def _changed() -> bool:
+    path = _csv_path()
+    csv_mtime = os.path.getmtime(path) if path.exists() else None
+    return csv_mtime != _STATE["csv_mtime"] or await _db_version() != _STATE["db_version"]
+
+
+async def _watch():
+    while True:
+        await asyncio.sleep(settings.REPUTATION_RELOAD_INTERVAL)
+        try:
+            if await _changed():
+                await reload()
+        except Exception as e:
+            _STATE["last_error"] = str(e)
+            log.warning("domain reputation reload failed: %s", e)
+
+
+async def start():
+    global _TASK
+    try:
+        await reload()
+    except Exception as e:
+        # bad seed file: keep serving with an empty index rather than failing startup
+        _STATE["last_error"] = str(e)
+        log.warning("domain reputation load failed: %s", e)
+    if settings.REPUTATION_RELOAD_INTERVAL > 0 and _TASK is None:
+        _TASK = asyncio.create_task(_watch())
+
+
+async def close():
+    global _TASK
+    if _TASK is not None:
+        _TASK.cancel()
+    _TASK = None
+
+
+def stats() -> dict:
+    return {
+        "domains": len(_INDEX),
+        "bytes": _INDEX.nbytes(),
+        "loaded_at": _INDEX.loaded_at,
+        "reloads": _STATE["reloads"],
+        "last_error": _STATE["last_error"],
+    }
@@ -1,9 +1,11 @@
 from pydantic import BaseModel, HttpUrl, Field
-from typing import List, Optional, Any
+from typing import Dict, List, Optional, Any
+from datetime import date, datetime
 
 class CheckRequest(BaseModel):
     url: HttpUrl
     user_id: Optional[str] = None  # optional until auth wired
+    refresh: bool = False          # bypass the verdict cache (the page is revalidated)
 
 class CheckResponse(BaseModel):
     verdict: str                 # ok | warning | danger
@@ -11,6 +13,48 @@ class CheckResponse(BaseModel):
     summary: str
     meta: dict
 
+class BatchCheckRequest(BaseModel):
+    urls: List[HttpUrl] = Field(..., min_length=1)
+
+class BatchCheckItem(BaseModel):
+    index: int                   # position in the request's urls
+    url: str
+    result: Optional[CheckResponse] = None
+    error: Optional[str] = None  # set instead of result when this url failed
+
+class HistoryItem(BaseModel):
+    id: str
+    url: str
+    verdict: Optional[str] = None
+    reasons: List[str] = []
+    summary: Optional[str] = None
+    created_at: datetime
+
+class HistoryPage(BaseModel):
+    items: List[HistoryItem]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next (older) page
+
+class ElderSummary(BaseModel):
+    elder_user_id: Optional[str] = None
+    elder_email: Optional[str] = None
+    checks: int = 0
+    verdicts: Dict[str, int] = {}
+    top_reasons: Dict[str, int] = {}
+    last_check_at: Optional[datetime] = None
+
+class CaregiverSummary(BaseModel):
+    days: int
+    elders: List[ElderSummary]
+
+class DailyRollup(BaseModel):
+    day: date
+    verdicts: Dict[str, int] = {}
+    reasons: Dict[str, int] = {}
+
+class ElderDetailSummary(ElderSummary):
+    days: int
+    daily: List[DailyRollup]  # oldest first; days without checks are omitted
+
 class CheckoutRequest(BaseModel):
     user_id: str
     email: Optional[str] = None
@@ -0,0 +1,97 @@
+# api/app/validators.py
+# Per-URL revalidation state: the ETag / Last-Modified the origin sent and a
+# hash of the extracted text, next to the meta (labels included) of the last
+# full check. When a cached verdict has expired, the refetch is conditional;
+# a 304, or a 200 whose text hashes the same, reuses the stored labels instead
+# of calling the LLM. Memory LRU in front of the url_validators table.
+import asyncio, hashlib, logging
+from typing import Optional
+import orjson
+from .config import settings
+from .cache import TTLCache
+from .db import connection, get_url_validator, upsert_url_validator, delete_url_validator
+
+log = logging.getLogger(__name__)
+
+_MEMORY = TTLCache(settings.VALIDATOR_MAX_ENTRIES)
+_STATS = {"lookups": 0, "no_validators": 0, "not_modified": 0, "unchanged": 0, "changed": 0, "stores": 0, "errors": 0}
+_PENDING = set()
+
+
+def content_hash(title: str, body: str) -> str:
+    return hashlib.sha256(orjson.dumps([title, body])).hexdigest()
+
+
+def conditional_headers(record: Optional[dict]) -> dict:
+    headers = {}
+    if record and record.get("etag"):
+        headers["If-None-Match"] = record["etag"]
+    if record and record.get("last_modified"):
+        headers["If-Modified-Since"] = record["last_modified"]
+    return headers
+
+
+async def get(key: str, version: str) -> Optional[dict]:
+    """Record from the last full check of this url, if made by the same model/prompt version."""
+    _STATS["lookups"] += 1
+    record = _MEMORY.get(key)
+    if record is None and settings.DATABASE_URL:
+        try:
+            async with connection() as conn:
+                row = await get_url_validator(conn, key, settings.VALIDATOR_TTL)
+        except Exception as e:
+            _STATS["errors"] += 1
+            log.debug("url_validators lookup failed: %s", e)
+            row = None
+        if row is not None:
+            etag, last_modified, chash, meta, row_version, age = row
+            record = {"etag": etag, "last_modified": last_modified, "content_hash": chash, "meta": meta, "version": row_version}
+            _MEMORY.set(key, record, settings.VALIDATOR_TTL - age)
+    if record is None or record["version"] != version:
+        _STATS["no_validators"] += 1
+        return None
+    return record
+
+
+def record_outcome(outcome: str):
+    # "not_modified" (304), "unchanged" (same text hash) or "changed"
+    _STATS[outcome] += 1
+
+
+async def _store(key: str, record: dict):
+    try:
+        async with connection() as conn:
+            await upsert_url_validator(conn, key, record["etag"], record["last_modified"], record["content_hash"],
+                                       orjson.dumps(record["meta"]).decode(), record["version"])
+        _STATS["stores"] += 1
+    except Exception as e:
+        _STATS["errors"] += 1
+        log.debug("url_validators store failed: %s", e)
+
+
+def put(key: str, *, etag: Optional[str], last_modified: Optional[str], chash: str, meta: dict, version: str):
+    record = {"etag": etag, "last_modified": last_modified, "content_hash": chash, "meta": meta, "version": version}
+    _MEMORY.set(key, record, settings.VALIDATOR_TTL)
+    if settings.DATABASE_URL:
+        task = asyncio.ensure_future(_store(key, record))
+        _PENDING.add(task)
+        task.add_done_callback(_PENDING.discard)
+
+
+async def invalidate(key: str):
+    _MEMORY.pop(key)
+    if settings.DATABASE_URL:
+        async with connection() as conn:
+            await delete_url_validator(conn, key)
+
+
+def stats() -> dict:
+    reused = _STATS["not_modified"] + _STATS["unchanged"]
+    revalidations = reused + _STATS["changed"]
+    return {
+        **_STATS,
+        "memory_entries": len(_MEMORY),
+        "revalidations": revalidations,
+        "hit_rate": round(reused / revalidations, 4) if revalidations else 0.0,
+        "not_modified_rate": round(_STATS["not_modified"] / revalidations, 4) if revalidations else 0.0,
+    }
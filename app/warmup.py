@@ -0,0 +1,67 @@
+# api/app/warmup.py
+# Optional warm-up, run by the lifespan after startup and before the app
+# serves (so before it reports ready): the lazy imports and one-time setup a
+# first request would otherwise pay for. Steps run concurrently, each failure
+# is logged and skipped, and the whole phase is capped at WARMUP_TIMEOUT.
+import asyncio, logging, time
+from .config import settings
+from .db import wait_pool
+from . import auth, billing, extract, llm, psl
+
+log = logging.getLogger(__name__)
+
+_INFO = {"ran": False, "total_ms": None, "steps": {}}
+
+
+def _steps() -> dict:
+    steps = {
+        "psl": asyncio.to_thread(psl.load),               # parse the suffix list, build the trie
+        "openai": asyncio.to_thread(llm.get_client),      # import openai, build the client
+        "extract": extract.warm(),                        # spawn the parser processes
+    }
+    if settings.STRIPE_SECRET_KEY:
+        steps["stripe"] = asyncio.to_thread(billing.stripe_lib)
+    if settings.DATABASE_URL:
+        steps["db"] = wait_pool(settings.WARMUP_TIMEOUT)  # pool at min_size
+    return steps
+
+
+def _background(name: str, task: asyncio.Task):
+    # network fetches aren't awaited: offline, they'd hold startup for their whole timeout
+    t0 = time.perf_counter()
+    _INFO["steps"][name] = {"ok": None, "ms": None, "background": True}
+
+    def done(t: asyncio.Task):
+        ok = not t.cancelled() and t.exception() is None
+        _INFO["steps"][name] = {"ok": ok, "ms": round((time.perf_counter() - t0) * 1000, 1), "background": True}
+    task.add_done_callback(done)
+
+
+async def _timed(name: str, aw):
+    t0 = time.perf_counter()
+    try:
+        await aw
+        ok = True
+    except Exception as e:
+        ok = False
+        log.warning("warm-up step %s failed: %s", name, e)
+    _INFO["steps"][name] = {"ok": ok, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+async def run():
+    t0 = time.perf_counter()
+    if settings.WARMUP_JWKS:
+        _background("jwks", auth.prime())   # signing keys for the first signed-in request
+    steps = _steps()
+    tasks = [asyncio.ensure_future(_timed(name, aw)) for name, aw in steps.items()]
+    done, pending = await asyncio.wait(tasks, timeout=settings.WARMUP_TIMEOUT)
+    for task in pending:
+        task.cancel()   # threads finish on their own; the lazy paths pick up whatever is left
+    _INFO.update(ran=True, total_ms=round((time.perf_counter() - t0) * 1000, 1))
+    for name in steps:
+        _INFO["steps"].setdefault(name, {"ok": False, "ms": None, "timed_out": True})
+    log.info("warm-up done in %.0fms: %s", _INFO["total_ms"], _INFO["steps"])
+
+
+def stats() -> dict:
+    return _INFO
@@ -0,0 +1,227 @@
+# api/app/worker.py
+# Background refresh / precompute worker. Runs run_check off the request path
+# for jobs in the check_jobs table: popular urls whose cached verdict is close
+# to expiring (seeded from url_checks) and operator-submitted lists. Jobs are
+# claimed with FOR UPDATE SKIP LOCKED, so any number of workers on any number
+# of nodes can share the queue. Results go to url_checks through the COPY
+# writer, which makes them the Postgres cache tier the API nodes read, and
+# job status updates are written back in batches.
+#   python -m app.worker run [--concurrency N] [--no-seed]
+#   python -m app.worker enqueue urls.txt [--priority 100]    (- for stdin)
+#   python -m app.worker seed
+#   python -m app.worker stats
+import argparse, asyncio, json, logging, os, random, signal, socket, sys, time
+from typing import List, Tuple
+from .config import settings
+from .cache import url_hash
+from .checker import normalize_url, run_check
+from .db import (connection, claim_jobs, complete_jobs, enqueue_jobs, fail_jobs, job_queue_stats,
+                 requeue_stale_jobs, seed_popular_jobs)
+from . import writer
+
+log = logging.getLogger("app.worker")
+
+
+def _backoff(attempt: int) -> float:
+    return min(settings.WORKER_BACKOFF_MAX, settings.WORKER_BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+class Worker:
+    def __init__(self, concurrency: int, seed: bool = True):
+        self.id = f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.seed = seed
+        self.stopping = asyncio.Event()
+        self._tasks = set()
+        self._done: List[Tuple[int, str]] = []            # (job id, verdict)
+        self._failed: List[Tuple[int, str, float]] = []   # (job id, error, retry delay)
+        self._window = {"done": 0, "since": time.monotonic()}
+        self.stats = {
+            "claimed": 0,
+            "done": 0,
+            "failed": 0,        # attempts that raised; the job is retried until max_attempts
+            "lag_ms_total": 0.0,
+            "lag_ms_max": 0.0,
+            "job_ms_total": 0.0,
+            "flush_errors": 0,
+        }
+
+    async def _job(self, job_id: int, url: str, attempt: int):
+        t0 = time.monotonic()
+        try:
+            verdict, reasons, summary, meta = await asyncio.wait_for(
+                run_check(url, refresh=True), settings.WORKER_JOB_TIMEOUT
+            )
+        except Exception as e:
+            self.stats["failed"] += 1
+            self._failed.append((job_id, f"{type(e).__name__}: {e}"[:500], _backoff(attempt)))
+            return
+        finally:
+            self.stats["job_ms_total"] += (time.monotonic() - t0) * 1000
+        # tagged so seed_popular_jobs doesn't count our own refreshes as demand
+        writer.submit(writer.check_row(user_id=None, url=url, verdict=verdict, reasons=reasons, summary=summary,
+                                       meta={**meta, "source": "refresh"}))
+        self.stats["done"] += 1
+        self._window["done"] += 1
+        self._done.append((job_id, verdict))
+
+    async def _claim(self, n: int) -> int:
+        try:
+            async with connection() as conn:
+                rows = await claim_jobs(conn, self.id, n)
+        except Exception as e:
+            log.warning("claiming jobs failed: %s", e)
+            return 0
+        for job_id, url, attempt, _max_attempts, lag in rows:
+            self.stats["claimed"] += 1
+            lag_ms = max(lag or 0.0, 0.0) * 1000
+            self.stats["lag_ms_total"] += lag_ms
+            self.stats["lag_ms_max"] = max(self.stats["lag_ms_max"], lag_ms)
+            task = asyncio.create_task(self._job(job_id, url, attempt))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return len(rows)
+
+    async def flush(self):
+        # status updates for many jobs in two statements; kept for the next try on error
+        done, failed = self._done, self._failed
+        if not done and not failed:
+            return
+        self._done, self._failed = [], []
+        try:
+            async with connection() as conn:
+                if done:
+                    await complete_jobs(conn, [d[0] for d in done], [d[1] for d in done])
+                if failed:
+                    await fail_jobs(conn, [f[0] for f in failed], [f[1] for f in failed], [f[2] for f in failed])
+        except Exception as e:
+            self.stats["flush_errors"] += 1
+            log.warning("writing back %d job results failed: %s", len(done) + len(failed), e)
+            self._done[:0], self._failed[:0] = done, failed
+
+    async def housekeeping(self):
+        try:
+            async with connection() as conn:
+                stale = await requeue_stale_jobs(conn, settings.WORKER_LEASE)
+                seeded = 0
+                if self.seed:
+                    seeded = await seed_popular_jobs(
+                        conn, window=settings.WORKER_SEED_WINDOW, limit=settings.WORKER_SEED_LIMIT,
+                        refresh_at=settings.WORKER_REFRESH_AT, max_attempts=settings.WORKER_MAX_ATTEMPTS,
+                    )
+            if stale or seeded:
+                log.info("requeued %d stale jobs, seeded %d popular urls", stale, seeded)
+        except Exception as e:
+            log.warning("worker housekeeping failed: %s", e)
+
+    def snapshot(self) -> dict:
+        s = self.stats
+        now = time.monotonic()
+        elapsed = now - self._window["since"]
+        out = {
+            **{k: round(v, 1) if isinstance(v, float) else v for k, v in s.items()},
+            "in_flight": len(self._tasks),
+            "throughput_per_min": round(self._window["done"] / elapsed * 60, 2) if elapsed else 0.0,
+            "lag_ms_avg": round(s["lag_ms_total"] / s["claimed"], 1) if s["claimed"] else 0.0,
+            "job_ms_avg": round(s["job_ms_total"] / (s["done"] + s["failed"]), 1) if s["done"] + s["failed"] else 0.0,
+            "writer": writer.stats(),
+        }
+        self._window.update(done=0, since=now)
+        return out
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_flush = next_house = next_log = 0.0
+        while not self.stopping.is_set():
+            free = self.concurrency - len(self._tasks)
+            claimed = await self._claim(free) if free > 0 else 0
+            now = loop.time()
+            if now >= next_flush or len(self._done) + len(self._failed) >= settings.WORKER_RESULT_BATCH:
+                await self.flush()
+                next_flush = now + settings.WORKER_RESULT_FLUSH
+            if now >= next_house:
+                await self.housekeeping()
+                next_house = now + settings.WORKER_HOUSEKEEPING_INTERVAL
+            if now >= next_log:
+                if next_log:
+                    log.info("worker %s", json.dumps(self.snapshot()))
+                next_log = now + settings.WORKER_LOG_INTERVAL
+            # queue drained: poll. Otherwise go again as soon as a slot frees up,
+            # waking at least every flush interval to write results back.
+            timeout = settings.WORKER_POLL_INTERVAL if claimed < free else settings.WORKER_RESULT_FLUSH
+            stop = asyncio.ensure_future(self.stopping.wait())
+            await asyncio.wait(self._tasks | {stop}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            stop.cancel()
+        # shutdown: let running jobs finish (bounded), then write back what we have
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=settings.WORKER_JOB_TIMEOUT)
+        await self.flush()
+        log.info("worker %s stopped: %s", self.id, json.dumps(self.snapshot()))
+
+
+def _read_urls(path: str) -> List[str]:
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+async def _enqueue(path: str, priority: int) -> int:
+    jobs, seen = [], set()
+    for url in _read_urls(path):
+        h = url_hash(normalize_url(url))
+        if h not in seen:
+            seen.add(h)
+            jobs.append((url, h))
+    for i in range(0, len(jobs), 1000):
+        async with connection() as conn:
+            await enqueue_jobs(conn, jobs[i:i + 1000], source="operator", priority=priority,
+                               max_attempts=settings.WORKER_MAX_ATTEMPTS)
+    return len(jobs)
+
+
+async def _queue_stats() -> dict:
+    async with connection() as conn:
+        rows = await job_queue_stats(conn)
+    return {status: {"jobs": n, "oldest_ready_s": round(age, 1) if age is not None else None} for status, n, age in rows}
+
+
+async def _run(concurrency: int, seed: bool):
+    from .main import app, lifespan  # same startup/shutdown as the API: pools, caches, writer
+    worker = Worker(concurrency, seed)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stopping.set)
+    async with lifespan(app):
+        log.info("worker %s started, concurrency %d", worker.id, concurrency)
+        await worker.run()
+
+
+def main():
+    ap = argparse.ArgumentParser(prog="python -m app.worker")
+    sub = ap.add_subparsers(dest="cmd")
+    run = sub.add_parser("run", help="process jobs until SIGTERM (default)")
+    run.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY)
+    run.add_argument("--no-seed", action="store_true", help="don't enqueue popular urls from url_checks")
+    enq = sub.add_parser("enqueue", help="queue a list of urls, one per line")
+    enq.add_argument("path", help="file, or - for stdin")
+    enq.add_argument("--priority", type=int, default=settings.WORKER_OPERATOR_PRIORITY)
+    sub.add_parser("seed", help="queue popular urls due for a refresh, once")
+    sub.add_parser("stats", help="print queue depth and lag")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    if not settings.DATABASE_URL:
+        sys.exit("DATABASE_URL is required")
+    if args.cmd == "enqueue":
+        print(json.dumps({"enqueued": asyncio.run(_enqueue(args.path, args.priority))}))
+    elif args.cmd == "seed":
+        worker = Worker(0)
+        asyncio.run(worker.housekeeping())
+    elif args.cmd == "stats":
+        print(json.dumps(asyncio.run(_queue_stats()), indent=2))
+    else:
+        asyncio.run(_run(getattr(args, "concurrency", settings.WORKER_CONCURRENCY), not getattr(args, "no_seed", False)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# api/app/writer.py
+# Write-behind persistence for url_checks: handlers enqueue rows and return;
+# a background task COPYs them in batches (size or time threshold), retries
+# transient DB failures and drains the queue on shutdown.
+import asyncio, logging, time
+from datetime import datetime, timezone
+from typing import List, Optional
+import orjson, psycopg
+from psycopg_pool import PoolTimeout
+from .config import settings
+from .db import connection, copy_url_checks
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+_QUEUE: Optional[asyncio.Queue] = None
+_TASK: Optional[asyncio.Task] = None
+_STATS = {
+    "enqueued": 0,
+    "written": 0,
+    "dropped_full": 0,     # queue full at submit time
+    "dropped_failed": 0,   # batch gave up after retries / bad data
+    "flushes": 0,
+    "retries": 0,
+    "flush_ms_last": 0.0,
+    "flush_ms_max": 0.0,
+    "flush_ms_total": 0.0,
+}
+
+
+def check_row(*, user_id, url, verdict, reasons, summary, meta) -> tuple:
+    # column order matches db.copy_url_checks
+    return (
+        user_id,
+        url,
+        meta.get("url_hash"),
+        verdict,
+        orjson.dumps(reasons).decode(),
+        summary,
+        orjson.dumps(meta).decode(),
+        meta.get("cached", False),
+        datetime.now(timezone.utc),
+    )
+
+
+def submit(row: tuple) -> bool:
+    """Never blocks; returns False when the row was not queued."""
+    if _QUEUE is None:
+        return False
+    try:
+        _QUEUE.put_nowait(row)
+    except asyncio.QueueFull:
+        _STATS["dropped_full"] += 1
+        return False
+    _STATS["enqueued"] += 1
+    return True
+
+
+def _transient(e: Exception) -> bool:
+    return isinstance(e, (psycopg.OperationalError, PoolTimeout))
+
+
+async def _flush(batch: List[tuple]):
+    for attempt in range(settings.WRITER_MAX_RETRIES + 1):
+        t0 = time.monotonic()
+        try:
+            async with connection() as conn:
+                await copy_url_checks(conn, batch)
+        except Exception as e:
+            if not _transient(e) or attempt == settings.WRITER_MAX_RETRIES:
+                _STATS["dropped_failed"] += len(batch)
+                log.warning("url_checks batch of %d dropped: %s", len(batch), e)
+                return
+            _STATS["retries"] += 1
+            await asyncio.sleep(min(settings.WRITER_FLUSH_INTERVAL * 2 ** attempt, 30.0))
+            continue
+        ms = (time.monotonic() - t0) * 1000
+        _STATS["flushes"] += 1
+        _STATS["written"] += len(batch)
+        _STATS["flush_ms_last"] = ms
+        _STATS["flush_ms_total"] += ms
+        _STATS["flush_ms_max"] = max(_STATS["flush_ms_max"], ms)
+        if settings.METRICS_ENABLED:
+            metrics.observe("db_flush", ms / 1000)
+        return
+
+
+async def _run():
+    loop = asyncio.get_running_loop()
+    batch: List[tuple] = []
+    try:
+        while True:
+            batch.append(await _QUEUE.get())
+            deadline = loop.time() + settings.WRITER_FLUSH_INTERVAL
+            while len(batch) < settings.WRITER_BATCH_SIZE:
+                try:
+                    batch.append(_QUEUE.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(_QUEUE.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await _flush(batch)
+            batch = []
+    except asyncio.CancelledError:
+        # shutdown: whatever was collected plus everything still queued
+        while not _QUEUE.empty():
+            batch.append(_QUEUE.get_nowait())
+        for i in range(0, len(batch), settings.WRITER_BATCH_SIZE):
+            await _flush(batch[i:i + settings.WRITER_BATCH_SIZE])
+        raise
+
+
+def start():
+    global _QUEUE, _TASK
+    if _TASK is not None or not settings.DATABASE_URL:
+        return
+    _QUEUE = asyncio.Queue(maxsize=settings.WRITER_QUEUE_SIZE)
+    _TASK = asyncio.create_task(_run())
+
+
+async def close():
+    global _QUEUE, _TASK
+    if _TASK is None:
+        return
+    task, _TASK = _TASK, None
+    task.cancel()
+    try:
+        await asyncio.wait_for(task, settings.WRITER_DRAIN_TIMEOUT)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        pass
+    if _QUEUE is not None and not _QUEUE.empty():
+        log.warning("url_checks writer stopped with %d rows unwritten", _QUEUE.qsize())
+    _QUEUE = None
+
+
+def stats() -> dict:
+    flushes = _STATS["flushes"]
+    return {
+        **_STATS,
+        "queue_depth": _QUEUE.qsize() if _QUEUE is not None else 0,
+        "queue_max": settings.WRITER_QUEUE_SIZE,
+        "flush_ms_avg": round(_STATS["flush_ms_total"] / flushes, 2) if flushes else 0.0,
+    }
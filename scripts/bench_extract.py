@@ -0,0 +1,80 @@
+# scripts/bench_extract.py
+# CPU time per page for the old extraction path (readability + bs4 html.parser,
+# second full parse on fallback, string-scan noise score) vs app.extract.
+#   python -m scripts.bench_extract [page.html ...]
+import json, sys, time
+from pathlib import Path
+from bs4 import BeautifulSoup
+from readability import Document
+from app.extract import extract_page
+
+
+def legacy_extract(html: str):
+    try:
+        doc = Document(html)
+        title = (doc.short_title() or "").strip()
+        soup = BeautifulSoup(doc.summary(html_partial=True), "html.parser")
+        paras = [p.get_text(" ", strip=True) for p in soup.find_all("p")]
+        body = "\n\n".join(paras[:6])
+        if not body.strip():
+            raise ValueError("empty")
+    except Exception:
+        soup = BeautifulSoup(html, "html.parser")
+        title = (soup.title.get_text(strip=True) if soup.title else "")[:140]
+        paras = [p.get_text(" ", strip=True) for p in soup.find_all("p")]
+        body = "\n\n".join(paras[:6])
+    noise = html.count("<iframe") + (html.count("subscribe") > 5) + (html.count("popup") > 2)
+    return title, body, int(noise)
+
+
+def synthetic_page(n_paras: int, n_ads: int) -> str:
+    ads = "".join(
+        f'<div class="ad popup-{i}"><iframe src="https://ads.example/{i}"></iframe>'
+        f'<a class="subscribe" href="#">Subscribe now</a><script>var x{i}={i};</script></div>'
+        for i in range(n_ads)
+    )
+    paras = "".join(
+        f"<p>Paragraph {i}: officials said the county clinic will extend flu shot hours "
+        f"through the weekend, and residents over 65 can book online or by phone.</p>"
+        for i in range(n_paras)
+    )
+    return (
+        "<html><head><title>County extends flu clinic hours | Local News</title></head>"
+        f"<body><nav>{ads}</nav><article><h1>County extends flu clinic hours</h1>{paras}</article>"
+        f"<aside>{ads}</aside></body></html>"
+    )
+
+
+def bench(fn, html: str, rounds: int) -> float:
+    fn(html)  # warm
+    t0 = time.process_time()
+    for _ in range(rounds):
+        fn(html)
+    return (time.process_time() - t0) / rounds * 1000
+
+
+def main():
+    pages = {p: Path(p).read_text(errors="replace") for p in sys.argv[1:]}
+    if not pages:
+        pages = {
+            "small": synthetic_page(10, 5),
+            "medium": synthetic_page(80, 60),
+            "large": synthetic_page(400, 400),
+        }
+    out = []
+    for name, html in pages.items():
+        rounds = 20 if len(html) < 200_000 else 5
+        before = bench(legacy_extract, html, rounds)
+        after = bench(extract_page, html, rounds)
+        out.append({
+            "page": name,
+            "bytes": len(html),
+            "legacy_cpu_ms": round(before, 2),
+            "lxml_cpu_ms": round(after, 2),
+            "speedup": round(before / after, 2) if after else None,
+        })
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# scripts/coldstart.py
+# Cold-start measurement, two ways:
+#   - import time: `import app.main` in fresh interpreters (median of --imports)
+#   - first request: spawn the loadtest stubs and the API (no database), time
+#     process start -> /health answering, then the first and second
+#     POST /api/check (distinct URLs, so neither is a cache hit). Once with
+#     WARMUP_ENABLED=true and once with false, --rounds times each.
+# Output is JSON; the "api_stats" of the last round show the warm-up steps.
+#   python -m scripts.coldstart --rounds 3 --out cold.json
+import argparse, asyncio, json, os, shutil, statistics, subprocess, sys, tempfile, time, uuid
+from pathlib import Path
+import httpx
+from .loadtest import ROOT, free_port, git_rev, make_keys, spawn, wait_ready
+from .loadtest_stubs import mint_token
+
+IMPORT_SNIPPET = "import time; t0 = time.perf_counter(); import app.main; print(time.perf_counter() - t0)"
+
+
+def import_times(n: int, env: dict) -> dict:
+    vals = []
+    for _ in range(n):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        vals.append(float(out.stdout.strip().splitlines()[-1]) * 1000)
+    return {"runs": n, "median_ms": round(statistics.median(vals), 1),
+            "min_ms": round(min(vals), 1), "max_ms": round(max(vals), 1)}
+
+
+async def first_requests(api_env: dict, tmp: Path, stub: str, token: str, timeout: float) -> dict:
+    api_port = free_port()
+    api = f"http://127.0.0.1:{api_port}"
+    t0 = time.perf_counter()
+    proc = spawn([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(api_port), "--log-level", "warning"],
+                 api_env, tmp / f"api-{api_port}.log")
+    try:
+        await wait_ready(f"{api}/health", proc, timeout)
+        out = {"ready_ms": round((time.perf_counter() - t0) * 1000, 1)}
+        async with httpx.AsyncClient(timeout=timeout) as hc:
+            for name in ("first_check_ms", "second_check_ms"):
+                url = f"{stub}/site/cold-{uuid.uuid4().hex[:8]}"
+                t1 = time.perf_counter()
+                r = await hc.post(f"{api}/api/check", json={"url": url}, headers={"Authorization": "Bearer " + token})
+                out[name] = round((time.perf_counter() - t1) * 1000, 1)
+                if r.status_code != 200:
+                    out.setdefault("errors", []).append(r.status_code)
+            out["api_stats"] = (await hc.get(f"{api}/stats")).json()
+        return out
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def summarize(rounds) -> dict:
+    out = {k: round(statistics.median(r[k] for r in rounds), 1)
+           for k in ("ready_ms", "first_check_ms", "second_check_ms")}
+    out["errors"] = sum(len(r.get("errors", [])) for r in rounds)
+    return out
+
+
+async def run(args) -> dict:
+    tmp = Path(tempfile.mkdtemp(prefix="gr-coldstart-"))
+    stub_proc = None
+    try:
+        private_pem = make_keys(tmp)
+        token = mint_token(private_pem, str(uuid.uuid4()))
+        stub_port = free_port()
+        stub = f"http://127.0.0.1:{stub_port}"
+        env = dict(os.environ)
+        env.update({"LOADTEST_PUBLIC_KEY": str(tmp / "public.pem"),
+                    "LOADTEST_SITE_LATENCY_MS": "0", "LOADTEST_SITE_JITTER_MS": "0",
+                    "LOADTEST_LLM_LATENCY_MS": "0", "LOADTEST_LLM_JITTER_MS": "0",
+                    "LOADTEST_JWKS_LATENCY_MS": "0"})
+        stub_proc = spawn([sys.executable, "-m", "uvicorn", "scripts.loadtest_stubs:app", "--port", str(stub_port),
+                           "--log-level", "warning"], env, tmp / "stubs.log")
+        await wait_ready(f"{stub}/stats", stub_proc)
+
+        api_env = dict(os.environ)
+        api_env.pop("DATABASE_URL", None)
+        api_env.update({
+            "SUPABASE_URL": f"{stub}/supabase",
+            "OPENAI_BASE_URL": f"{stub}/openai/v1",
+            "OPENAI_API_KEY": "loadtest",
+            "STRIPE_API_BASE": f"{stub}/stripe",
+            "FASTPATH_ENABLED": "false",
+            "NEARDUP_PATH": str(tmp / "neardup.npz"),
+            "ADMISSION_ENABLED": "false",
+        })
+        for kv in args.env:
+            k, _, v = kv.partition("=")
+            api_env[k] = v
+
+        report = {"git_rev": git_rev(), "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                  "config": {k: v for k, v in vars(args).items() if k != "out"},
+                  "import": import_times(args.imports, api_env)}
+        for warm in ("true", "false"):
+            rounds = []
+            for _ in range(args.rounds):
+                rounds.append(await first_requests({**api_env, "WARMUP_ENABLED": warm}, tmp, stub, token, args.timeout))
+            key = "warmup" if warm == "true" else "no_warmup"
+            report[key] = summarize(rounds)
+            report[key]["api_stats"] = rounds[-1]["api_stats"]
+            print(json.dumps({key: summarize(rounds)}), file=sys.stderr)
+        return report
+    finally:
+        if stub_proc is not None:
+            stub_proc.terminate()
+            try:
+                stub_proc.wait(10)
+            except subprocess.TimeoutExpired:
+                stub_proc.kill()
+        if args.keep_tmp:
+            print(f"logs kept in {tmp}", file=sys.stderr)
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Import time and first-request latency of the API")
+    ap.add_argument("--imports", type=int, default=5, help="fresh interpreters for the import measurement")
+    ap.add_argument("--rounds", type=int, default=3, help="API starts per warm-up setting")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra API settings")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--keep-tmp", action="store_true")
+    ap.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = ap.parse_args()
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,13 +10,19 @@ TEST_URLS = [
 
 async def run():
     results = []
-    async with httpx.AsyncClient() as hc:
-        for u in TEST_URLS:
-            r = await hc.post(f"{API}/api/check", json={"url": u})
-            results.append((u, r.status_code, r.json()))
+    # one batch request; results stream back as NDJSON as each url finishes
+    async with httpx.AsyncClient(timeout=None) as hc:
+        async with hc.stream("POST", f"{API}/api/check/batch", json={"urls": TEST_URLS}) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                item = json.loads(line)
+                results.append((item["url"], item.get("error") or "ok", item.get("result") or {}))
     # toy metric: show all "danger"
     dangers = [x for x in results if x[2].get("verdict") == "danger"]
-    print(json.dumps({"count": len(results), "dangers": len(dangers), "samples": results[:3]}, indent=2))
+    errors = [x for x in results if x[1] != "ok"]
+    print(json.dumps({"count": len(results), "dangers": len(dangers), "errors": len(errors), "samples": results[:3]}, indent=2))
 
 if __name__ == "__main__":
     asyncio.run(run())
@@ -0,0 +1,349 @@
+# scripts/loadtest.py
+# Hermetic load test: starts local stand-ins for the article sites, OpenAI and
+# Supabase JWKS (scripts/loadtest_stubs.py), an optional throwaway Postgres
+# (initdb/pg_ctl on PATH, or --database-url), then the API itself, and drives
+# POST /api/check open-loop at each target RPS. Reports p50/p95/p99 for the
+# whole request and per pipeline stage (from the Server-Timing header when the
+# API sends one), plus the highest RPS that met the SLO. Output is JSON.
+#   python -m scripts.loadtest --rps 5,10,20,40 --duration 20 --out run.json
+#   python -m scripts.loadtest --rps 10 --llm-latency-ms 1500 --no-db
+import argparse, asyncio, json, math, os, random, shutil, socket, subprocess, sys, tempfile, time, uuid
+from pathlib import Path
+import httpx
+from .loadtest_stubs import mint_token
+
+ROOT = Path(__file__).resolve().parent.parent
+SCHEMA = ROOT / "sql" / "schema.sql"
+# stand-ins for the Supabase objects schema.sql references
+AUTH_PRELUDE = "create schema if not exists auth; create table if not exists auth.users (id uuid primary key);"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_vals, q: float):
+    if not sorted_vals:
+        return None
+    # nearest rank
+    k = min(len(sorted_vals) - 1, max(0, math.ceil(q / 100 * len(sorted_vals)) - 1))
+    return round(sorted_vals[k], 2)
+
+
+def summarize_ms(vals) -> dict:
+    vals = sorted(vals)
+    return {"n": len(vals), "p50": percentile(vals, 50), "p95": percentile(vals, 95), "p99": percentile(vals, 99),
+            "max": round(vals[-1], 2) if vals else None}
+
+
+def parse_server_timing(header: str) -> dict:
+    out = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if name and k == "dur":
+                try:
+                    out[name] = float(v)
+                except ValueError:
+                    pass
+    return out
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def make_keys(tmp: Path):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    public_pem = key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    (tmp / "public.pem").write_bytes(public_pem)
+    return private_pem
+
+
+class Postgres:
+    """Throwaway cluster in a temp dir; trust auth, unix socket + loopback only."""
+
+    def __init__(self, tmp: Path):
+        self.dir, self.port = tmp / "pg", free_port()
+        self.url = f"postgresql://postgres@127.0.0.1:{self.port}/postgres"
+
+    @staticmethod
+    def available() -> bool:
+        return bool(shutil.which("initdb") and shutil.which("pg_ctl"))
+
+    def start(self):
+        subprocess.run(["initdb", "-D", str(self.dir), "-A", "trust", "-U", "postgres", "--no-sync"],
+                       check=True, stdout=subprocess.DEVNULL)
+        opts = f"-p {self.port} -k {self.dir} -c listen_addresses=127.0.0.1 -c fsync=off -c max_connections=200"
+        subprocess.run(["pg_ctl", "-D", str(self.dir), "-o", opts, "-l", str(self.dir / "log"), "-w", "start"],
+                       check=True, stdout=subprocess.DEVNULL)
+
+    def stop(self):
+        subprocess.run(["pg_ctl", "-D", str(self.dir), "-m", "immediate", "stop"], stdout=subprocess.DEVNULL)
+
+
+def apply_schema(url: str, user_ids):
+    import psycopg
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute(AUTH_PRELUDE)
+        conn.execute(SCHEMA.read_text())
+        with conn.cursor() as cur:
+            cur.executemany("insert into auth.users (id) values (%s) on conflict do nothing", [(u,) for u in user_ids])
+            cur.executemany("insert into users (id, email) values (%s, %s) on conflict do nothing",
+                            [(u, f"{u[:8]}@loadtest.invalid") for u in user_ids])
+
+
+def spawn(args, env, log_path: Path) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(args, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as hc:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{url} exited with {proc.returncode}")
+            try:
+                if (await hc.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+class Driver:
+    def __init__(self, api: str, site: str, tokens, args):
+        self.api, self.site, self.tokens, self.args = api, site, tokens, args
+        self.seq = 0
+        self.rng = random.Random(args.seed)
+
+    def next_url(self) -> str:
+        self.seq += 1
+        a = self.args
+        if a.repeat_ratio and self.rng.random() < a.repeat_ratio:
+            # URL seen before: exercises the verdict cache / single-flight
+            return f"{self.site}/site/hot-{self.rng.randrange(a.hot_urls)}"
+        if a.dup_ratio and self.rng.random() < a.dup_ratio:
+            # new URL, same article as an earlier one: exercises the content caches
+            return f"{self.site}/site/dup-{self.rng.randrange(a.hot_urls)}?copy={self.seq}"
+        return f"{self.site}/site/page-{self.seq}-{uuid.uuid4().hex[:8]}"
+
+    async def one(self, hc: httpx.AsyncClient, results: list):
+        headers = {"Authorization": "Bearer " + self.rng.choice(self.tokens)} if self.tokens else {}
+        t0 = time.perf_counter()
+        try:
+            r = await hc.post(f"{self.api}/api/check", json={"url": self.next_url()}, headers=headers)
+            status, timing = r.status_code, parse_server_timing(r.headers.get("server-timing"))
+        except httpx.HTTPError as e:
+            status, timing = type(e).__name__, {}
+        results.append(((time.perf_counter() - t0) * 1000, status, timing))
+
+    async def step(self, rps: float, duration: float) -> dict:
+        a = self.args
+        results, tasks, shed = [], set(), 0
+        limits = httpx.Limits(max_connections=a.max_inflight, max_keepalive_connections=a.max_inflight)
+        async with httpx.AsyncClient(timeout=a.timeout, limits=limits) as hc:
+            loop = asyncio.get_running_loop()
+            t0 = loop.time()
+            n = int(rps * duration)
+            # open loop: send on schedule regardless of how slow responses are
+            for i in range(n):
+                delay = t0 + i / rps - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if len(tasks) >= a.max_inflight:
+                    shed += 1
+                    continue
+                task = asyncio.create_task(self.one(hc, results))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+            wall = loop.time() - t0
+        ok = [r for r in results if r[1] == 200]
+        errors = {}
+        for _, status, _ in results:
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+        stages = {}
+        for _, _, timing in ok:
+            for name, dur in timing.items():
+                stages.setdefault(name, []).append(dur)
+        failed = len(results) - len(ok) + shed
+        out = {
+            "target_rps": rps,
+            "sent": len(results),
+            "shed_client_side": shed,
+            "ok": len(ok),
+            "errors": errors,
+            "error_rate": round(failed / n, 4) if n else 0.0,
+            "achieved_rps": round(len(ok) / wall, 2) if wall else 0.0,
+            "latency_ms": summarize_ms([r[0] for r in ok]),
+            "stages_ms": {k: summarize_ms(v) for k, v in sorted(stages.items())},
+        }
+        out["sustainable"] = (
+            out["error_rate"] <= a.max_error_rate
+            and out["achieved_rps"] >= 0.9 * rps
+            and (out["latency_ms"]["p95"] or 0) <= a.slo_p95_ms
+        )
+        return out
+
+
+async def run(args) -> dict:
+    tmp = Path(tempfile.mkdtemp(prefix="gr-loadtest-"))
+    procs, pg = [], None
+    try:
+        private_pem = make_keys(tmp)
+        user_ids = [str(uuid.uuid4()) for _ in range(args.users)]
+        stub_port, api_port = free_port(), free_port()
+        stub = f"http://127.0.0.1:{stub_port}"
+        api = f"http://127.0.0.1:{api_port}"
+
+        env = dict(os.environ)
+        env.update({
+            "LOADTEST_PUBLIC_KEY": str(tmp / "public.pem"),
+            "LOADTEST_SITE_LATENCY_MS": str(args.site_latency_ms),
+            "LOADTEST_SITE_JITTER_MS": str(args.site_jitter_ms),
+            "LOADTEST_SITE_PARAS": str(args.site_paras),
+            "LOADTEST_SITE_ADS": str(args.site_ads),
+            "LOADTEST_LLM_LATENCY_MS": str(args.llm_latency_ms),
+            "LOADTEST_LLM_JITTER_MS": str(args.llm_jitter_ms),
+            "LOADTEST_LLM_COMPLETION_TOKENS": str(args.llm_completion_tokens),
+            "LOADTEST_JWKS_LATENCY_MS": str(args.jwks_latency_ms),
+        })
+        if args.pages_dir:
+            env["LOADTEST_PAGES_DIR"] = str(Path(args.pages_dir).resolve())
+        procs.append(spawn([sys.executable, "-m", "uvicorn", "scripts.loadtest_stubs:app", "--port", str(stub_port),
+                            "--log-level", "warning"], env, tmp / "stubs.log"))
+
+        database_url = args.database_url
+        if database_url is None and not args.no_db:
+            if Postgres.available():
+                pg = Postgres(tmp)
+                pg.start()
+                database_url = pg.url
+            else:
+                print("initdb/pg_ctl not on PATH; running without a database", file=sys.stderr)
+        if database_url:
+            apply_schema(database_url, user_ids)
+
+        api_env = dict(os.environ)
+        api_env.pop("DATABASE_URL", None)
+        api_env.update({
+            "SUPABASE_URL": f"{stub}/supabase",
+            "OPENAI_BASE_URL": f"{stub}/openai/v1",
+            "OPENAI_API_KEY": "loadtest",
+            # keep local model/index files out of the measurement
+            "FASTPATH_ENABLED": "false",
+            "NEARDUP_PATH": str(tmp / "neardup.npz"),
+            # measure capacity, not our own rate limits (--env ADMISSION_ENABLED=true to test shedding)
+            "ADMISSION_ENABLED": "false",
+            "STRIPE_API_BASE": f"{stub}/stripe",
+        })
+        if database_url:
+            api_env["DATABASE_URL"] = database_url
+        for kv in args.env:
+            k, _, v = kv.partition("=")
+            api_env[k] = v
+        procs.append(spawn([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(api_port),
+                            "--workers", str(args.workers), "--log-level", "warning"], api_env, tmp / "api.log"))
+
+        await wait_ready(f"{stub}/stats", procs[0])
+        await wait_ready(f"{api}/health", procs[1])
+
+        tokens = [] if args.anonymous else [mint_token(private_pem, u) for u in user_ids]
+        driver = Driver(api, stub, tokens, args)
+        steps = []
+        for rps in args.rps:
+            if args.warmup:
+                await driver.step(rps, args.warmup)
+            result = await driver.step(rps, args.duration)
+            steps.append(result)
+            print(json.dumps({k: result[k] for k in ("target_rps", "achieved_rps", "error_rate", "latency_ms")}),
+                  file=sys.stderr)
+            if not result["sustainable"] and not args.keep_going:
+                break
+
+        async with httpx.AsyncClient() as hc:
+            api_stats = (await hc.get(f"{api}/stats")).json()
+            stub_stats = (await hc.get(f"{stub}/stats")).json()
+        passing = [s["target_rps"] for s in steps if s["sustainable"]]
+        return {
+            "git_rev": git_rev(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "config": {k: v for k, v in vars(args).items() if k != "out"},
+            "database": "none" if not database_url else ("throwaway" if pg else "external"),
+            "max_sustainable_rps": max(passing) if passing else None,
+            "steps": steps,
+            "api_stats": api_stats,
+            "stub_stats": stub_stats,
+        }
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+            try:
+                p.wait(10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        if pg is not None:
+            pg.stop()
+        if args.keep_tmp:
+            print(f"logs kept in {tmp}", file=sys.stderr)
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Hermetic load test for POST /api/check")
+    ap.add_argument("--rps", type=lambda s: [float(x) for x in s.split(",")], default=[5.0, 10.0, 20.0, 40.0],
+                    help="comma-separated target rates, run in order (a ramp)")
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds per step")
+    ap.add_argument("--warmup", type=float, default=0.0, help="unmeasured seconds before each step")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--users", type=int, default=50, help="distinct minted users")
+    ap.add_argument("--anonymous", action="store_true", help="send no Authorization header")
+    ap.add_argument("--repeat-ratio", type=float, default=0.0, help="share of requests for already-seen URLs")
+    ap.add_argument("--dup-ratio", type=float, default=0.0, help="share of new URLs serving an already-seen article")
+    ap.add_argument("--hot-urls", type=int, default=50)
+    ap.add_argument("--site-latency-ms", type=float, default=80)
+    ap.add_argument("--site-jitter-ms", type=float, default=40)
+    ap.add_argument("--site-paras", type=int, default=40, help="synthetic page size")
+    ap.add_argument("--site-ads", type=int, default=20)
+    ap.add_argument("--pages-dir", help="serve recorded *.html pages instead of synthetic ones")
+    ap.add_argument("--llm-latency-ms", type=float, default=700)
+    ap.add_argument("--llm-jitter-ms", type=float, default=300)
+    ap.add_argument("--llm-completion-tokens", type=int, default=120)
+    ap.add_argument("--jwks-latency-ms", type=float, default=30)
+    ap.add_argument("--database-url", help="use this (disposable!) database instead of a throwaway cluster")
+    ap.add_argument("--no-db", action="store_true")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra API settings")
+    ap.add_argument("--slo-p95-ms", type=float, default=3000)
+    ap.add_argument("--max-error-rate", type=float, default=0.01)
+    ap.add_argument("--max-inflight", type=int, default=500)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--keep-going", action="store_true", help="run every step even after one fails the SLO")
+    ap.add_argument("--keep-tmp", action="store_true")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = ap.parse_args()
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
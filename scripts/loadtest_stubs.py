@@ -0,0 +1,196 @@
+# scripts/loadtest_stubs.py
+# Local stand-ins for everything the API talks to, for scripts/loadtest.py:
+#   GET  /site/{name}                          synthetic article (or a recorded page)
+#   POST /openai/v1/chat/completions           fake OpenAI, deterministic labels
+#   GET  /supabase/auth/v1/.well-known/jwks.json   JWKS for the harness's signing key
+#   POST /stripe/v1/{customers,checkout/sessions,billing_portal/sessions}
+#                                              fake Stripe (point STRIPE_API_BASE at /stripe)
+# stripe_event() / sign_webhook() build webhook deliveries the API will accept
+# for a given STRIPE_WEBHOOK_SECRET.
+# Configured through LOADTEST_* env vars; run by the harness as
+#   uvicorn scripts.loadtest_stubs:app --port N
+import asyncio, base64, hashlib, hmac, json, os, random, re, time, uuid, zlib
+from urllib.parse import parse_qsl
+from pathlib import Path
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse
+
+KID = "loadtest"
+_WORDS = (
+    "county clinic officials said residents weekend hours flu shot book online phone council "
+    "budget school road repair weather storm warning hospital study doctors patients medicine "
+    "library park festival police report market prices local business award community garden "
+    "free gift card claim now limited offer winner prize click verify account urgent miracle cure"
+).split()
+
+
+def _env_ms(name: str, default: float) -> float:
+    return float(os.environ.get(name, default)) / 1000
+
+
+SITE_LATENCY = _env_ms("LOADTEST_SITE_LATENCY_MS", 80)
+SITE_JITTER = _env_ms("LOADTEST_SITE_JITTER_MS", 40)
+SITE_PARAS = int(os.environ.get("LOADTEST_SITE_PARAS", 40))
+SITE_ADS = int(os.environ.get("LOADTEST_SITE_ADS", 20))
+LLM_LATENCY = _env_ms("LOADTEST_LLM_LATENCY_MS", 700)
+LLM_JITTER = _env_ms("LOADTEST_LLM_JITTER_MS", 300)
+LLM_COMPLETION_TOKENS = int(os.environ.get("LOADTEST_LLM_COMPLETION_TOKENS", 120))
+JWKS_LATENCY = _env_ms("LOADTEST_JWKS_LATENCY_MS", 30)
+STRIPE_LATENCY = _env_ms("LOADTEST_STRIPE_LATENCY_MS", 300)
+
+_PAGES = sorted(Path(os.environ["LOADTEST_PAGES_DIR"]).glob("*.htm*")) if os.environ.get("LOADTEST_PAGES_DIR") else []
+_PAGE_CACHE = {}
+_STATS = {"site": 0, "llm": 0, "jwks": 0, "stripe": 0}
+
+app = FastAPI(title="loadtest stubs")
+
+
+def _b64(n: int) -> str:
+    raw = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def jwks_from_pem(public_pem: bytes) -> dict:
+    from cryptography.hazmat.primitives.serialization import load_pem_public_key
+    nums = load_pem_public_key(public_pem).public_numbers()
+    return {"keys": [{"kty": "RSA", "kid": KID, "use": "sig", "alg": "RS256", "n": _b64(nums.n), "e": _b64(nums.e)}]}
+
+
+def mint_token(private_pem: bytes, sub: str, *, aud: str = "authenticated", ttl: int = 3600) -> str:
+    import jwt
+    now = int(time.time())
+    claims = {"sub": sub, "aud": aud, "role": "authenticated", "email": f"{sub[:8]}@loadtest.invalid", "iat": now, "exp": now + ttl}
+    return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": KID})
+
+
+def synthetic_article(name: str, paras: int, ads: int) -> str:
+    # seeded by name: the same URL always serves the same page, different URLs differ
+    rng = random.Random(zlib.crc32(name.encode()))
+    title = " ".join(rng.choice(_WORDS) for _ in range(8)).capitalize()
+    body = "".join(
+        "<p>" + " ".join(rng.choice(_WORDS) for _ in range(rng.randint(25, 60))).capitalize() + ".</p>"
+        for _ in range(paras)
+    )
+    junk = "".join(
+        f'<div class="ad popup-{i}"><iframe src="/ads/{i}"></iframe><a class="subscribe" href="#">Subscribe</a>'
+        f"<script>var x{i}={i};</script></div>"
+        for i in range(ads)
+    )
+    return (
+        f"<html><head><title>{title} | Stub News</title></head>"
+        f"<body><nav>{junk}</nav><article><h1>{title}</h1>{body}</article><aside>{junk}</aside></body></html>"
+    )
+
+
+async def _sleep(base: float, jitter: float):
+    if base or jitter:
+        await asyncio.sleep(max(0.0, base + random.uniform(-jitter, jitter)))
+
+
+@app.get("/site/{name}")
+async def site(name: str):
+    _STATS["site"] += 1
+    await _sleep(SITE_LATENCY, SITE_JITTER)
+    if _PAGES:
+        path = _PAGES[zlib.crc32(name.encode()) % len(_PAGES)]
+        if path not in _PAGE_CACHE:
+            _PAGE_CACHE[path] = path.read_text(errors="replace")
+        return HTMLResponse(_PAGE_CACHE[path])
+    return HTMLResponse(synthetic_article(name, SITE_PARAS, SITE_ADS))
+
+
+_BULLETS = ["Stub summary bullet one.", "Stub summary bullet two.", "Stub summary bullet three."]
+
+
+def _labels(seed: str) -> dict:
+    h = hashlib.sha256(seed.encode()).digest()
+    return {
+        "headline_style": ("neutral", "clickbait")[h[0] % 2],
+        "tone": ("neutral", "sensational")[h[1] % 2],
+        "scam_signal": ("none", "weak", "strong")[h[2] % 3],
+        "health_claim": ("not_present", "present")[h[3] % 2],
+        "summary_bullets": _BULLETS,
+    }
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    _STATS["llm"] += 1
+    body = await request.json()
+    prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+    await _sleep(LLM_LATENCY, LLM_JITTER)
+    h = hashlib.sha256(prompt.encode()).digest()
+    page_ids = re.findall(r"^PAGE id=(\S+)", prompt, re.M)
+    if page_ids:
+        # micro-batched classify request
+        content = {"results": [{"id": i, **_labels(prompt + i)} for i in page_ids]}
+        completion_tokens = LLM_COMPLETION_TOKENS * len(page_ids)
+    else:
+        content = _labels(prompt) if "headline_style" in prompt else {"summary_bullets": _BULLETS}
+        completion_tokens = LLM_COMPLETION_TOKENS
+    prompt_tokens = len(prompt) // 4
+    return JSONResponse({
+        "id": "chatcmpl-stub-" + h[:6].hex(),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(content)}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    })
+
+
+@app.get("/supabase/auth/v1/.well-known/jwks.json")
+async def jwks():
+    _STATS["jwks"] += 1
+    await _sleep(JWKS_LATENCY, 0)
+    return JSONResponse(jwks_from_pem(Path(os.environ["LOADTEST_PUBLIC_KEY"]).read_bytes()))
+
+
+def stripe_event(event_type: str, obj: dict, created: int = None) -> dict:
+    return {"id": "evt_" + uuid.uuid4().hex[:24], "object": "event", "type": event_type,
+            "created": created or int(time.time()), "data": {"object": obj}}
+
+
+def sign_webhook(payload: bytes, secret: str, timestamp: int = None) -> str:
+    """Stripe-Signature header value for payload under secret."""
+    t = timestamp or int(time.time())
+    sig = hmac.new(secret.encode(), f"{t}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={t},v1={sig}"
+
+
+def _stripe_object(prefix: str, obj: str, **fields) -> JSONResponse:
+    return JSONResponse({"id": f"{prefix}_{uuid.uuid4().hex[:24]}", "object": obj, "livemode": False,
+                         "created": int(time.time()), **fields})
+
+
+async def _stripe_form(request: Request) -> dict:
+    _STATS["stripe"] += 1
+    form = dict(parse_qsl((await request.body()).decode()))
+    await _sleep(STRIPE_LATENCY, 0)
+    return form
+
+
+@app.post("/stripe/v1/customers")
+async def stripe_customers(request: Request):
+    form = await _stripe_form(request)
+    return _stripe_object("cus", "customer", email=form.get("email"))
+
+
+@app.post("/stripe/v1/checkout/sessions")
+async def stripe_checkout_sessions(request: Request):
+    form = await _stripe_form(request)
+    return _stripe_object("cs", "checkout.session", customer=form.get("customer"), mode=form.get("mode"),
+                          url="https://checkout.stripe.invalid/pay")
+
+
+@app.post("/stripe/v1/billing_portal/sessions")
+async def stripe_portal_sessions(request: Request):
+    form = await _stripe_form(request)
+    return _stripe_object("bps", "billing_portal.session", customer=form.get("customer"),
+                          url="https://billing.stripe.invalid/session")
+
+
+@app.get("/stats")
+async def stats():
+    return _STATS
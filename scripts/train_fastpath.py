@@ -0,0 +1,71 @@
+# scripts/train_fastpath.py
+# Trains the local fast-path classifier from LLM-labelled url_checks rows and
+# reports, on a held-out slice, how many pages it would decide on its own and
+# how often it agrees with the LLM when it does.
+#   python -m scripts.train_fastpath [--limit 200000] [--threshold 0.9] [--out models/fastpath.npz]
+import argparse, asyncio, json, sys, time
+from pathlib import Path
+import numpy as np
+from app import fastpath
+from app.db import connection
+
+QUERY = """
+select raw_meta->>'domain', raw_meta->>'title', coalesce(raw_meta->>'excerpt', ''),
+       coalesce((raw_meta->>'noise')::int, 0), (raw_meta->'reputation'->>'score')::float8,
+       raw_meta->'labels'
+from url_checks
+where not cached
+  and raw_meta ? 'labels'
+  and coalesce(raw_meta->>'labels_source', 'llm') = 'llm'  -- never learn from our own guesses
+order by created_at desc
+limit %s
+"""
+
+async def load(limit: int):
+    async with connection() as conn:
+        cur = await conn.execute(QUERY, (limit,))
+        rows = await cur.fetchall()
+    return [
+        {"domain": d or "", "title": t or "", "body": b, "noise": n, "rep_score": r, "labels": l}
+        for d, t, b, n, r, l in rows
+    ]
+
+def evaluate(model, samples, threshold):
+    decided = agree = 0
+    for s in samples:
+        probs = model.probs(fastpath.features(s["domain"], s["title"], s["body"], s["noise"], s["rep_score"], model.dim))
+        picks = [(classes[int(p.argmax())], p.max()) for classes, p in zip(fastpath.HEADS.values(), probs)]
+        if all(conf >= threshold for _, conf in picks):
+            decided += 1
+            agree += all(label == (s["labels"] or {}).get(name) for (label, _), name in zip(picks, fastpath.HEADS))
+    return {
+        "holdout": len(samples),
+        "llm_avoided_share": round(decided / len(samples), 4) if samples else 0.0,
+        "agreement_when_decided": round(agree / decided, 4) if decided else None,
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--limit", type=int, default=200_000)
+    ap.add_argument("--threshold", type=float, default=0.9)
+    ap.add_argument("--epochs", type=int, default=8)
+    ap.add_argument("--out", default=str(fastpath.DEFAULT_MODEL))
+    args = ap.parse_args()
+
+    samples = [s for s in asyncio.run(load(args.limit)) if fastpath.has_labels(s)]
+    if not samples:
+        sys.exit("no LLM-labelled url_checks rows to train on yet; run some checks first")
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(samples))
+    cut = int(len(samples) * 0.9)
+    train = [samples[i] for i in order[:cut]]
+    holdout = [samples[i] for i in order[cut:]]
+
+    t0 = time.time()
+    model = fastpath.train(train, epochs=args.epochs)
+    report = {"train": len(train), "train_s": round(time.time() - t0, 1), **evaluate(model, holdout, args.threshold)}
+    model.save(Path(args.out))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
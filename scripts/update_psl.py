@@ -0,0 +1,33 @@
+# scripts/update_psl.py
+# Refreshes the vendored Public Suffix List (seeds/public_suffix_list.dat) that
+# app/psl.py reads. Commit the result; the VERSION line shows up on /stats.
+#   python -m scripts.update_psl [--url URL] [--out PATH]
+import argparse, sys
+from pathlib import Path
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+PSL_URL = "https://publicsuffix.org/list/public_suffix_list.dat"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default=PSL_URL)
+    ap.add_argument("--out", default=str(ROOT / "seeds" / "public_suffix_list.dat"))
+    args = ap.parse_args()
+
+    r = httpx.get(args.url, timeout=30, follow_redirects=True)
+    r.raise_for_status()
+    text = r.text
+    # refuse anything that isn't a whole list: the API would silently lose suffixes
+    if "// ===BEGIN PRIVATE DOMAINS===" not in text or "\ncom\n" not in text:
+        sys.exit(f"{args.url} doesn't look like a complete public suffix list")
+    out = Path(args.out)
+    old = out.read_text(encoding="utf-8") if out.exists() else ""
+    out.write_text(text, encoding="utf-8")
+    version = next((line.split(":", 1)[1].strip() for line in text.splitlines() if line.startswith("// VERSION:")), "?")
+    print(f"{out}: version {version}{' (unchanged)' if old == text else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -76,3 +76,167 @@ create unique index if not exists caregivers_unique_user
 create unique index if not exists caregivers_unique_email
   on caregivers_elders (caregiver_id, elder_email)
   where elder_user_id is null and elder_email is not null;
+
+-- Verdict cache: url_hash/cached live on url_checks so every check row doubles
+-- as a cache entry (keyed by sha256 of the normalized URL).
+alter table url_checks add column if not exists url_hash text;
+alter table url_checks add column if not exists cached boolean default false;
+alter table url_checks add column if not exists raw_meta jsonb;
+create index if not exists url_checks_cache_lookup
+  on url_checks (url_hash, created_at desc) where not cached;
+
+-- Explicit verdict-cache invalidation (POST /api/cache/invalidate): checks of a
+-- url written before its invalidated_at are no longer served from cache, and
+-- every API worker polls this table to drop the url from its memory tier.
+create table if not exists url_invalidations (
+  url_hash text primary key,
+  invalidated_at timestamptz not null default now()
+);
+create index if not exists url_invalidations_recent on url_invalidations (invalidated_at);
+
+-- LLM labels keyed on sha256(prompt version, model, normalized title/body),
+-- shared by every URL that serves the same content.
+create table if not exists llm_label_cache (
+  key text primary key,
+  model text not null,
+  prompt_version text not null,
+  labels jsonb not null,
+  prompt_tokens int,
+  completion_tokens int,
+  created_at timestamptz default now()
+);
+
+-- Revalidation state per url: origin validators, a hash of the extracted text
+-- and the meta (labels included) of the last full check.
+create table if not exists url_validators (
+  url_hash text primary key,
+  etag text,
+  last_modified text,
+  content_hash text not null,
+  meta jsonb not null,
+  version text not null,  -- model|prompt version the labels came from
+  updated_at timestamptz default now()
+);
+
+-- Background refresh / precompute jobs (python -m app.worker). Workers claim
+-- rows with FOR UPDATE SKIP LOCKED; higher priority first.
+create table if not exists check_jobs (
+  id bigserial primary key,
+  url text not null,
+  url_hash text not null,
+  priority int not null default 0,
+  source text not null,                -- 'popular' | 'operator'
+  status text not null default 'queued' check (status in ('queued','running','done','failed')),
+  attempts int not null default 0,
+  max_attempts int not null default 4,
+  run_after timestamptz not null default now(),
+  locked_by text,
+  locked_at timestamptz,
+  verdict text,
+  last_error text,
+  created_at timestamptz default now(),
+  finished_at timestamptz
+);
+-- one live job per url
+create unique index if not exists check_jobs_live_url
+  on check_jobs (url_hash) where status in ('queued','running');
+create index if not exists check_jobs_next
+  on check_jobs (priority desc, run_after) where status = 'queued';
+
+-- Check history: keyset pages on (created_at, id) per user (app/history.py).
+create index if not exists url_checks_user_history
+  on url_checks (user_id, created_at desc, id desc);
+
+-- Caregiver dashboard rollups: checks per user per UTC day, by verdict and by
+-- reason. Maintained by a statement-level trigger, so a COPY batch from the
+-- writer costs two grouped upserts rather than one per row.
+create table if not exists check_rollups_daily (
+  user_id uuid not null,
+  day date not null,
+  verdict text not null,
+  checks int not null default 0,
+  primary key (user_id, day, verdict)
+);
+
+create table if not exists check_reason_rollups_daily (
+  user_id uuid not null,
+  day date not null,
+  reason text not null,
+  checks int not null default 0,
+  primary key (user_id, day, reason)
+);
+
+create or replace function rollup_url_checks() returns trigger language plpgsql as $$
+begin
+  -- key order keeps concurrent batches from deadlocking on the same rows
+  insert into check_rollups_daily as r (user_id, day, verdict, checks)
+  select user_id, (created_at at time zone 'utc')::date, coalesce(verdict, 'unknown'), count(*)
+  from new_rows where user_id is not null
+  group by 1, 2, 3 order by 1, 2, 3
+  on conflict (user_id, day, verdict) do update set checks = r.checks + excluded.checks;
+
+  insert into check_reason_rollups_daily as r (user_id, day, reason, checks)
+  select n.user_id, (n.created_at at time zone 'utc')::date, x.reason, count(*)
+  from new_rows n
+  cross join lateral jsonb_array_elements_text(
+    case when jsonb_typeof(n.reasons) = 'array' then n.reasons else '[]'::jsonb end
+  ) as x(reason)
+  where n.user_id is not null
+  group by 1, 2, 3 order by 1, 2, 3
+  on conflict (user_id, day, reason) do update set checks = r.checks + excluded.checks;
+  return null;
+end $$;
+
+drop trigger if exists url_checks_rollup on url_checks;
+create trigger url_checks_rollup after insert on url_checks
+  referencing new table as new_rows
+  for each statement execute function rollup_url_checks();
+
+-- one-off backfill of history written before the trigger existed
+insert into check_rollups_daily (user_id, day, verdict, checks)
+select user_id, (created_at at time zone 'utc')::date, coalesce(verdict, 'unknown'), count(*)
+from url_checks
+where user_id is not null and not exists (select 1 from check_rollups_daily)
+group by 1, 2, 3;
+
+insert into check_reason_rollups_daily (user_id, day, reason, checks)
+select c.user_id, (c.created_at at time zone 'utc')::date, x.reason, count(*)
+from url_checks c
+cross join lateral jsonb_array_elements_text(
+  case when jsonb_typeof(c.reasons) = 'array' then c.reasons else '[]'::jsonb end
+) as x(reason)
+where c.user_id is not null and not exists (select 1 from check_reason_rollups_daily)
+group by 1, 2, 3;
+
+-- Stripe webhook inbox: the endpoint stores each event once (by Stripe event
+-- id) and acks; a consumer in every API process applies pending rows, claimed
+-- with SKIP LOCKED. updated_at on subscriptions drives the in-memory
+-- entitlement refresh (app/entitlements.py); stripe_event_at keeps a late,
+-- older event from overwriting a newer status.
+create table if not exists stripe_events (
+  id text primary key,                 -- evt_...
+  type text not null,
+  created timestamptz,                 -- event.created at Stripe
+  payload jsonb not null,
+  status text not null default 'pending' check (status in ('pending','processed','failed')),
+  attempts int not null default 0,
+  run_after timestamptz not null default now(),
+  user_id uuid,
+  last_error text,
+  received_at timestamptz default now(),
+  processed_at timestamptz
+);
+create index if not exists stripe_events_pending
+  on stripe_events (created, received_at) where status = 'pending';
+
+alter table subscriptions add column if not exists updated_at timestamptz default now();
+alter table subscriptions add column if not exists stripe_event_at timestamptz;
+create index if not exists subscriptions_updated_at on subscriptions (updated_at);
+
+-- Shared token buckets for admission control (ADMISSION_BACKEND=postgres).
+-- Unlogged: losing them in a crash just refills everyone's bucket.
+create unlogged table if not exists rate_buckets (
+  key text primary key,              -- user:<id> | ip:<addr>
+  tokens float8 not null,
+  updated_at timestamptz not null
+);
@@ -3,10 +3,35 @@ import { useSearchParams } from 'react-router-dom';
 
 const API = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
+// Reads a text/event-stream body and calls onEvent(name, data) per event.
+async function readEvents(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let end;
+    while ((end = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      let event = 'message';
+      const data = [];
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+      }
+      if (data.length) onEvent(event, JSON.parse(data.join('\n')));
+    }
+  }
+}
+
 export default function ShareCheck() {
   const [searchParams] = useSearchParams();
   const [url, setUrl] = useState('');
   const [result, setResult] = useState(null);
+  const [early, setEarly] = useState(null);
   const [loading, setLoading] = useState(false);
 
   // Auto-extract URL from query params (iOS/Android share)
@@ -34,16 +59,31 @@ export default function ShareCheck() {
     if (!urlToCheck) return;
     
     setLoading(true);
+    setEarly(null);
     try {
-      const response = await fetch(`${API}/api/check`, {
+      // streamed: site and a first impression arrive long before the full analysis
+      const response = await fetch(`${API}/api/check/stream`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ url: urlToCheck })
       });
       
       if (response.ok) {
-        const data = await response.json();
-        setResult(data);
+        let finished = false;
+        await readEvents(response, (event, data) => {
+          if (event === 'resolved' || event === 'provisional') {
+            setEarly(prev => ({ ...prev, ...data }));
+          } else if (event === 'final') {
+            finished = true;
+            setResult(data);
+          } else if (event === 'error') {
+            finished = true;
+            setResult({ error: 'Could not check this link' });
+          }
+        });
+        if (!finished) {
+          setResult({ error: 'Network error - please check your connection' });
+        }
       } else {
         const error = await response.json();
         setResult({ error: error.detail || 'Could not check this link' });
@@ -106,7 +146,7 @@ export default function ShareCheck() {
         )}
 
         {/* Loading State */}
-        {loading && (
+        {loading && !early && (
           <div className="text-center py-12">
             <div className="animate-spin inline-block w-12 h-12 border-4 border-blue-200 border-t-blue-600 rounded-full mb-4"></div>
             <p className="text-lg text-gray-600">Analyzing link...</p>
@@ -114,6 +154,35 @@ export default function ShareCheck() {
           </div>
         )}
 
+        {/* First impression while the full analysis runs */}
+        {loading && early && (
+          <div className="space-y-4">
+            <div className={`p-6 rounded-xl border-2 ${verdictStyles[early.verdict] || 'bg-white border-gray-200'}`}>
+              {early.domain && (
+                <p className="text-sm font-medium opacity-80 mb-1">{early.domain}</p>
+              )}
+              {early.title && (
+                <p className="text-lg font-semibold mb-3">{early.title}</p>
+              )}
+              {early.verdict && (
+                <div className="flex items-center gap-3">
+                  <span className="text-2xl">{verdictMessages[early.verdict].icon}</span>
+                  <div>
+                    <p className="font-bold">First look: {verdictMessages[early.verdict].title}</p>
+                    {early.reasons && early.reasons.length > 0 && (
+                      <p className="text-sm opacity-90">{early.reasons.map(formatReason).join(', ')}</p>
+                    )}
+                  </div>
+                </div>
+              )}
+            </div>
+            <div className="flex items-center justify-center gap-3 py-4">
+              <div className="animate-spin inline-block w-6 h-6 border-4 border-blue-200 border-t-blue-600 rounded-full"></div>
+              <p className="text-gray-600">Reading the article for you...</p>
+            </div>
+          </div>
+        )}
+
         {/* Results */}
         {result && !loading && (
           <div className="space-y-6">
@@ -0,0 +1,11 @@
+# tests/conftest.py
+# Settings are read when app.config is imported: give the app enough to import
+# offline, with no database, extract processes or warm-up.
+import os, sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("SUPABASE_URL", "http://supabase.test")
+os.environ.setdefault("EXTRACT_WORKERS", "0")
+os.environ.setdefault("WARMUP_ENABLED", "false")
+os.environ["DATABASE_URL"] = ""
@@ -0,0 +1,130 @@
+# tests/test_admission.py
+# Token buckets (fake clock), the priority gate and load shedding in app/admission.py.
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app import admission
+from app.config import settings
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", c)
+    return c
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    g = admission._Gate()
+    monkeypatch.setattr(admission, "_GATE", g)
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_INFLIGHT", 1)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE", 100)
+    return g
+
+
+def test_bucket_burst_then_refill(clock):
+    b = admission._Buckets(10)
+    assert [b.take("k", 1.0, 3.0, 1) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert b.take("k", 1.0, 3.0, 1) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert b.take("k", 1.0, 3.0, 1) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert b.take("k", 1.0, 3.0, 1) == 0.0
+
+
+def test_bucket_refill_is_capped_at_burst(clock):
+    b = admission._Buckets(10)
+    b.take("k", 1.0, 3.0, 3)
+    clock.now += 3600
+    assert [b.take("k", 1.0, 3.0, 1) for _ in range(4)][-1] == pytest.approx(1.0)
+
+
+def test_bucket_lru_evicts_oldest_key(clock):
+    b = admission._Buckets(2)
+    b.take("a", 1.0, 1.0, 1)
+    b.take("b", 1.0, 1.0, 1)
+    b.take("c", 1.0, 1.0, 1)
+    assert len(b) == 2
+    # "a" was evicted and comes back full
+    assert b.take("a", 1.0, 1.0, 1) == 0.0
+
+
+def test_gate_serves_waiters_by_priority(gate):
+    async def go():
+        order = []
+        await gate.acquire(admission.PRIORITY["free"], 10)   # holds the only slot
+
+        async def waiter(plan):
+            await gate.acquire(admission.PRIORITY[plan], 10)
+            order.append(plan)
+            gate.release()
+
+        tasks = [asyncio.ensure_future(waiter(p)) for p in ("anonymous", "free", "paid")]
+        await asyncio.sleep(0)
+        assert gate.queued() == 3
+        gate.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(go()) == ["paid", "free", "anonymous"]
+    assert gate.inflight == 0
+
+
+def test_gate_sheds_when_estimated_wait_exceeds_budget(gate):
+    gate.inflight = 1
+    gate.avg_s = 2.0
+    assert gate.estimate(admission.PRIORITY["free"]) == pytest.approx(2.0)
+    gate.check(admission.PRIORITY["free"], budget=3.0)   # fits
+    with pytest.raises(admission.Overloaded) as e:
+        gate.check(admission.PRIORITY["free"], budget=1.0)
+    assert e.value.retry_after == pytest.approx(2.0)
+    assert admission.retry_after_header(e.value.retry_after) == "2"
+
+
+def test_check_turns_shedding_into_503(gate, monkeypatch):
+    monkeypatch.setattr(admission, "_BUCKETS", admission._Buckets(10))
+    monkeypatch.setattr(settings, "ADMISSION_BUDGET_ANON", 1.0)
+    gate.inflight = 1
+    gate.avg_s = 4.5
+
+    class Request:
+        client = type("Client", (), {"host": "10.0.0.1"})()
+        headers = {}
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(admission.check(Request(), None))
+    assert e.value.status_code == 503
+    assert e.value.headers["Retry-After"] == "5"
+
+
+def test_queued_past_budget_times_out(gate):
+    async def go():
+        await gate.acquire(0, 10)
+        with pytest.raises(admission.Overloaded):
+            await gate.acquire(0, 0.05)
+        assert gate.queued() == 0
+        gate.release()
+
+    gate.avg_s = 0.01   # estimate fits the budget, so it queues and then times out
+    asyncio.run(go())
+    assert gate.inflight == 0
+
+
+def test_pipeline_slot_updates_the_hold_estimate(gate):
+    async def go():
+        async with admission.pipeline_slot():
+            assert gate.inflight == 1
+        assert gate.inflight == 0
+
+    asyncio.run(go())
+    assert gate.avg_s is not None and gate.avg_s < 0.5
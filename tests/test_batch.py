@@ -0,0 +1,73 @@
+# tests/test_batch.py
+# POST /api/check/batch with run_check stubbed out; the lifespan isn't started.
+import asyncio
+import httpx, orjson, pytest
+from fastapi.testclient import TestClient
+from app import admission, main
+from app.config import settings
+
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = []
+
+    async def fake_run_check(url, refresh=False):
+        calls.append(url)
+        if "slow" in url:
+            await asyncio.sleep(0.05)
+        if "broken" in url:
+            raise httpx.ConnectError("refused")
+        return "ok", [], "fine", {"url": url}
+
+    monkeypatch.setattr(main, "run_check", fake_run_check)
+    monkeypatch.setattr(admission, "_BUCKETS", admission._Buckets(100))
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", True)
+    c = TestClient(main.app)
+    c.calls = calls
+    return c
+
+
+def _batch(client, urls):
+    r = client.post("/api/check/batch", json={"urls": urls})
+    assert r.status_code == 200
+    return [orjson.loads(line) for line in r.text.splitlines()]
+
+
+def test_duplicates_fan_out_and_errors_are_per_item(client):
+    urls = ["https://a.test/slow", "https://b.test/x", "https://b.test/x?utm_source=mail",
+            "https://c.test/broken", "https://b.test/x"]
+    items = _batch(client, urls)
+    # b.test/x (three spellings) is checked once
+    assert sorted(client.calls) == ["https://a.test/slow", "https://b.test/x", "https://c.test/broken"]
+    assert sorted(i["index"] for i in items) == [0, 1, 2, 3, 4]
+    by_index = {i["index"]: i for i in items}
+    assert by_index[2]["url"] == urls[2] and by_index[2]["result"]["verdict"] == "ok"
+    assert by_index[3]["result"] is None and by_index[3]["error"] == "fetch_failed: ConnectError"
+    # completion order: the slow page comes out last
+    assert items[-1]["index"] == 0
+
+
+def test_too_many_urls(client, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_URLS", 3)
+    r = client.post("/api/check/batch", json={"urls": [f"https://a.test/{i}" for i in range(4)]})
+    assert r.status_code == 413
+    assert client.calls == []
+
+
+def test_batch_larger_than_burst_is_admitted(client, monkeypatch):
+    # anonymous burst 5, refilling fast enough for every item to get its token in time
+    monkeypatch.setattr(settings, "RATE_ANON_BURST", 5.0)
+    monkeypatch.setattr(settings, "RATE_ANON_PER_MIN", 6000.0)
+    items = _batch(client, [f"https://a.test/{i}" for i in range(40)])
+    assert len(items) == 40 and all(i["error"] is None for i in items)
+
+
+def test_items_past_the_rate_limit_error_individually(client, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_ANON_BURST", 5.0)
+    monkeypatch.setattr(settings, "RATE_ANON_PER_MIN", 1.0)
+    monkeypatch.setattr(settings, "BATCH_RATE_MAX_WAIT", 0.0)
+    items = _batch(client, [f"https://a.test/{i}" for i in range(12)])
+    errors = [i["error"] for i in items]
+    assert errors.count(None) == 5
+    assert errors.count("rate_limited") == 7
+    assert len(client.calls) == 5
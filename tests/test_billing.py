@@ -0,0 +1,142 @@
+# tests/test_billing.py
+# Stripe webhook inbox and consumer (app/billing.py) against an in-memory stand-in
+# for the stripe_events / subscriptions helpers in app/db.py. Conn.transaction()
+# rolls the subscriptions back on error, like the per-event savepoint.
+import asyncio, contextlib, copy, json, time
+import pytest
+from fastapi.testclient import TestClient
+from app import billing, entitlements, main
+from app.config import settings
+from scripts.loadtest_stubs import sign_webhook, stripe_event
+
+SECRET = "whsec_test"
+
+
+class DB:
+    def __init__(self):
+        self.events = {}   # id -> row
+        self.subs = {}     # user_id -> {"sub_id", "status"}
+        self.applied = []
+
+
+class Conn:
+    def __init__(self, db):
+        self.db = db
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        saved = copy.deepcopy(self.db.subs)
+        try:
+            yield
+        except BaseException:
+            self.db.subs = saved
+            raise
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = DB()
+
+    @contextlib.asynccontextmanager
+    async def connection():
+        yield Conn(db)
+
+    async def insert_stripe_event(conn, event_id, event_type, created, payload_json):
+        if event_id in db.events:
+            return False   # on conflict (id) do nothing
+        db.events[event_id] = {"type": event_type, "payload": json.loads(payload_json), "status": "pending",
+                               "attempts": 0, "run_after": 0.0, "last_error": None}
+        return True
+
+    async def claim_stripe_events(conn, n):
+        rows = []
+        for event_id, e in db.events.items():
+            if e["status"] == "pending" and e["run_after"] <= time.time() and len(rows) < n:
+                e["attempts"] += 1
+                rows.append((event_id, e["type"], e["payload"], e["attempts"]))
+        return rows
+
+    async def finish_stripe_event(conn, event_id, user_id):
+        db.events[event_id]["status"] = "processed"
+
+    async def retry_stripe_event(conn, event_id, error, delay, final):
+        e = db.events[event_id]
+        e.update(status="failed" if final else "pending", run_after=time.time() + delay, last_error=error)
+
+    async def upsert_subscription(conn, *, user_id, customer_id, sub_id, event_at):
+        db.applied.append(("checkout", user_id))
+        conn.db.subs[user_id] = {"sub_id": sub_id, "status": "active"}
+        return True
+
+    async def set_subscription_status(conn, sub_id, status, event_at):
+        for user_id, sub in conn.db.subs.items():
+            if sub["sub_id"] == sub_id:
+                sub["status"] = status
+                db.applied.append((status, user_id))
+                if sub_id == "sub_broken":
+                    raise RuntimeError("constraint violated")   # after the write: must roll back
+                return user_id
+        return None
+
+    for name, fn in [("connection", connection), ("insert_stripe_event", insert_stripe_event),
+                     ("claim_stripe_events", claim_stripe_events), ("finish_stripe_event", finish_stripe_event),
+                     ("retry_stripe_event", retry_stripe_event), ("upsert_subscription", upsert_subscription),
+                     ("set_subscription_status", set_subscription_status)]:
+        monkeypatch.setattr(billing, name, fn)
+    monkeypatch.setattr(settings, "STRIPE_WEBHOOK_SECRET", SECRET)
+    monkeypatch.setattr(entitlements, "_STATUS", {})
+    return db
+
+
+def _deliver(client, event):
+    payload = json.dumps(event).encode()
+    return client.post("/api/billing/webhook", content=payload,
+                       headers={"stripe-signature": sign_webhook(payload, SECRET), "content-type": "application/json"})
+
+
+def _checkout(user_id, sub_id):
+    return stripe_event("checkout.session.completed",
+                        {"customer": "cus_1", "subscription": sub_id, "metadata": {"user_id": user_id}})
+
+
+def test_duplicate_delivery_is_acked_and_applied_once(db):
+    client = TestClient(main.app)
+    event = _checkout("u1", "sub_1")
+    assert _deliver(client, event).status_code == 200
+    assert _deliver(client, event).status_code == 200   # Stripe redelivery
+    assert len(db.events) == 1
+    assert asyncio.run(billing.process_events()) == 1
+    assert asyncio.run(billing.process_events()) == 0
+    assert db.applied == [("checkout", "u1")]
+    assert entitlements.get("u1")["plan"] == "paid"
+
+
+def test_bad_signature_is_rejected(db):
+    client = TestClient(main.app)
+    payload = json.dumps(_checkout("u1", "sub_1")).encode()
+    r = client.post("/api/billing/webhook", content=payload,
+                    headers={"stripe-signature": sign_webhook(payload, "whsec_other")})
+    assert r.status_code == 400 and db.events == {}
+
+
+def test_failing_event_rolls_back_alone_and_backs_off(db, monkeypatch):
+    monkeypatch.setattr(settings, "STRIPE_EVENT_BACKOFF", 30.0)
+    monkeypatch.setattr(settings, "STRIPE_EVENT_MAX_ATTEMPTS", 2)
+    client = TestClient(main.app)
+    _deliver(client, _checkout("u1", "sub_broken"))
+    _deliver(client, _checkout("u2", "sub_2"))
+    asyncio.run(billing.process_events())
+    broken = stripe_event("customer.subscription.updated", {"id": "sub_broken", "status": "past_due"})
+    _deliver(client, broken)
+    asyncio.run(billing.process_events())
+
+    row = db.events[broken["id"]]
+    assert row["status"] == "pending" and row["attempts"] == 1 and "constraint violated" in row["last_error"]
+    assert row["run_after"] > time.time() + 10   # backoff, not an immediate retry
+    assert db.subs["u1"]["status"] == "active"   # the failed event's write was rolled back
+    assert entitlements.get("u2")["plan"] == "paid"
+
+    # due again; the second failure is final
+    row["run_after"] = 0.0
+    asyncio.run(billing.process_events())
+    assert row["status"] == "failed" and row["attempts"] == 2
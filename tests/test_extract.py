@@ -0,0 +1,27 @@
+# tests/test_extract.py
+# app.extract against the pre-lxml extraction (scripts/bench_extract.legacy_extract).
+import pytest
+from app.extract import extract_page
+
+bs4 = pytest.importorskip("bs4")
+from scripts.bench_extract import legacy_extract, synthetic_page  # noqa: E402
+
+# readability finds no article here, so both paths fall back to the page's <p>s;
+# two are hidden, and readability drops hidden nodes from the tree it is handed
+HIDDEN_FALLBACK = """<html><head><title>Clinic hours</title></head><body>
+<div class="comment-sidebar"><p style="display: none">Officials said the county clinic will extend flu shot hours.</p>
+<p hidden>Residents over 65 can book online or by phone.</p><p>Call the clinic for details.</p></div>
+</body></html>"""
+
+
+def test_fallback_sees_hidden_paragraphs_like_the_legacy_path():
+    title, body, _ = extract_page(HIDDEN_FALLBACK)
+    assert (title, body) == legacy_extract(HIDDEN_FALLBACK)[:2]
+    assert body.count("\n\n") == 2
+
+
+def test_article_page_matches_the_legacy_path():
+    page = synthetic_page(12, 3)
+    title, body, noise = extract_page(page)
+    legacy_title, legacy_body, legacy_noise = legacy_extract(page)
+    assert body == legacy_body and noise == legacy_noise
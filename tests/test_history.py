@@ -0,0 +1,68 @@
+# tests/test_history.py
+# Keyset cursors in app/history.py; list_user_checks is replaced by an in-memory
+# version of its (created_at, id) < cursor query.
+import asyncio, base64, contextlib, uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import HTTPException
+from app import history
+from app.config import settings
+
+
+def _raw(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).rstrip(b"=").decode()
+
+
+def test_cursor_round_trip():
+    ts = datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone(timedelta(hours=-5)))
+    row_id = str(uuid.uuid4())
+    assert history.decode_cursor(history.encode_cursor(ts, row_id)) == (ts, row_id)
+    assert history.decode_cursor(history.encode_cursor(ts, "12345")) == (ts, "12345")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 !!",
+    _raw("no-separator"),
+    _raw("yesterday|" + str(uuid.uuid4())),
+    _raw("2026-03-01T12:30:15|" + str(uuid.uuid4())),          # naive timestamp
+    _raw("2026-03-01T12:30:15+00:00|1 or 1=1"),                # id edited by hand
+    _raw("2026-03-01T12:30:15+00:00|"),
+    base64.urlsafe_b64encode(b"\xff\xfe|x").decode(),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as e:
+        history.decode_cursor(cursor)
+    assert e.value.status_code == 400 and e.value.detail == "invalid_cursor"
+
+
+def test_pages_cover_ties_on_created_at_exactly_once(monkeypatch):
+    t0 = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    # 3 rows per timestamp, so page boundaries fall inside runs of equal created_at
+    rows = [(str(uuid.uuid4()), "https://a.test/%d" % i, "ok", [], "", t0 + timedelta(seconds=i // 3))
+            for i in range(20)]
+
+    @contextlib.asynccontextmanager
+    async def connection():
+        yield None
+
+    async def list_user_checks(conn, user_id, limit, before=None):
+        ordered = sorted(rows, key=lambda r: (r[5], r[0]), reverse=True)
+        if before is not None:
+            ordered = [r for r in ordered if (r[5], r[0]) < before]
+        return ordered[:limit]
+
+    monkeypatch.setattr(history, "connection", connection)
+    monkeypatch.setattr(history, "list_user_checks", list_user_checks)
+    monkeypatch.setattr(settings, "HISTORY_MAX_PAGE_SIZE", 100)
+
+    async def walk():
+        seen, cursor = [], None
+        while True:
+            page = await history._history("user", 4, cursor)
+            seen += [item.id for item in page.items]
+            if page.next_cursor is None:
+                return seen
+            cursor = page.next_cursor
+
+    seen = asyncio.run(walk())
+    assert len(seen) == len(rows) and set(seen) == {r[0] for r in rows}
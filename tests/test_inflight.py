@@ -0,0 +1,96 @@
+# tests/test_inflight.py
+# Single-flight coalescing in checker.run_check, with the pipeline stubbed out.
+import asyncio
+import pytest
+from app import checker
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Stub pipeline: emits "resolved", then waits for `release` before returning or raising `error`."""
+    state = {"runs": 0, "release": None, "error": None, "cancelled": False}
+
+    async def fake_run_and_cache(key, norm, emit=checker._no_progress):
+        state["runs"] += 1
+        emit("resolved", {"url": norm})
+        try:
+            await state["release"].wait()
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        if state["error"] is not None:
+            raise state["error"]
+        return "ok", ["r"], "summary", {"url_hash": key}
+
+    async def miss(key):
+        return None
+
+    monkeypatch.setattr(checker, "_run_and_cache", fake_run_and_cache)
+    monkeypatch.setattr(checker.verdict_cache, "get_verdict", miss)
+    monkeypatch.setattr(checker, "_INFLIGHT", {})
+    monkeypatch.setattr(checker, "_PROGRESS", {})
+    return state
+
+
+def test_concurrent_callers_share_one_run(pipeline):
+    async def go():
+        pipeline["release"] = asyncio.Event()
+        callers = [asyncio.ensure_future(checker.run_check("https://a.test/x")) for _ in range(10)]
+        await asyncio.sleep(0)
+        pipeline["release"].set()
+        return await asyncio.gather(*callers)
+
+    results = asyncio.run(go())
+    assert pipeline["runs"] == 1
+    assert {r[0] for r in results} == {"ok"}
+    assert [r[3]["coalesced"] for r in results].count(False) == 1
+    assert checker._INFLIGHT == {}
+
+
+def test_cancelling_one_caller_keeps_the_shared_run(pipeline):
+    async def go():
+        pipeline["release"] = asyncio.Event()
+        first = asyncio.ensure_future(checker.run_check("https://a.test/x"))
+        second = asyncio.ensure_future(checker.run_check("https://a.test/x"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        pipeline["release"].set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    verdict, _, _, meta = asyncio.run(go())
+    assert verdict == "ok" and meta["coalesced"] is True
+    assert pipeline["runs"] == 1 and not pipeline["cancelled"]
+
+
+def test_exception_reaches_every_waiter(pipeline):
+    async def go():
+        pipeline["release"] = asyncio.Event()
+        pipeline["error"] = RuntimeError("boom")
+        callers = [asyncio.ensure_future(checker.run_check("https://a.test/x")) for _ in range(3)]
+        await asyncio.sleep(0)
+        pipeline["release"].set()
+        return await asyncio.gather(*callers, return_exceptions=True)
+
+    results = asyncio.run(go())
+    assert pipeline["runs"] == 1
+    assert all(isinstance(r, RuntimeError) and str(r) == "boom" for r in results)
+    assert checker._INFLIGHT == {}
+
+
+def test_late_joiner_gets_progress_replayed(pipeline):
+    async def go():
+        pipeline["release"] = asyncio.Event()
+        first = asyncio.ensure_future(checker.run_check("https://a.test/x"))
+        await asyncio.sleep(0.01)   # the run has emitted "resolved" by now
+        seen = []
+        late = asyncio.ensure_future(checker.run_check("https://a.test/x", progress=lambda k, d: seen.append(k)))
+        await asyncio.sleep(0)
+        pipeline["release"].set()
+        await asyncio.gather(first, late)
+        return seen
+
+    assert asyncio.run(go()) == ["resolved"]
+    assert pipeline["runs"] == 1
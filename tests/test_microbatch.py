@@ -0,0 +1,102 @@
+# tests/test_microbatch.py
+# MicroBatcher with fake classifiers: full batches, the window timer, usage
+# split and the run_one fallback for failed or partial multi-page answers.
+import asyncio, time
+import pytest
+from app import checker, microbatch
+from app.config import settings
+
+
+@pytest.fixture(autouse=True)
+def batching(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BATCH_MAX_ITEMS", 3)
+    monkeypatch.setattr(settings, "LLM_BATCH_WINDOW_MS", 30)
+
+
+class Fake:
+    def __init__(self, answer=None, fail=False):
+        self.many, self.one = [], []
+        self.answer = answer or (lambda items: {item_id: "many:" + p for item_id, p in items})
+        self.fail = fail
+
+    async def run_many(self, items):
+        self.many.append([p for _, p in items])
+        if self.fail:
+            raise ValueError("unparseable")
+        return self.answer(items), {"prompt_tokens": 30, "completion_tokens": 9}
+
+    async def run_one(self, payload):
+        self.one.append(payload)
+        return "one:" + payload, {"prompt_tokens": 12, "completion_tokens": 4}
+
+
+def _submit_all(batcher, payloads):
+    async def go():
+        return await asyncio.gather(*(batcher.submit(p) for p in payloads))
+    return asyncio.run(go())
+
+
+def test_full_batch_goes_out_at_once_and_splits_usage():
+    fake = Fake()
+    b = microbatch.MicroBatcher("t", fake.run_many, fake.run_one)
+    t0 = time.monotonic()
+    results = _submit_all(b, ["a", "b", "c"])
+    assert time.monotonic() - t0 < settings.LLM_BATCH_WINDOW_MS / 1000   # didn't wait for the timer
+    assert fake.many == [["a", "b", "c"]] and fake.one == []
+    assert [r[0] for r in results] == ["many:a", "many:b", "many:c"]
+    assert results[0][1] == {"prompt_tokens": 10.0, "completion_tokens": 3.0}
+    s = b.stats()
+    assert s["requests"] == 1 and s["batches"] == 1 and s["prompt_tokens"] == 30
+
+
+def test_timer_flushes_a_partial_batch():
+    fake = Fake()
+    b = microbatch.MicroBatcher("t", fake.run_many, fake.run_one)
+    t0 = time.monotonic()
+    results = _submit_all(b, ["a", "b"])
+    assert time.monotonic() - t0 >= settings.LLM_BATCH_WINDOW_MS / 1000 * 0.9
+    assert fake.many == [["a", "b"]]
+    assert [r[0] for r in results] == ["many:a", "many:b"]
+
+
+def test_lone_item_skips_the_batch_prompt():
+    fake = Fake()
+    b = microbatch.MicroBatcher("t", fake.run_many, fake.run_one)
+    assert _submit_all(b, ["a"])[0] == ("one:a", {"prompt_tokens": 12, "completion_tokens": 4})
+    assert fake.many == []
+
+
+def test_failed_batch_falls_back_to_single_calls():
+    fake = Fake(fail=True)
+    b = microbatch.MicroBatcher("t", fake.run_many, fake.run_one)
+    results = _submit_all(b, ["a", "b", "c"])
+    assert [r[0] for r in results] == ["one:a", "one:b", "one:c"]
+    assert sorted(fake.one) == ["a", "b", "c"]
+    assert b.stats()["batch_errors"] == 1 and b.stats()["fallback_items"] == 3
+
+
+def test_items_missing_from_the_answer_are_retried_alone():
+    fake = Fake(answer=lambda items: {item_id: "many:" + p for item_id, p in items if p != "b"})
+    b = microbatch.MicroBatcher("t", fake.run_many, fake.run_one)
+    results = _submit_all(b, ["a", "b", "c"])
+    assert [r[0] for r in results] == ["many:a", "one:b", "many:c"]
+    assert fake.one == ["b"] and b.stats()["fallback_items"] == 1
+
+
+def test_malformed_multi_page_entries_go_back_through_run_one(monkeypatch):
+    # checker._classify_many as run_many: the entry for one page lacks a label, another has an unknown id
+    labels = {"headline_style": "neutral", "tone": "neutral", "scam_signal": "none", "health_claim": "not_present"}
+
+    async def complete_json(messages):
+        return {"results": [{"id": "0", **labels}, {"id": "1", "tone": "neutral"}, {"id": "99", **labels}, "junk"]}, {}
+
+    monkeypatch.setattr(checker.llm, "complete_json", complete_json)
+    fake = Fake()
+
+    async def run_one(page):
+        return await fake.run_one(page[1])
+
+    b = microbatch.MicroBatcher("t", checker._classify_many, run_one)
+    results = _submit_all(b, [("a.test", "A", "body"), ("b.test", "B", "body")])
+    assert results[0][0] == labels
+    assert results[1][0] == "one:B" and fake.one == ["B"]